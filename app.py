@@ -4,11 +4,30 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import io
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
+import os
 from datetime import datetime
 
+from cobranza import activar_copy_on_write
+from cobranza.ingesta import cargar_tabla, cargar_tablas, cargar_resumen_pagos, cargar_resumen_pagos_multiples, CLAVE_DUPLICADOS
+from cobranza.lectores import FORMATOS
+from cobranza.cruce import MotorCruce
+from cobranza.paralelo import WORKERS
+from cobranza.sms import depurar_pagos_totales, seleccionar_campana, ParticionTipos, SuscriptoresSMS
+from cobranza.exportar import exportar_campana_zip
+from cobranza.reporte import exportar_reporte_excel
+from cobranza.temporales import ArchivoTemporal
+from cobranza.esquema import ErrorEsquema, memoria_bytes, formato_memoria
+from cobranza.almacen import AlmacenColumnar
+from cobranza.base_sql import BaseSQL, HAY_DUCKDB
+from cobranza.agregados import CuboCruce
+from cobranza.filtros import IndiceFiltros
+from cobranza.graficos import FIGURAS
+from cobranza.conjunto import ConjuntoDatos, REGISTRO
+from cobranza.diagnostico import Diagnostico, MEDIR_MEMORIA, configurar_memoria
+from cobranza.tareas import EJECUTOR, SEGUNDO_PLANO, TERMINADA, CANCELADA, FALLIDA
+
+activar_copy_on_write()
+
 st.set_page_config(page_title="SISTEMA DE COBRANZA - RESULTADOS", layout="wide", initial_sidebar_state="expanded")
 
 st.markdown("""
@@ -58,29 +77,303 @@ menu = st.sidebar.radio(
         "📊 Dashboard Cruce Deuda vs Pagos",
         "📈 Gráficos Interactivos",
         "📲 GENERADOR DE SMS",
-        "🚧 Módulo Histórico (En Desarrollo)"
+        "🗂️ Módulo Histórico"
     ]
 )
 
+with st.sidebar.expander("⚙️ Rendimiento"):
+    workers_cruce = st.number_input(
+        "Procesos para el cruce",
+        min_value=1,
+        max_value=max(1, os.cpu_count() or 1),
+        value=min(WORKERS, max(1, os.cpu_count() or 1)),
+        help="1 = serial. Con más procesos el cruce se reparte por PERIODO"
+    )
+    segundo_plano = st.checkbox(
+        "Cruces en segundo plano",
+        value=SEGUNDO_PLANO,
+        help="El cruce corre aparte: se puede seguir usando la app, ver su avance y cancelarlo"
+    )
+
+with st.sidebar.expander("🩺 Diagnóstico"):
+    # tracemalloc es uno solo para todo el proceso: lo fija COBRANZA_DIAG_MEMORIA
+    # al arrancar, no una sesión (apagarlo cortaría las mediciones de las demás)
+    if MEDIR_MEMORIA:
+        st.caption("🧠 Midiendo memoria pico con tracemalloc: la ejecución es varias veces más lenta")
+    else:
+        st.caption("🧠 Memoria pico sin medir (activar con `COBRANZA_DIAG_MEMORIA=1`)")
+    panel_diagnostico = st.empty()
+
+configurar_memoria(MEDIR_MEMORIA)
+if "diagnostico" not in st.session_state:
+    st.session_state.diagnostico = Diagnostico()
+diagnostico = st.session_state.diagnostico
+diagnostico.iniciar(menu)
+
+almacen = AlmacenColumnar()
+# El almacén es común a todas las sesiones: restaurar sin que se pida solo
+# tiene sentido en una instalación de un único usuario
+RESTAURAR_AUTOMATICO = os.environ.get("COBRANZA_RESTAURAR", "0") == "1"
+
+
+def etapa(nombre, filas=None):
+    return diagnostico.etapa(nombre, filas)
+
+
+def mostrar_diagnostico():
+    with panel_diagnostico.container():
+        st.caption(f"⏱️ Última ejecución: {diagnostico.total:.2f} s")
+        st.dataframe(diagnostico.tabla(), use_container_width=True, hide_index=True)
+        if diagnostico.log:
+            st.caption(f"📝 Registro: `{diagnostico.log}`")
+        conjuntos, bytes_registro, referencias = REGISTRO.estado()
+        st.caption(
+            f"🤝 Datos compartidos entre sesiones: {conjuntos} conjunto(s), {formato_memoria(bytes_registro)} "
+            f"de {formato_memoria(REGISTRO.max_bytes)}, {referencias} referencia(s)"
+        )
+
+
+def restaurar_ultima_cartera(pedido=False):
+    # Carga perezosa del último snapshot guardado, cuando la sesión todavía no
+    # tiene cartera: a pedido del usuario o, con COBRANZA_RESTAURAR=1, en
+    # cuanto un módulo la necesita
+    if st.session_state.get("conjunto_cartera") is not None:
+        return
+    if not pedido and (not RESTAURAR_AUTOMATICO or st.session_state.get("cartera_descartada")):
+        return
+    try:
+        entrada = almacen.ultimo("cartera")
+        if entrada is None:
+            return
+        # Otra sesión puede tener ya en memoria esta misma cartera o su resultado
+        st.session_state.conjunto_cartera = REGISTRO.compartir(ConjuntoDatos(
+            leer_compartido("cartera", entrada), entrada["huella"], "cartera"
+        ))
+        st.session_state.cartera_restaurada = entrada
+
+        ultimo_resultado = almacen.ultimo("resultado")
+        if ultimo_resultado is not None and ultimo_resultado.get("cartera") == entrada["huella"]:
+            linaje = (("cartera", entrada["huella"]),) + tuple(("pagos", h) for h in ultimo_resultado.get("pagos") or ())
+            publicar_resultado(ConjuntoDatos(
+                leer_compartido("resultado", ultimo_resultado), ultimo_resultado["huella"], "resultado", linaje
+            ))
+    except Exception as e:
+        st.warning(f"⚠️ No se pudo restaurar la última cartera guardada: {str(e)}")
+
+
+def leer_compartido(coleccion, entrada):
+    df = REGISTRO.buscar(entrada["huella"])
+    return almacen.leer(coleccion, entrada["id"]) if df is None else df
+
+
+def publicar_resultado(conjunto, motor=None):
+    # La sesión guarda su ConjuntoDatos; el DataFrame es el del registro. El
+    # motor pasa a usar ese mismo DataFrame si otra sesión ya tenía el resultado
+    conjunto = REGISTRO.compartir(conjunto)
+    st.session_state.conjunto_resultado = conjunto
+    if motor is not None:
+        motor.resultado = conjunto.df
+
+
+def derivado(nombre, clave, construir):
+    # Un valor derivado por nombre, válido mientras no cambie su clave. Las
+    # claves salen de huellas de ConjuntoDatos, así que compararlas es O(1)
+    cache = st.session_state.setdefault("derivados", {})
+    entrada = cache.get(nombre)
+    if entrada is None or entrada[0] != clave:
+        with etapa(nombre):
+            entrada = (clave, construir())
+        cache[nombre] = entrada
+    return entrada[1]
+
+
+# ==========================================
+# TAREAS EN SEGUNDO PLANO
+# ==========================================
+INTERVALO_TAREAS = 1.0
+
+
+def ejecutar_tarea(nombre, clave, texto, funcion, *args, filas=None):
+    # Sin segundo plano se calcula aquí mismo. En segundo plano devuelve None
+    # mientras la tarea corre: un rerun con la misma clave (un filtro, otro
+    # módulo) sigue esperando la misma tarea, nunca la reinicia
+    if not segundo_plano:
+        cancelar_tarea(nombre)
+        with st.spinner(texto), etapa(nombre, filas):
+            return funcion(*args)
+
+    tareas = st.session_state.setdefault("tareas", {})
+    tarea = tareas.get(nombre)
+    if tarea is None or tarea.clave != clave:
+        if tarea is not None:
+            tarea.cancelar()
+        tarea = EJECUTOR.enviar(nombre, clave, funcion, *args, descripcion=texto)
+        tareas[nombre] = tarea
+
+    if tarea.estado == TERMINADA:
+        # El resultado se entrega una sola vez: el que llama lo publica
+        del tareas[nombre]
+        diagnostico.externa(f"{nombre} (segundo plano)", tarea.segundos, filas)
+        return tarea.resultado
+    if tarea.estado == FALLIDA:
+        st.error(f"❌ Error ({texto.rstrip('.')}): {str(tarea.error)}")
+        reintentar_tarea(nombre)
+    elif tarea.estado == CANCELADA:
+        st.warning(f"⏹️ Cancelado: {texto.rstrip('.')}")
+        reintentar_tarea(nombre)
+    else:
+        seguir_tarea(tarea)
+    return None
+
+
+def derivado_en_tarea(nombre, clave, texto, funcion, *args):
+    # Como derivado(), pero el valor se calcula con ejecutar_tarea()
+    cache = st.session_state.setdefault("derivados", {})
+    entrada = cache.get(nombre)
+    if entrada is not None and entrada[0] == clave:
+        return entrada[1]
+    valor = ejecutar_tarea(nombre, clave, texto, funcion, *args)
+    if valor is not None:
+        cache[nombre] = (clave, valor)
+    return valor
+
+
+def reintentar_tarea(nombre):
+    if st.button("🔁 Reintentar", key=f"reintentar_{nombre}"):
+        st.session_state.tareas.pop(nombre, None)
+        st.rerun()
+
+
+def cancelar_tarea(nombre):
+    tarea = st.session_state.get("tareas", {}).pop(nombre, None)
+    if tarea is not None:
+        tarea.cancelar()
+
+
+@st.fragment(run_every=INTERVALO_TAREAS)
+def seguir_tarea(tarea):
+    # Solo este fragmento se vuelve a ejecutar mientras la tarea corre; al
+    # terminar, un rerun completo publica el resultado
+    if tarea.terminada:
+        st.rerun()
+    st.progress(tarea.progreso, text=f"⏳ {tarea.descripcion} {tarea.progreso * 100:.0f}% ({tarea.segundos:.0f} s)")
+    if st.button("⏹️ Cancelar", key=f"cancelar_{tarea.nombre}"):
+        tarea.cancelar()
+        st.rerun()
+
+
+def cruzar_en_motor(df_deuda, huella_cartera, workers, pagos_resumen, huella, progreso=None):
+    # Un motor nuevo: el de la sesión no cambia hasta que se publica el resultado
+    motor = MotorCruce(df_deuda, huella_cartera, workers)
+    motor.cruzar_resumen(pagos_resumen, huella, progreso)
+    return motor
+
+
+def derivado_resultado(nombre, construir):
+    # El cubo de agregados, el índice de filtros y las figuras se construyen
+    # una sola vez por resultado, la primera vez que se piden
+    conjunto = st.session_state.get("conjunto_resultado")
+    if conjunto is None:
+        return None
+    return derivado(nombre, conjunto.huella, lambda: construir(conjunto.df))
+
+
+def obtener_cubo():
+    return derivado_resultado("cubo", CuboCruce.construir)
+
+
+def obtener_indice_filtros():
+    return derivado_resultado("indice_filtros", IndiceFiltros)
+
+
+def figura_cacheada(nombre, cubo):
+    # Volver al módulo o cambiar de sección no reconstruye ninguna figura
+    return derivado_resultado(f"figura_{nombre}", lambda _: FIGURAS[nombre](cubo))
+
+
+def mostrar_figura(nombre, cubo):
+    with etapa(f"gráfico {nombre}"):
+        st.plotly_chart(figura_cacheada(nombre, cubo), use_container_width=True)
+
+
+def progreso_lectura(texto):
+    # La barra se crea con el primer bloque leído: si el archivo sale de la
+    # caché no se muestra nada
+    estado = {}
+
+    def actualizar(leidas, total):
+        if "barra" not in estado:
+            estado["barra"] = st.progress(0.0)
+        if total:
+            estado["barra"].progress(min(leidas / total, 1.0), text=f"{texto} {leidas:,} de {total:,} filas")
+        else:
+            estado["barra"].progress(0.0, text=f"{texto} {leidas:,} filas")
+
+    return actualizar
+
+
+def clave_duplicados(archivos, esquema, key):
+    # Con un solo archivo no hay nada que combinar: se lee como siempre
+    if len(archivos) < 2:
+        return []
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        descartar = st.checkbox(
+            "🧹 Descartar pagos repetidos",
+            value=False,
+            key=f"{key}_descartar",
+            help="Un mismo pago informado por dos bancos o canales se cuenta una sola vez. Las cuotas iguales dentro de un mismo archivo se conservan"
+        )
+    with col2:
+        columnas = st.multiselect(
+            "Clave de pago repetido",
+            CLAVE_DUPLICADOS[esquema],
+            default=CLAVE_DUPLICADOS[esquema],
+            key=f"{key}_clave",
+            disabled=not descartar,
+            help="Todos los archivos tienen que traer todas estas columnas"
+        )
+    return columnas if descartar else []
+
+
+def informar_combinacion(archivos, tabla):
+    if len(archivos) > 1:
+        st.info(f"📚 {len(archivos)} archivos combinados | 🧹 {tabla.duplicados:,} pagos repetidos descartados")
+
+
+def persistir(coleccion, df, huella, metadatos=None):
+    try:
+        almacen.guardar(coleccion, df, huella, metadatos)
+    except Exception as e:
+        st.warning(f"⚠️ No se pudo guardar en el almacén histórico: {str(e)}")
+
+
 def modulo_cruce():
     st.markdown('<div class="main-header">⚖️ DASHBOARD EJECUTIVO DE GESTIÓN DE COBRANZA</div>', unsafe_allow_html=True)
 
-    def limpiar_columnas(df):
-        df.columns = df.columns.str.strip().str.upper().str.replace(" ", "_")
-        return df
-
-    if "df_deuda_base" not in st.session_state:
-        st.session_state.df_deuda_base = None
+    if "conjunto_cartera" not in st.session_state:
+        st.session_state.conjunto_cartera = None
     
-    if "resultado_cruce" not in st.session_state:
-        st.session_state.resultado_cruce = None
+    if "conjunto_resultado" not in st.session_state:
+        st.session_state.conjunto_resultado = None
 
-    if st.session_state.df_deuda_base is None:
+    restaurar_ultima_cartera()
+
+    if st.session_state.conjunto_cartera is None:
         st.info("🔹 **Paso 1:** Carga la base de CARTERA/DEUDA")
-        
+
+        ultima = almacen.ultimo("cartera")
+        if ultima is not None and st.button(
+            f"♻️ Restaurar la última cartera guardada ({ultima['creado'].replace('T', ' ')} | {ultima['filas']:,} registros)",
+            use_container_width=True
+        ):
+            restaurar_ultima_cartera(pedido=True)
+            if st.session_state.conjunto_cartera is not None:
+                st.rerun()
+
         archivo_deuda = st.file_uploader(
             "📂 Subir archivo CARTERA / DEUDA",
-            type=["xlsx"],
+            type=FORMATOS,
             help="Debe contener: ID_COBRANZA, PERIODO, DEUDA, TIPO",
             key="uploader_cartera"
         )
@@ -88,25 +381,17 @@ def modulo_cruce():
         if archivo_deuda:
             with st.spinner("Procesando cartera..."):
                 try:
-                    df_deuda = pd.read_excel(archivo_deuda)
-                    df_deuda = limpiar_columnas(df_deuda)
-                    columnas_deuda = {"ID_COBRANZA", "PERIODO", "DEUDA", "TIPO"}
-
-                    if not columnas_deuda.issubset(df_deuda.columns):
-                        st.error("❌ El archivo CARTERA no tiene las columnas obligatorias")
-                        st.error(f"**Columnas requeridas:** ID_COBRANZA, PERIODO, DEUDA, TIPO")
-                        st.error(f"**Columnas encontradas:** {', '.join(df_deuda.columns)}")
-                        return
-
-                    df_deuda["ID_COBRANZA"] = df_deuda["ID_COBRANZA"].astype(str)
-                    df_deuda["PERIODO"] = df_deuda["PERIODO"].astype(str)
-                    df_deuda["DEUDA"] = pd.to_numeric(df_deuda["DEUDA"], errors="coerce").fillna(0)
-
-                    if (df_deuda["DEUDA"] < 0).any():
-                        st.warning("⚠️ Montos negativos detectados y corregidos")
-                        df_deuda["DEUDA"] = df_deuda["DEUDA"].abs()
+                    with etapa("lectura cartera"):
+                        tabla_deuda = cargar_tabla(archivo_deuda, "CARTERA", progreso=progreso_lectura("📖 Leyendo cartera..."))
+                    for aviso in tabla_deuda.avisos:
+                        st.warning(aviso)
+                    df_deuda = tabla_deuda.df
 
-                    st.session_state.df_deuda_base = df_deuda
+                    st.session_state.conjunto_cartera = REGISTRO.compartir(ConjuntoDatos.desde_tabla(tabla_deuda, "cartera"))
+                    st.session_state.memoria_cartera = tabla_deuda.memoria
+                    st.session_state.cartera_descartada = False
+                    st.session_state.cartera_restaurada = None
+                    persistir("cartera", df_deuda, tabla_deuda.huella)
                     
                     col1, col2, col3 = st.columns(3)
                     with col1:
@@ -119,19 +404,32 @@ def modulo_cruce():
                     st.success("✅ Cartera cargada correctamente")
                     st.balloons()
                     st.rerun()
+                except ErrorEsquema as e:
+                    st.error("❌ El archivo CARTERA no tiene las columnas obligatorias")
+                    st.error(f"**Columnas requeridas:** {', '.join(e.requeridas)}")
+                    st.error(f"**Columnas encontradas:** {', '.join(e.encontradas)}")
+                    return
                 except Exception as e:
                     st.error(f"❌ Error: {str(e)}")
         return
 
-    df_deuda = st.session_state.df_deuda_base
+    cartera = st.session_state.conjunto_cartera
+    df_deuda = cartera.df
     
     col1, col2 = st.columns([3, 1])
     with col1:
-        st.success("✅ **Cartera base cargada en memoria**")
+        restaurada = st.session_state.get("cartera_restaurada")
+        if restaurada:
+            st.success(f"✅ **Cartera base restaurada del almacén** (guardada el {restaurada['creado'].replace('T', ' ')})")
+        else:
+            st.success("✅ **Cartera base cargada en memoria**")
     with col2:
         if st.button("🔄 Reemplazar", use_container_width=True):
-            st.session_state.df_deuda_base = None
-            st.session_state.resultado_cruce = None
+            st.session_state.conjunto_cartera = None
+            publicar_resultado(None)
+            st.session_state.motor_cruce = None
+            cancelar_tarea("cruce")
+            st.session_state.cartera_descartada = True
             st.rerun()
 
     with st.expander("📊 Ver resumen de Cartera Base"):
@@ -143,136 +441,244 @@ def modulo_cruce():
         with col3:
             st.metric("📅 Periodos", df_deuda["PERIODO"].nunique())
 
+        memoria = st.session_state.get("memoria_cartera")
+        if memoria:
+            antes, despues = memoria
+            st.caption(f"🧠 Memoria en sesión: {formato_memoria(despues)} (antes de compactar tipos: {formato_memoria(antes)}, {(1 - despues / antes) * 100:.0f}% menos)")
+        else:
+            st.caption(f"🧠 Memoria en sesión: {formato_memoria(memoria_bytes(df_deuda))}")
+
     st.markdown("---")
 
     st.info("🔹 **Paso 2:** Carga el archivo de PAGOS para realizar el cruce")
     
-    archivo_pagos = st.file_uploader(
-        "💵 Subir archivo PAGOS",
-        type=["xlsx"],
-        help="Debe contener: ID_COBRANZA, PERIODO, IMPORTE",
+    archivos_pagos = st.file_uploader(
+        "💵 Subir archivo(s) PAGOS",
+        type=FORMATOS,
+        accept_multiple_files=True,
+        help="Debe contener: ID_COBRANZA, PERIODO, IMPORTE. Puede subir un archivo por banco o canal",
         key="uploader_pagos"
     )
 
-    if archivo_pagos:
-        with st.spinner("Procesando cruce..."):
-            try:
-                df_pagos = pd.read_excel(archivo_pagos)
-                df_pagos = limpiar_columnas(df_pagos)
-                
-                columnas_pagos = {"ID_COBRANZA", "PERIODO", "IMPORTE"}
-                if not columnas_pagos.issubset(df_pagos.columns):
-                    st.error("❌ El archivo PAGOS no tiene las columnas obligatorias")
-                    st.error(f"**Columnas requeridas:** ID_COBRANZA, PERIODO, IMPORTE")
-                    st.error(f"**Columnas encontradas:** {', '.join(df_pagos.columns)}")
-                    return
+    # El motor conserva el resultado por par (cartera, pagos): un rerun por
+    # cambio de filtros no vuelve a leer ni a cruzar nada
+    motor = st.session_state.get("motor_cruce")
+    if motor is None or motor.huella_cartera != cartera.huella:
+        motor = MotorCruce(df_deuda, cartera.huella)
+        st.session_state.motor_cruce = motor
+    motor.workers = int(workers_cruce)
+    # Mientras el cruce nuevo no termina se sigue mostrando el resultado anterior
+    cruce_pendiente = False
 
-                df_pagos["ID_COBRANZA"] = df_pagos["ID_COBRANZA"].astype(str)
-                df_pagos["PERIODO"] = df_pagos["PERIODO"].astype(str)
-                df_pagos["IMPORTE"] = pd.to_numeric(df_pagos["IMPORTE"], errors="coerce").fillna(0)
+    if not archivos_pagos:
+        # Sin archivos de pagos no hay cruce que esperar; el último resultado
+        # (por ejemplo, uno restaurado) se sigue mostrando como anterior
+        cancelar_tarea("cruce")
+    else:
+        try:
+            clave_pagos = clave_duplicados(archivos_pagos, "PAGOS", "pagos_duplicados")
+            with st.spinner("Leyendo pagos..."), etapa("lectura pagos"):
+                tabla_pagos = cargar_resumen_pagos_multiples(
+                    archivos_pagos, df_deuda, motor.huella_cartera, clave_pagos, motor.workers,
+                    progreso=progreso_lectura("📖 Leyendo pagos...")
+                )
+            for aviso in tabla_pagos.avisos:
+                st.warning(aviso)
+            informar_combinacion(archivos_pagos, tabla_pagos)
 
-                if (df_pagos["IMPORTE"] < 0).any():
-                    st.warning("⚠️ Montos negativos detectados y corregidos")
-                    df_pagos["IMPORTE"] = df_pagos["IMPORTE"].abs()
+            if motor.resultado is None or motor.huellas_pagos[0] != tabla_pagos.huella:
+                nuevo = ejecutar_tarea(
+                    "cruce", (motor.huella_cartera, tabla_pagos.huella), "Procesando cruce...",
+                    cruzar_en_motor, df_deuda, motor.huella_cartera, motor.workers, tabla_pagos.df["TOTAL_PAGADO"], tabla_pagos.huella,
+                    filas=len(df_deuda)
+                )
+                cruce_pendiente = nuevo is None
+                if not cruce_pendiente:
+                    motor = nuevo
+                    st.session_state.motor_cruce = motor
+                    publicar_resultado(ConjuntoDatos.desde_motor(motor), motor)
+                    with etapa("almacén resultado"):
+                        persistir("resultado", motor.resultado, motor.huella, {"cartera": motor.huella_cartera, "pagos": motor.huellas_pagos})
 
-                pagos_resumen = df_pagos.groupby(["ID_COBRANZA", "PERIODO"])["IMPORTE"].sum().reset_index()
-                pagos_resumen.rename(columns={"IMPORTE": "TOTAL_PAGADO"}, inplace=True)
+            # Los pagos adicionales se aplican sobre el cruce de los archivos
+            # actuales: hasta que termine no se ofrecen
+            archivo_adicional = None if cruce_pendiente else st.file_uploader(
+                "➕ Agregar PAGOS adicionales (cruce incremental)",
+                type=FORMATOS,
+                help="Actualiza solo los casos con pagos nuevos, sin recalcular toda la cartera",
+                key="uploader_pagos_adicional"
+            )
+            if archivo_adicional:
+                with etapa("lectura pagos adicionales"):
+                    tabla_adicional = cargar_resumen_pagos(
+                        archivo_adicional, df_deuda, motor.huella_cartera, progreso=progreso_lectura("📖 Leyendo pagos adicionales...")
+                    )
+                for aviso in tabla_adicional.avisos:
+                    st.warning(aviso)
+                if not motor.aplicado(tabla_adicional.huella):
+                    with st.spinner("Aplicando pagos adicionales..."):
+                        with etapa("cruce incremental", len(tabla_adicional.df)):
+                            motor.agregar_resumen(tabla_adicional.df["TOTAL_PAGADO"], tabla_adicional.huella)
+                        publicar_resultado(ConjuntoDatos.desde_motor(motor), motor)
+                        with etapa("almacén resultado"):
+                            persistir("resultado", motor.resultado, motor.huella, {"cartera": motor.huella_cartera, "pagos": motor.huellas_pagos})
 
-                resultado = df_deuda.merge(pagos_resumen, on=["ID_COBRANZA", "PERIODO"], how="left")
-                resultado["TOTAL_PAGADO"] = resultado["TOTAL_PAGADO"].fillna(0)
-                resultado["SALDO_PENDIENTE"] = resultado["DEUDA"] - resultado["TOTAL_PAGADO"]
-                resultado["SALDO_PENDIENTE"] = resultado["SALDO_PENDIENTE"].apply(lambda x: max(0, x))
-                resultado["ESTADO"] = resultado.apply(
-                    lambda row: "✅ PAGADO" if row["TOTAL_PAGADO"] >= row["DEUDA"] else "⏳ PENDIENTE",
-                    axis=1
-                )
-                resultado["PORCENTAJE_PAGADO"] = (resultado["TOTAL_PAGADO"] / resultado["DEUDA"] * 100).round(2)
-                resultado["PORCENTAJE_PAGADO"] = resultado["PORCENTAJE_PAGADO"].apply(lambda x: min(100, x))
-
-                st.session_state.resultado_cruce = resultado
-
-                st.success("✅ Cruce realizado correctamente")
-                
-                st.markdown("---")
-                st.markdown("## 📈 MÉTRICAS EJECUTIVAS")
-
-                total_cartera = resultado["DEUDA"].sum()
-                total_recuperado = resultado["TOTAL_PAGADO"].sum()
-                saldo_pendiente = resultado["SALDO_PENDIENTE"].sum()
-                porcentaje_recuperacion = (total_recuperado / total_cartera * 100) if total_cartera > 0 else 0
-                total_casos = len(resultado)
-                casos_pagados = len(resultado[resultado["ESTADO"] == "✅ PAGADO"])
-                casos_pendientes = len(resultado[resultado["ESTADO"] == "⏳ PENDIENTE"])
-
-                col1, col2, col3, col4 = st.columns(4)
-                
-                with col1:
-                    st.metric("💼 CARTERA TOTAL", f"Bs. {total_cartera:,.2f}", f"{total_casos:,} casos")
-                with col2:
-                    st.metric("✅ RECUPERADO", f"Bs. {total_recuperado:,.2f}", f"{porcentaje_recuperacion:.1f}%")
-                with col3:
-                    st.metric("⏳ PENDIENTE", f"Bs. {saldo_pendiente:,.2f}", f"{casos_pendientes:,} casos")
-                with col4:
-                    st.metric("📊 EFECTIVIDAD", f"{porcentaje_recuperacion:.1f}%", f"{casos_pagados:,} pagados")
-
-                st.markdown("---")
-                
-                with st.expander("🔍 FILTROS Y BÚSQUEDA", expanded=False):
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        periodos = ["Todos"] + sorted(resultado["PERIODO"].unique().tolist())
-                        filtro_periodo = st.selectbox("📅 Periodo", periodos)
-                    with col2:
-                        tipos = ["Todos"] + sorted(resultado["TIPO"].unique().tolist())
-                        filtro_tipo = st.selectbox("🏷️ Tipo", tipos)
-                    with col3:
-                        estados = ["Todos", "✅ PAGADO", "⏳ PENDIENTE"]
-                        filtro_estado = st.selectbox("📊 Estado", estados)
-
-                resultado_filtrado = resultado.copy()
-                if filtro_periodo != "Todos":
-                    resultado_filtrado = resultado_filtrado[resultado_filtrado["PERIODO"] == filtro_periodo]
-                if filtro_tipo != "Todos":
-                    resultado_filtrado = resultado_filtrado[resultado_filtrado["TIPO"] == filtro_tipo]
-                if filtro_estado != "Todos":
-                    resultado_filtrado = resultado_filtrado[resultado_filtrado["ESTADO"] == filtro_estado]
-
-                st.markdown("## 📋 ANÁLISIS DETALLADO")
-                
-                tab1, tab2, tab3 = st.tabs(["🔝 TOP Deudores", "📊 Por Periodo", "📄 Detalle"])
-
-                with tab1:
-                    pendientes = resultado_filtrado[resultado_filtrado["ESTADO"] == "⏳ PENDIENTE"].copy()
-                    if len(pendientes) > 0:
-                        top_20 = pendientes.nlargest(20, "SALDO_PENDIENTE")
-                        st.dataframe(top_20[["ID_COBRANZA", "PERIODO", "TIPO", "DEUDA", "TOTAL_PAGADO", "SALDO_PENDIENTE"]], use_container_width=True, height=400)
-                        st.metric("💰 Saldo TOP 20", f"Bs. {top_20['SALDO_PENDIENTE'].sum():,.2f}")
-                    else:
-                        st.info("✅ No hay casos pendientes")
-
-                with tab2:
-                    resumen = resultado_filtrado.groupby("PERIODO").agg({
-                        "ID_COBRANZA": "count",
-                        "DEUDA": "sum",
-                        "TOTAL_PAGADO": "sum",
-                        "SALDO_PENDIENTE": "sum"
-                    }).reset_index()
-                    resumen.columns = ["PERIODO", "CASOS", "DEUDA", "PAGADO", "PENDIENTE"]
-                    resumen["EFECTIVIDAD_%"] = (resumen["PAGADO"] / resumen["DEUDA"] * 100).round(1)
-                    st.dataframe(resumen, use_container_width=True, height=400)
-
-                with tab3:
-                    st.dataframe(resultado_filtrado[["ID_COBRANZA", "PERIODO", "TIPO", "DEUDA", "TOTAL_PAGADO", "SALDO_PENDIENTE", "ESTADO"]], use_container_width=True, height=400)
-                    st.info(f"📊 Mostrando {len(resultado_filtrado):,} de {len(resultado):,} casos")
-
-            except Exception as e:
-                st.error(f"❌ Error: {str(e)}")
+        except ErrorEsquema as e:
+            st.error("❌ El archivo PAGOS no tiene las columnas obligatorias")
+            st.error(f"**Columnas requeridas:** {', '.join(e.requeridas)}")
+            st.error(f"**Columnas encontradas:** {', '.join(e.encontradas)}")
+            return
+        except Exception as e:
+            st.error(f"❌ Error: {str(e)}")
+            return
+
+    if st.session_state.conjunto_resultado is None:
+        return
+    resultado = st.session_state.conjunto_resultado.df
+    cubo = obtener_cubo()
+    indice = obtener_indice_filtros()
+
+    if cruce_pendiente:
+        st.info("🕘 Resultados del cruce anterior: el de los pagos actuales todavía no terminó")
+    elif not archivos_pagos:
+        st.info("🕘 Resultados del último cruce: sube los PAGOS para volver a cruzar")
+    else:
+        st.success("✅ Cruce realizado correctamente")
+    
+    st.markdown("---")
+    st.markdown("## 📈 MÉTRICAS EJECUTIVAS")
+
+    totales = cubo.totales()
+    total_cartera = totales["total_cartera"]
+    total_recuperado = totales["total_recuperado"]
+    saldo_pendiente = totales["saldo_pendiente"]
+    porcentaje_recuperacion = totales["porcentaje_recuperacion"]
+    total_casos = totales["total_casos"]
+    casos_pagados = totales["casos_pagados"]
+    casos_pendientes = totales["casos_pendientes"]
+
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("💼 CARTERA TOTAL", f"Bs. {total_cartera:,.2f}", f"{total_casos:,} casos")
+    with col2:
+        st.metric("✅ RECUPERADO", f"Bs. {total_recuperado:,.2f}", f"{porcentaje_recuperacion:.1f}%")
+    with col3:
+        st.metric("⏳ PENDIENTE", f"Bs. {saldo_pendiente:,.2f}", f"{casos_pendientes:,} casos")
+    with col4:
+        st.metric("📊 EFECTIVIDAD", f"{porcentaje_recuperacion:.1f}%", f"{casos_pagados:,} pagados")
+
+    st.markdown("---")
+    
+    with st.expander("🔍 FILTROS Y BÚSQUEDA", expanded=False):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            periodos = ["Todos"] + indice.valores("PERIODO")
+            filtro_periodo = st.selectbox("📅 Periodo", periodos)
+        with col2:
+            tipos = ["Todos"] + indice.valores("TIPO")
+            filtro_tipo = st.selectbox("🏷️ Tipo", tipos)
+        with col3:
+            estados = ["Todos", "✅ PAGADO", "⏳ PENDIENTE"]
+            filtro_estado = st.selectbox("📊 Estado", estados)
+
+    filtros = {
+        "periodo": None if filtro_periodo == "Todos" else filtro_periodo,
+        "tipo": None if filtro_tipo == "Todos" else filtro_tipo,
+        "estado": None if filtro_estado == "Todos" else filtro_estado,
+    }
+    with etapa("filtros"):
+        vista = indice.vista(**filtros)
+
+    st.markdown("## 📋 ANÁLISIS DETALLADO")
+    
+    tab1, tab2, tab3 = st.tabs(["🔝 TOP Deudores", "📊 Por Periodo", "📄 Detalle"])
 
+    with tab1:
+        with etapa("top pendientes", len(vista)):
+            top_20 = vista.top_pendientes(20, ["ID_COBRANZA", "PERIODO", "TIPO", "DEUDA", "TOTAL_PAGADO", "SALDO_PENDIENTE"])
+        if len(top_20) > 0:
+            with etapa("tabla TOP", len(top_20)):
+                st.dataframe(top_20, use_container_width=True, height=400)
+            st.metric("💰 Saldo TOP 20", f"Bs. {top_20['SALDO_PENDIENTE'].sum():,.2f}")
+        else:
+            st.info("✅ No hay casos pendientes")
+
+    with tab2:
+        with etapa("tabla por periodo"):
+            st.dataframe(cubo.filtrar(**filtros).resumen_periodo(), use_container_width=True, height=400)
+
+    with tab3:
+        columnas_detalle = ["ID_COBRANZA", "PERIODO", "TIPO", "DEUDA", "TOTAL_PAGADO", "SALDO_PENDIENTE", "ESTADO"]
+
+        col1, col2, col3, col4 = st.columns([2, 2, 1, 1])
+        with col1:
+            busqueda = st.text_input("🔎 Buscar ID_COBRANZA", key="detalle_busqueda")
+        with col2:
+            columna_orden = st.selectbox("↕️ Ordenar por", ["(sin orden)"] + columnas_detalle, key="detalle_orden")
+        with col3:
+            descendente = st.checkbox("Descendente", value=True, key="detalle_descendente")
+        with col4:
+            tamano_pagina = st.selectbox("Filas por página", [50, 100, 500, 1000], index=1, key="detalle_tamano")
+
+        columna_orden = None if columna_orden == "(sin orden)" else columna_orden
+        with etapa("orden y búsqueda", len(vista)):
+            total_filas = len(vista.seleccion(columna_orden, descendente, busqueda))
+        total_paginas = max(1, -(-total_filas // tamano_pagina))
+
+        # Cambiar filtros, orden, búsqueda o tamaño vuelve a la primera página
+        clave_detalle = (vista.clave, columna_orden, descendente, busqueda, tamano_pagina)
+        if st.session_state.get("detalle_clave") != clave_detalle:
+            st.session_state.detalle_clave = clave_detalle
+            st.session_state.detalle_pagina = 1
+        numero_pagina = st.number_input(
+            f"Página (de {total_paginas:,})", min_value=1, max_value=total_paginas, value=1, step=1, key="detalle_pagina"
+        )
+        numero_pagina = min(int(numero_pagina), total_paginas)
+
+        # Solo la página visible se envía al navegador
+        with etapa("página detalle"):
+            pagina = vista.pagina(numero_pagina, tamano_pagina, columna_orden, descendente, busqueda, columnas_detalle)
+        with etapa("tabla detalle", len(pagina)):
+            st.dataframe(pagina, use_container_width=True, height=400)
+
+        desde = (numero_pagina - 1) * tamano_pagina + 1 if total_filas else 0
+        hasta = min(numero_pagina * tamano_pagina, total_filas)
+        st.info(f"📊 Mostrando {desde:,}–{hasta:,} de {total_filas:,} casos filtrados ({len(resultado):,} en total)")
+
+    st.markdown("---")
+    st.markdown("## 📥 REPORTE EJECUTIVO")
+
+    # El libro se genera a pedido y una sola vez por resultado: descargarlo o
+    # cambiar filtros no lo vuelve a escribir
+    huella_resultado = st.session_state.conjunto_resultado.huella
+    reporte = st.session_state.get("reporte_excel")
+
+    if st.button("📊 Generar reporte Excel", use_container_width=True):
+        if reporte is not None:
+            reporte["archivo"].descartar()
+        with st.spinner(f"Escribiendo reporte de {len(resultado):,} filas..."), etapa("reporte excel", len(resultado)):
+            # El archivo se borra al generar otro o cuando se libera la sesión
+            reporte = {"huella": huella_resultado, "archivo": ArchivoTemporal(exportar_reporte_excel(resultado, cubo))}
+        st.session_state.reporte_excel = reporte
+
+    if reporte is not None and reporte["huella"] == huella_resultado and reporte["archivo"].existe():
+        with open(reporte["archivo"].ruta, "rb") as f:
+            st.download_button(
+                label="⬇️ Descargar reporte Excel (Resumen, Por Periodo, Por Tipo, TOP Deudores, Detalle)",
+                data=f,
+                file_name=f"REPORTE_COBRANZA_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key="download_reporte_excel",
+                use_container_width=True
+            )
 
 def modulo_graficos():
     st.markdown('<div class="main-header">📈 GRÁFICOS INTERACTIVOS AVANZADOS</div>', unsafe_allow_html=True)
 
-    if "resultado_cruce" not in st.session_state or st.session_state.resultado_cruce is None:
+    restaurar_ultima_cartera()
+
+    if st.session_state.get("conjunto_resultado") is None:
         st.warning("⚠️ **No hay datos cargados**")
         st.info("👉 Ve al módulo **'📊 Dashboard Cruce Deuda vs Pagos'** y carga tus archivos primero.")
         
@@ -286,53 +692,25 @@ def modulo_graficos():
         """)
         return
 
-    resultado = st.session_state.resultado_cruce
+    cubo = obtener_cubo()
+    totales = cubo.totales()
 
-    st.success(f"✅ Analizando {len(resultado):,} casos de cobranza")
-    
-    total_cartera = resultado["DEUDA"].sum()
-    total_recuperado = resultado["TOTAL_PAGADO"].sum()
-    saldo_pendiente = resultado["SALDO_PENDIENTE"].sum()
-    porcentaje_recuperacion = (total_recuperado / total_cartera * 100) if total_cartera > 0 else 0
-    total_casos = len(resultado)
-    casos_pagados = len(resultado[resultado["ESTADO"] == "✅ PAGADO"])
-    casos_pendientes = len(resultado[resultado["ESTADO"] == "⏳ PENDIENTE"])
+    st.success(f"✅ Analizando {totales['total_casos']:,} casos de cobranza")
 
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("💼 Cartera Total", f"Bs. {total_cartera:,.2f}")
+        st.metric("💼 Cartera Total", f"Bs. {totales['total_cartera']:,.2f}")
     with col2:
-        st.metric("✅ Recuperado", f"Bs. {total_recuperado:,.2f}")
+        st.metric("✅ Recuperado", f"Bs. {totales['total_recuperado']:,.2f}")
     with col3:
-        st.metric("⏳ Pendiente", f"Bs. {saldo_pendiente:,.2f}")
+        st.metric("⏳ Pendiente", f"Bs. {totales['saldo_pendiente']:,.2f}")
     with col4:
-        st.metric("📊 Efectividad", f"{porcentaje_recuperacion:.1f}%")
+        st.metric("📊 Efectividad", f"{totales['porcentaje_recuperacion']:.1f}%")
 
     st.markdown("---")
 
     st.markdown("## 💰 Comparativa: Recuperado vs Pendiente")
-    
-    fig_comparativa = go.Figure()
-    fig_comparativa.add_trace(go.Bar(
-        name='Recuperado',
-        x=['Monto Total'],
-        y=[total_recuperado],
-        marker_color='#28a745',
-        text=[f'Bs. {total_recuperado:,.2f}'],
-        textposition='auto',
-        hovertemplate='<b>Recuperado</b><br>Bs. %{y:,.2f}<extra></extra>'
-    ))
-    fig_comparativa.add_trace(go.Bar(
-        name='Pendiente',
-        x=['Monto Total'],
-        y=[saldo_pendiente],
-        marker_color='#dc3545',
-        text=[f'Bs. {saldo_pendiente:,.2f}'],
-        textposition='auto',
-        hovertemplate='<b>Pendiente</b><br>Bs. %{y:,.2f}<extra></extra>'
-    ))
-    fig_comparativa.update_layout(barmode='group', height=400, showlegend=True, hovermode='x unified')
-    st.plotly_chart(fig_comparativa, use_container_width=True)
+    mostrar_figura("comparativa", cubo)
 
     st.markdown("---")
 
@@ -340,101 +718,30 @@ def modulo_graficos():
 
     with col1:
         st.markdown("### 🎯 Distribución de Casos")
-        fig_pie = go.Figure(data=[go.Pie(
-            labels=['Pagado', 'Pendiente'],
-            values=[casos_pagados, casos_pendientes],
-            marker=dict(colors=['#28a745', '#ffc107']),
-            hole=0.4,
-            textinfo='label+percent+value',
-            hovertemplate='<b>%{label}</b><br>Casos: %{value}<br>%{percent}<extra></extra>'
-        )])
-        fig_pie.update_layout(height=400, annotations=[dict(text=f'{total_casos}<br>Total', x=0.5, y=0.5, font_size=20, showarrow=False)])
-        st.plotly_chart(fig_pie, use_container_width=True)
+        mostrar_figura("casos", cubo)
 
     with col2:
         st.markdown("### 💵 Distribución de Montos")
-        fig_pie_montos = go.Figure(data=[go.Pie(
-            labels=['Recuperado', 'Pendiente'],
-            values=[total_recuperado, saldo_pendiente],
-            marker=dict(colors=['#28a745', '#dc3545']),
-            hole=0.4,
-            textinfo='label+percent',
-            hovertemplate='<b>%{label}</b><br>Bs. %{value:,.2f}<br>%{percent}<extra></extra>'
-        )])
-        fig_pie_montos.update_layout(height=400, annotations=[dict(text=f'Bs. {total_cartera:,.0f}<br>Total', x=0.5, y=0.5, font_size=16, showarrow=False)])
-        st.plotly_chart(fig_pie_montos, use_container_width=True)
-
-    st.markdown("---")
-
-    st.markdown("## 📅 Evolución por Periodo")
-    periodo_analisis = resultado.groupby("PERIODO").agg({
-        "DEUDA": "sum",
-        "TOTAL_PAGADO": "sum",
-        "SALDO_PENDIENTE": "sum"
-    }).reset_index()
-    
-    fig_periodo = go.Figure()
-    fig_periodo.add_trace(go.Bar(name='Deuda Total', x=periodo_analisis['PERIODO'], y=periodo_analisis['DEUDA'], marker_color='#667eea'))
-    fig_periodo.add_trace(go.Bar(name='Pagado', x=periodo_analisis['PERIODO'], y=periodo_analisis['TOTAL_PAGADO'], marker_color='#28a745'))
-    fig_periodo.add_trace(go.Bar(name='Pendiente', x=periodo_analisis['PERIODO'], y=periodo_analisis['SALDO_PENDIENTE'], marker_color='#ffc107'))
-    fig_periodo.update_layout(barmode='group', height=450, xaxis_title="Periodo", yaxis_title="Monto (Bs.)", hovermode='x unified')
-    st.plotly_chart(fig_periodo, use_container_width=True)
+        mostrar_figura("montos", cubo)
 
     st.markdown("---")
 
-    st.markdown("## 🏷️ Distribución por Tipo de Deuda")
-    tipo_analisis = resultado.groupby("TIPO").agg({"DEUDA": "sum", "TOTAL_PAGADO": "sum"}).reset_index()
-    tipo_analisis["Pendiente"] = tipo_analisis["DEUDA"] - tipo_analisis["TOTAL_PAGADO"]
-    
-    fig_tipo = go.Figure()
-    fig_tipo.add_trace(go.Bar(name='Recuperado', x=tipo_analisis['TIPO'], y=tipo_analisis['TOTAL_PAGADO'], marker_color='#28a745'))
-    fig_tipo.add_trace(go.Bar(name='Pendiente', x=tipo_analisis['TIPO'], y=tipo_analisis['Pendiente'], marker_color='#ffc107'))
-    fig_tipo.update_layout(barmode='stack', height=450, xaxis_title="Tipo de Deuda", yaxis_title="Monto (Bs.)", hovermode='x unified')
-    st.plotly_chart(fig_tipo, use_container_width=True)
-
-    st.markdown("---")
+    # Las secciones de más abajo solo se construyen cuando se abren
+    if st.toggle("📅 Evolución por Periodo", key="grafico_periodo"):
+        mostrar_figura("periodo", cubo)
 
-    st.markdown("## 🎯 Efectividad por Periodo")
-    efectividad_periodo = resultado.groupby("PERIODO").apply(
-        lambda x: (x["TOTAL_PAGADO"].sum() / x["DEUDA"].sum() * 100) if x["DEUDA"].sum() > 0 else 0
-    ).reset_index()
-    efectividad_periodo.columns = ["PERIODO", "EFECTIVIDAD"]
-    
-    fig_efectividad = go.Figure()
-    fig_efectividad.add_trace(go.Scatter(
-        x=efectividad_periodo['PERIODO'],
-        y=efectividad_periodo['EFECTIVIDAD'],
-        mode='lines+markers+text',
-        line=dict(color='#667eea', width=3),
-        marker=dict(size=12, color='#764ba2'),
-        text=[f'{val:.1f}%' for val in efectividad_periodo['EFECTIVIDAD']],
-        textposition='top center'
-    ))
-    fig_efectividad.add_hline(y=70, line_dash="dash", line_color="green", annotation_text="Meta: 70%")
-    fig_efectividad.add_hline(y=50, line_dash="dot", line_color="orange", annotation_text="Umbral: 50%")
-    fig_efectividad.update_layout(height=400, xaxis_title="Periodo", yaxis_title="Efectividad (%)", yaxis_range=[0, 100])
-    st.plotly_chart(fig_efectividad, use_container_width=True)
+    if st.toggle("🏷️ Distribución por Tipo de Deuda", key="grafico_tipo"):
+        mostrar_figura("tipo", cubo)
 
-    st.markdown("---")
+    if st.toggle("🎯 Efectividad por Periodo", key="grafico_efectividad"):
+        mostrar_figura("efectividad", cubo)
 
-    st.markdown("## 🔝 TOP 10 Deudores")
-    pendientes = resultado[resultado["ESTADO"] == "⏳ PENDIENTE"].copy()
-    
-    if len(pendientes) > 0:
-        top_10 = pendientes.nlargest(10, "SALDO_PENDIENTE")
-        fig_top = go.Figure(go.Bar(
-            x=top_10['SALDO_PENDIENTE'],
-            y=top_10['ID_COBRANZA'],
-            orientation='h',
-            marker=dict(color=top_10['SALDO_PENDIENTE'], colorscale='Reds', showscale=True),
-            text=[f'Bs. {val:,.2f}' for val in top_10['SALDO_PENDIENTE']],
-            textposition='auto'
-        ))
-        fig_top.update_layout(height=500, xaxis_title="Saldo (Bs.)", yaxis_title="ID Cobranza", yaxis=dict(autorange="reversed"))
-        st.plotly_chart(fig_top, use_container_width=True)
-        st.metric("💰 Saldo Total TOP 10", f"Bs. {top_10['SALDO_PENDIENTE'].sum():,.2f}")
-    else:
-        st.info("✅ No hay casos pendientes")
+    if st.toggle("🔝 TOP 10 Deudores", key="grafico_top"):
+        if len(cubo.top_pendientes) > 0:
+            mostrar_figura("top", cubo)
+            st.metric("💰 Saldo Total TOP 10", f"Bs. {cubo.top_pendientes.head(10)['SALDO_PENDIENTE'].sum():,.2f}")
+        else:
+            st.info("✅ No hay casos pendientes")
 
     st.markdown("---")
     st.info("💡 **Tip:** Pasa el mouse sobre los gráficos para ver detalles. Haz zoom, descarga imágenes con el ícono de cámara.")
@@ -443,32 +750,33 @@ def modulo_graficos():
 def modulo_sms():
     st.markdown('<div class="main-header">📲 GENERADOR DE SMS - CLIENTE VIVA</div>', unsafe_allow_html=True)
     
+    restaurar_ultima_cartera()
+
     # Verificar que exista cartera cargada
-    if "df_deuda_base" not in st.session_state or st.session_state.df_deuda_base is None:
+    cartera = st.session_state.get("conjunto_cartera")
+    if cartera is None:
         st.warning("⚠️ **No hay CARTERA cargada en el sistema**")
         st.info("👉 Primero debes ir al módulo **'📊 Dashboard Cruce Deuda vs Pagos'** y cargar la CARTERA base.")
         return
     
-    df_cartera = st.session_state.df_deuda_base.copy()
+    # La cartera de la sesión se usa tal cual, sin copiarla: cada paso lee
+    # solo las columnas que necesita y los filtros no duplican los datos
+    df_cartera = cartera.df
+    # La cartera se parte por TIPO una vez por carga, con los agregados por
+    # código ya sumados: marcar o desmarcar tipos no vuelve a recorrerla
+    particion = derivado("particion_tipos_sms", cartera.huella, lambda: ParticionTipos.construir(df_cartera))
+    tipo_conteo = particion.registros
     
-    st.success(f"✅ Cartera VIVA disponible: {len(df_cartera):,} registros | {df_cartera['ID_COBRANZA'].nunique()} códigos | {df_cartera['TIPO'].nunique()} tipos")
+    st.success(f"✅ Cartera VIVA disponible: {len(df_cartera):,} registros | {particion.total_codigos} códigos | {len(tipo_conteo)} tipos")
     
     st.markdown("---")
     
-    # Función para limpiar columnas
-    def limpiar_columnas(df):
-        df.columns = df.columns.str.strip().str.upper().str.replace(" ", "_")
-        return df
-    
     # ==========================================
     # PASO 1: SELECCIÓN DE TIPOS (MEJORADA)
     # ==========================================
     st.markdown("### 🎯 PASO 1: Seleccionar TIPOS de Cartera para la Campaña")
     
-    tipos_disponibles = sorted(df_cartera["TIPO"].unique().tolist())
-    
-    # Obtener conteo de registros por tipo
-    tipo_conteo = df_cartera.groupby("TIPO").size().to_dict()
+    tipos_disponibles = particion.tipos
     
     st.markdown('<div class="tipo-box">', unsafe_allow_html=True)
     
@@ -536,19 +844,20 @@ def modulo_sms():
         st.info("💡 Marca la casilla de un tipo específico o selecciona TODOS")
         return
     
-    # Filtrar cartera por tipos seleccionados
-    df_cartera_filtrada = df_cartera[df_cartera["TIPO"].isin(tipos_seleccionados)].copy()
+    # El resumen de los tipos elegidos sale de la partición, sin filtrar la cartera
+    clave_tipos = (cartera.huella, tuple(tipos_seleccionados))
+    resumen_filtro = derivado("resumen_tipos_sms", clave_tipos, lambda: particion.resumen(tipos_seleccionados))
     
     st.markdown("---")
     
     # Mostrar resumen de la cartera filtrada
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("📄 Registros Filtrados", f"{len(df_cartera_filtrada):,}")
+        st.metric("📄 Registros Filtrados", f"{resumen_filtro['registros']:,}")
     with col2:
-        st.metric("👤 Códigos Únicos", f"{df_cartera_filtrada['ID_COBRANZA'].nunique():,}")
+        st.metric("👤 Códigos Únicos", f"{resumen_filtro['codigos']:,}")
     with col3:
-        st.metric("💰 Deuda Total", f"Bs. {df_cartera_filtrada['DEUDA'].sum():,.2f}")
+        st.metric("💰 Deuda Total", f"Bs. {resumen_filtro['deuda']:,.2f}")
     
     st.markdown("---")
     
@@ -558,7 +867,7 @@ def modulo_sms():
     st.markdown("### 📂 PASO 2: Cargar BASE SUSCRIPTOR")
     archivo_suscriptor = st.file_uploader(
         "Subir archivo SUSCRIPTOR (NUMERO, NOMBRE, FECHA, CODIGO)",
-        type=["xlsx"],
+        type=FORMATOS,
         key="sms_suscriptor"
     )
     
@@ -567,19 +876,16 @@ def modulo_sms():
         return
     
     try:
-        df_suscriptor = pd.read_excel(archivo_suscriptor)
-        df_suscriptor = limpiar_columnas(df_suscriptor)
-        
-        columnas_suscriptor = {"CODIGO", "NUMERO", "NOMBRE", "FECHA"}
-        if not columnas_suscriptor.issubset(df_suscriptor.columns):
-            st.error("❌ Columnas faltantes en SUSCRIPTOR")
-            st.error(f"**Requeridas:** CODIGO, NUMERO, NOMBRE, FECHA")
-            st.error(f"**Encontradas:** {', '.join(df_suscriptor.columns)}")
-            return
-        
-        df_suscriptor["CODIGO"] = df_suscriptor["CODIGO"].astype(str)
+        with etapa("lectura suscriptores"):
+            tabla_suscriptor = cargar_tabla(archivo_suscriptor, "SUSCRIPTOR", progreso=progreso_lectura("📖 Leyendo suscriptores..."))
+        df_suscriptor = tabla_suscriptor.df
         st.success(f"✅ Suscriptores: {len(df_suscriptor):,} registros")
         
+    except ErrorEsquema as e:
+        st.error("❌ Columnas faltantes en SUSCRIPTOR")
+        st.error(f"**Requeridas:** {', '.join(e.requeridas)}")
+        st.error(f"**Encontradas:** {', '.join(e.encontradas)}")
+        return
     except Exception as e:
         st.error(f"❌ Error: {str(e)}")
         return
@@ -590,36 +896,33 @@ def modulo_sms():
     # PASO 3: Cargar BASE PAGOS
     # ==========================================
     st.markdown("### 💵 PASO 3: Cargar BASE PAGOS")
-    archivo_pagos = st.file_uploader(
-        "Subir archivo PAGOS (CODIGO, PERIODO, IMPORTE)",
-        type=["xlsx"],
+    archivos_pagos = st.file_uploader(
+        "Subir archivo(s) PAGOS (CODIGO, PERIODO, IMPORTE)",
+        type=FORMATOS,
+        accept_multiple_files=True,
         key="sms_pagos"
     )
     
-    if not archivo_pagos:
+    if not archivos_pagos:
         st.info("⬆️ Sube el archivo de pagos para continuar")
         return
     
     try:
-        df_pagos = pd.read_excel(archivo_pagos)
-        df_pagos = limpiar_columnas(df_pagos)
-        
-        if "ID_COBRANZA" in df_pagos.columns:
-            df_pagos = df_pagos.rename(columns={"ID_COBRANZA": "CODIGO"})
-        
-        columnas_pagos = {"CODIGO", "PERIODO", "IMPORTE"}
-        if not columnas_pagos.issubset(df_pagos.columns):
-            st.error("❌ Columnas faltantes en PAGOS")
-            st.error(f"**Requeridas:** CODIGO, PERIODO, IMPORTE")
-            st.error(f"**Encontradas:** {', '.join(df_pagos.columns)}")
-            return
-        
-        df_pagos["CODIGO"] = df_pagos["CODIGO"].astype(str)
-        df_pagos["PERIODO"] = df_pagos["PERIODO"].astype(str)
-        df_pagos["IMPORTE"] = pd.to_numeric(df_pagos["IMPORTE"], errors="coerce").fillna(0)
+        clave_pagos = clave_duplicados(archivos_pagos, "PAGOS_SMS", "sms_pagos_duplicados")
+        with st.spinner("Leyendo pagos..."), etapa("lectura pagos"):
+            tabla_pagos_sms = cargar_tablas(
+                archivos_pagos, "PAGOS_SMS", clave_pagos, int(workers_cruce), progreso=progreso_lectura("📖 Leyendo pagos...")
+            )
+        df_pagos = tabla_pagos_sms.df
         
         st.success(f"✅ Pagos: {len(df_pagos):,} registros")
+        informar_combinacion(archivos_pagos, tabla_pagos_sms)
         
+    except ErrorEsquema as e:
+        st.error("❌ Columnas faltantes en PAGOS")
+        st.error(f"**Requeridas:** {', '.join(e.requeridas)}")
+        st.error(f"**Encontradas:** {', '.join(e.encontradas)}")
+        return
     except Exception as e:
         st.error(f"❌ Error: {str(e)}")
         return
@@ -631,48 +934,28 @@ def modulo_sms():
     # ==========================================
     st.markdown("### 🔗 PASO 4: Cruce y Depuración Automática")
     
+    try:
+        # Los pagos por CODIGO y la ubicación de los suscriptores en la
+        # cartera no dependen de los tipos: se calculan una vez por archivos,
+        # en segundo plano si está activado
+        suscriptores_sms = derivado_en_tarea(
+            "suscriptores_sms", (cartera.huella, tabla_suscriptor.huella, tabla_pagos_sms.huella),
+            "Procesando cruce con cartera VIVA...", SuscriptoresSMS.construir, df_suscriptor, df_pagos, particion
+        )
+    except Exception as e:
+        st.error(f"❌ Error en cruce: {str(e)}")
+        return
+    if suscriptores_sms is None:
+        return
+    
     with st.spinner("Procesando cruce con cartera VIVA..."):
         try:
-            # Preparar cartera filtrada
-            df_cartera_filtrada["CODIGO"] = df_cartera_filtrada["ID_COBRANZA"].astype(str)
-            df_cartera_filtrada["PERIODO"] = df_cartera_filtrada["PERIODO"].astype(str)
-            
-            # Calcular periodos totales por código
-            periodos_totales = df_cartera_filtrada.groupby("CODIGO")["PERIODO"].count().reset_index()
-            periodos_totales.columns = ["CODIGO", "PERIODOS_TOTALES"]
-            
-            # Calcular deuda total por código
-            deuda_total = df_cartera_filtrada.groupby("CODIGO")["DEUDA"].sum().reset_index()
-            deuda_total.columns = ["CODIGO", "DEUDA_TOTAL"]
-            
-            # Calcular periodos pagados por código
-            periodos_pagados = df_pagos.groupby("CODIGO")["PERIODO"].count().reset_index()
-            periodos_pagados.columns = ["CODIGO", "PERIODOS_PAGADOS"]
-            
-            # Calcular total pagado por código
-            total_pagado = df_pagos.groupby("CODIGO")["IMPORTE"].sum().reset_index()
-            total_pagado.columns = ["CODIGO", "TOTAL_PAGADO"]
-            
-            # Merge con suscriptor
-            df_analisis = df_suscriptor.copy()
-            df_analisis = df_analisis.merge(periodos_totales, on="CODIGO", how="left")
-            df_analisis = df_analisis.merge(deuda_total, on="CODIGO", how="left")
-            df_analisis = df_analisis.merge(periodos_pagados, on="CODIGO", how="left")
-            df_analisis = df_analisis.merge(total_pagado, on="CODIGO", how="left")
-            
-            # Rellenar NaN
-            df_analisis["PERIODOS_TOTALES"] = df_analisis["PERIODOS_TOTALES"].fillna(0).astype(int)
-            df_analisis["PERIODOS_PAGADOS"] = df_analisis["PERIODOS_PAGADOS"].fillna(0).astype(int)
-            df_analisis["DEUDA_TOTAL"] = df_analisis["DEUDA_TOTAL"].fillna(0)
-            df_analisis["TOTAL_PAGADO"] = df_analisis["TOTAL_PAGADO"].fillna(0)
-            
-            # Calcular pendientes
-            df_analisis["PERIODOS_PENDIENTES"] = df_analisis["PERIODOS_TOTALES"] - df_analisis["PERIODOS_PAGADOS"]
-            df_analisis["SALDO_PENDIENTE"] = df_analisis["DEUDA_TOTAL"] - df_analisis["TOTAL_PAGADO"]
-            df_analisis["SALDO_PENDIENTE"] = df_analisis["SALDO_PENDIENTE"].apply(lambda x: max(0, x))
+            # Cambiar de tipos solo suma los agregados ya calculados de cada uno
+            clave_analisis = (*clave_tipos, tabla_suscriptor.huella, tabla_pagos_sms.huella)
+            df_analisis = derivado("analisis_sms", clave_analisis, lambda: suscriptores_sms.analizar(tipos_seleccionados))
             
             # SIEMPRE DEPURAR: Eliminar pagos totales
-            df_analisis_depurado = df_analisis[df_analisis["PERIODOS_PENDIENTES"] > 0].copy()
+            df_analisis_depurado = derivado("depuracion_sms", clave_analisis, lambda: depurar_pagos_totales(df_analisis))
             
             eliminados_pago_total = len(df_analisis) - len(df_analisis_depurado)
             
@@ -723,12 +1006,10 @@ def modulo_sms():
     )
     
     # Filtrar según opción
-    if "AGRESIVA" in opcion_campana:
-        df_campana = df_analisis_depurado[df_analisis_depurado["PERIODOS_PAGADOS"] == 0].copy()
-        tipo_campana = "MOROSOS"
-    else:
-        df_campana = df_analisis_depurado.copy()
-        tipo_campana = "GENERAL"
+    agresiva = "AGRESIVA" in opcion_campana
+    df_campana, tipo_campana = derivado(
+        "campana_sms", (*clave_analisis, agresiva), lambda: seleccionar_campana(df_analisis_depurado, agresiva)
+    )
     
     if len(df_campana) == 0:
         st.warning(f"⚠️ No hay clientes para esta campaña")
@@ -764,63 +1045,156 @@ def modulo_sms():
     # ==========================================
     # Botón generar
     # ==========================================
+    # El zip se genera una vez por campaña y configuración; los reruns
+    # posteriores (por ejemplo, al descargar) solo vuelven a ofrecerlo
+    clave_exportacion = (*clave_analisis, tipo_campana, int(num_archivos), prefijo)
+    exportacion = st.session_state.get("exportacion_sms")
+
     if st.button("🚀 GENERAR ARCHIVOS SMS PARA CAMPAÑA", type="primary", use_container_width=True):
-        
-        st.markdown("### 📥 ARCHIVOS GENERADOS:")
-        
-        # Preparar datos para SMS
-        df_csv = df_campana[["NUMERO", "NOMBRE", "FECHA", "CODIGO", "SALDO_PENDIENTE"]].copy()
-        df_csv = df_csv.rename(columns={"SALDO_PENDIENTE": "MONTO"})
-        
-        # Información de la campaña
-        st.markdown('<div class="tipo-box">', unsafe_allow_html=True)
-        st.markdown(f"""
-        **📊 RESUMEN DE CAMPAÑA VIVA:**
-        
-        - **Tipos incluidos:** {', '.join(tipos_seleccionados)}
-        - **Total registros:** {len(df_csv):,}
-        - **Tipo de campaña:** {tipo_campana}
-        - **Archivos a generar:** {num_archivos}
-        - **Saldo total:** Bs. {df_csv['MONTO'].sum():,.2f}
-        """)
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        st.markdown("---")
-        
-        # Dividir en archivos
-        tamaño = len(df_csv) // num_archivos + 1
-        
-        for i in range(num_archivos):
-            inicio = i * tamaño
-            fin = inicio + tamaño
-            df_parte = df_csv.iloc[inicio:fin]
-            
-            if df_parte.empty:
-                continue
-            
-            csv = df_parte.to_csv(index=False, sep=";", encoding="utf-8-sig")
-            
-            nombre_archivo = f"{prefijo}_{i+1}.csv" if num_archivos > 1 else f"{prefijo}.csv"
-            
-            st.download_button(
-                label=f"⬇️ {nombre_archivo} ({len(df_parte):,} registros | Bs. {df_parte['MONTO'].sum():,.2f})",
-                data=csv,
-                file_name=nombre_archivo,
-                mime="text/csv",
-                key=f"download_{i}",
-                use_container_width=True
-            )
-        
-        st.success(f"✅ {num_archivos} archivo(s) generado(s) exitosamente para campaña VIVA")
+        if exportacion is not None:
+            exportacion["archivo"].descartar()
+        with st.spinner("Escribiendo archivos de campaña..."):
+            with etapa("exportación zip", len(df_campana)):
+                ruta, partes = exportar_campana_zip(df_campana, int(num_archivos), prefijo)
+        # El zip se borra al generar otro o cuando se libera la sesión
+        exportacion = {"clave": clave_exportacion, "archivo": ArchivoTemporal(ruta), "partes": partes}
+        st.session_state.exportacion_sms = exportacion
         st.balloons()
 
+    if exportacion is None or exportacion["clave"] != clave_exportacion or not exportacion["archivo"].existe():
+        return
+
+    partes = exportacion["partes"]
+    total_registros = sum(parte.registros for parte in partes)
+    total_monto = sum(parte.monto for parte in partes)
+
+    st.markdown("### 📥 ARCHIVOS GENERADOS:")
+
+    # Información de la campaña
+    st.markdown('<div class="tipo-box">', unsafe_allow_html=True)
+    st.markdown(f"""
+    **📊 RESUMEN DE CAMPAÑA VIVA:**
+    
+    - **Tipos incluidos:** {', '.join(tipos_seleccionados)}
+    - **Total registros:** {total_registros:,}
+    - **Tipo de campaña:** {tipo_campana}
+    - **Archivos generados:** {len(partes)}
+    - **Saldo total:** Bs. {total_monto:,.2f}
+    """)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+    st.dataframe(
+        pd.DataFrame({
+            "ARCHIVO": [parte.nombre for parte in partes],
+            "REGISTROS": [f"{parte.registros:,}" for parte in partes],
+            "MONTO": [f"Bs. {parte.monto:,.2f}" for parte in partes],
+        }),
+        use_container_width=True,
+        hide_index=True
+    )
+
+    with open(exportacion["archivo"].ruta, "rb") as f:
+        st.download_button(
+            label=f"⬇️ {prefijo}.zip ({len(partes)} archivo(s) | {total_registros:,} registros)",
+            data=f,
+            file_name=f"{prefijo}.zip",
+            mime="application/zip",
+            key="download_zip_sms",
+            use_container_width=True
+        )
+
+    st.success(f"✅ {len(partes)} archivo(s) generado(s) exitosamente para campaña VIVA")
+
+
+@st.cache_data(show_spinner=False)
+def resumen_historico(snapshot_id, periodos, tipos):
+    # Los snapshots son inmutables: el resumen de cada uno se calcula una vez.
+    # Con DuckDB se agrega directo sobre el Parquet, sin cargar las columnas
+    if HAY_DUCKDB:
+        with BaseSQL(":memory:", "duckdb") as base:
+            return base.resumir_snapshot(almacen.ruta("resultado", snapshot_id), periodos, tipos)
+    df = almacen.leer(
+        "resultado",
+        snapshot_id,
+        columnas=["PERIODO", "DEUDA", "TOTAL_PAGADO", "SALDO_PENDIENTE"],
+        filtros={"PERIODO": list(periodos), "TIPO": list(tipos)}
+    )
+    return df.groupby("PERIODO", observed=True)[["DEUDA", "TOTAL_PAGADO", "SALDO_PENDIENTE"]].sum().reset_index()
+
+
+def modulo_historico():
+    st.markdown('<div class="main-header">🗂️ MÓDULO HISTÓRICO DE RECUPERACIÓN</div>', unsafe_allow_html=True)
+
+    snapshots = almacen.snapshots("resultado")
+    if not snapshots:
+        st.info("📭 Aún no hay cruces guardados. Cada cruce realizado en el **'📊 Dashboard Cruce Deuda vs Pagos'** se guarda automáticamente aquí.")
+        return
+
+    st.success(f"✅ {len(snapshots)} corte(s) de cruce guardados en `{almacen.directorio}`")
+
+    periodos_disponibles = sorted(set().union(*(e["periodos"] for e in snapshots)))
+    tipos_disponibles = sorted(set().union(*(e["tipos"] for e in snapshots)))
+
+    col1, col2 = st.columns(2)
+    with col1:
+        periodos = st.multiselect("📅 Periodos", periodos_disponibles, default=periodos_disponibles)
+    with col2:
+        tipos = st.multiselect("🏷️ Tipos", tipos_disponibles, default=tipos_disponibles)
+
+    if not periodos or not tipos:
+        st.warning("⚠️ Selecciona al menos un periodo y un tipo")
+        return
+
+    partes = []
+    for entrada in snapshots:
+        resumen = resumen_historico(entrada["id"], tuple(periodos), tuple(tipos))
+        if len(resumen) == 0:
+            continue
+        resumen["CORTE"] = entrada["creado"].replace("T", " ")
+        partes.append(resumen)
+
+    if not partes:
+        st.info("✅ No hay datos para los filtros seleccionados")
+        return
+
+    historico = pd.concat(partes, ignore_index=True)
+    historico["PERIODO"] = historico["PERIODO"].astype(str)
+    historico["RECUPERACION_%"] = (historico["TOTAL_PAGADO"] / historico["DEUDA"].where(historico["DEUDA"] > 0) * 100).fillna(0).round(1)
+
+    ultimo = historico[historico["CORTE"] == historico["CORTE"].max()]
+    total_deuda = ultimo["DEUDA"].sum()
+    total_pagado = ultimo["TOTAL_PAGADO"].sum()
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("💼 Cartera (último corte)", f"Bs. {total_deuda:,.2f}")
+    with col2:
+        st.metric("✅ Recuperado (último corte)", f"Bs. {total_pagado:,.2f}")
+    with col3:
+        st.metric("📊 Recuperación", f"{(total_pagado / total_deuda * 100) if total_deuda > 0 else 0:.1f}%")
+
+    st.markdown("---")
+
+    st.markdown("## 📈 Evolución de la Recuperación por Periodo")
+    fig_historico = go.Figure()
+    for periodo, datos in historico.groupby("PERIODO"):
+        fig_historico.add_trace(go.Scatter(x=datos["CORTE"], y=datos["RECUPERACION_%"], mode="lines+markers", name=periodo))
+    fig_historico.update_layout(height=450, xaxis_title="Corte", yaxis_title="Recuperación (%)", yaxis_range=[0, 100], hovermode="x unified")
+    st.plotly_chart(fig_historico, use_container_width=True)
+
+    st.markdown("## 📋 Recuperación por Periodo y Corte")
+    tabla = historico.pivot_table(index="PERIODO", columns="CORTE", values="RECUPERACION_%", aggfunc="sum")
+    st.dataframe(tabla, use_container_width=True)
+
+
+with etapa(menu):
+    if menu == "📊 Dashboard Cruce Deuda vs Pagos":
+        modulo_cruce()
+    elif menu == "📈 Gráficos Interactivos":
+        modulo_graficos()
+    elif menu == "📲 GENERADOR DE SMS":
+        modulo_sms()
+    elif menu == "🗂️ Módulo Histórico":
+        modulo_historico()
 
-if menu == "📊 Dashboard Cruce Deuda vs Pagos":
-    modulo_cruce()
-elif menu == "📈 Gráficos Interactivos":
-    modulo_graficos()
-elif menu == "📲 GENERADOR DE SMS":
-    modulo_sms()
-elif menu == "🚧 Módulo Histórico (En Desarrollo)":
-    st.title("📈 Módulo Histórico")
-    st.info("🚧 Este módulo está en desarrollo. Próximamente podrás ver análisis históricos acumulados.")
+mostrar_diagnostico()
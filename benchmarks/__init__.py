@@ -0,0 +1 @@
+"""Benchmarks del SISTEMA DE COBRANZA. Ejecutar desde la raíz del repositorio con ``python -m benchmarks.<modulo>``."""
@@ -0,0 +1,57 @@
+"""Cruce Deuda vs Pagos: merge sobre toda la cartera vs particionado por PERIODO con 1..N procesos.
+
+    python -m benchmarks.bench_cruce_paralelo --filas 1000000 3000000 --workers 1 2 4 8 16
+"""
+import argparse
+import os
+
+import pandas as pd
+
+from benchmarks.datos import generar_cartera, generar_pagos
+from benchmarks.harness import cronometrar
+from cobranza.calculos import calcular_derivadas
+from cobranza.cruce import CLAVE, resumir_pagos
+from cobranza.paralelo import cerrar_pool, cruzar_particionado, obtener_pool
+
+
+def cruce_merge(df_deuda, pagos_resumen):
+    # Implementación original de modulo_cruce(), como referencia
+    resultado = df_deuda.merge(pagos_resumen.reset_index(), on=CLAVE, how="left")
+    resultado["TOTAL_PAGADO"] = resultado["TOTAL_PAGADO"].fillna(0)
+    return calcular_derivadas(resultado)
+
+
+def generar(filas, periodos=24, semilla=42):
+    """Cartera de ``filas`` filas en ``periodos`` periodos y el resumen de sus pagos."""
+    df_deuda = generar_cartera(filas, periodos, periodos_por_cliente=periodos / 2, semilla=semilla)
+    return df_deuda, resumir_pagos(generar_pagos(df_deuda, semilla=semilla + 1), df_deuda)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, nargs="+", default=[1_000_000])
+    parser.add_argument("--periodos", type=int, default=24)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+    workers = sorted(set(args.workers))
+
+    print(f"CPUs disponibles: {os.cpu_count()}")
+    print(f"{'FILAS':>12} {'MODO':>12} {'TIEMPO (s)':>12} {'VS MERGE':>10}")
+    for filas in args.filas:
+        df_deuda, pagos_resumen = generar(filas, args.periodos)
+        t_merge, esperado = cronometrar(cruce_merge, df_deuda, pagos_resumen)
+        print(f"{filas:>12,} {'merge':>12} {t_merge:>12.3f} {'1.0x':>10}")
+
+        for n in workers:
+            if n > 1:
+                # El arranque del pool no se mide: en la app el pool se reutiliza
+                list(obtener_pool(n).map(abs, range(n)))
+            t, obtenido = cronometrar(cruzar_particionado, df_deuda, pagos_resumen, n)
+            pd.testing.assert_frame_equal(esperado, obtenido)
+            modo = "serial" if n == 1 else f"{n} procesos"
+            print(f"{filas:>12,} {modo:>12} {t:>12.3f} {t_merge / t:>9.1f}x")
+    cerrar_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Derivación de ESTADO / SALDO_PENDIENTE / PORCENTAJE_PAGADO: apply fila a fila vs vectorizado.
+
+    python -m benchmarks.bench_derivadas --filas 100000 1000000 5000000
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.harness import cronometrar
+from cobranza.calculos import calcular_derivadas
+
+
+def derivadas_con_apply(resultado):
+    # Implementación original de modulo_cruce(), como referencia
+    resultado["SALDO_PENDIENTE"] = resultado["DEUDA"] - resultado["TOTAL_PAGADO"]
+    resultado["SALDO_PENDIENTE"] = resultado["SALDO_PENDIENTE"].apply(lambda x: max(0, x))
+    resultado["ESTADO"] = resultado.apply(
+        lambda row: "✅ PAGADO" if row["TOTAL_PAGADO"] >= row["DEUDA"] else "⏳ PENDIENTE",
+        axis=1
+    )
+    resultado["PORCENTAJE_PAGADO"] = (resultado["TOTAL_PAGADO"] / resultado["DEUDA"] * 100).round(2)
+    resultado["PORCENTAJE_PAGADO"] = resultado["PORCENTAJE_PAGADO"].apply(lambda x: min(100, x))
+    return resultado
+
+
+def generar(filas, semilla=42):
+    rng = np.random.default_rng(semilla)
+    deuda = rng.uniform(10, 2000, filas).round(2)
+    # ~40% sin pago, ~30% pago parcial, ~30% pago total
+    fraccion = rng.choice([0.0, 0.5, 1.0], size=filas, p=[0.4, 0.3, 0.3])
+    return pd.DataFrame({"DEUDA": deuda, "TOTAL_PAGADO": (deuda * fraccion).round(2)})
+
+
+def medir(funcion, df):
+    # Las dos versiones escriben columnas: cada una recibe su copia
+    return cronometrar(funcion, df.copy())[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument("--sin-apply", action="store_true", help="Omitir la versión con apply (lenta en tamaños grandes)")
+    args = parser.parse_args()
+
+    print(f"{'FILAS':>12} {'APPLY (s)':>12} {'VECTOR (s)':>12} {'ACELERACIÓN':>12}")
+    for filas in args.filas:
+        df = generar(filas)
+        t_vector = medir(calcular_derivadas, df)
+        if args.sin_apply:
+            print(f"{filas:>12,} {'-':>12} {t_vector:>12.3f} {'-':>12}")
+            continue
+        t_apply = medir(derivadas_con_apply, df)
+        print(f"{filas:>12,} {t_apply:>12.3f} {t_vector:>12.3f} {t_apply / t_vector:>11.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""Tiempo de carga de un archivo de PAGOS según el formato (xlsx, csv, parquet).
+
+    python -m benchmarks.bench_formatos --filas 1000000
+"""
+import argparse
+
+from benchmarks.datos import generar_cartera, generar_pagos, serializar
+from benchmarks.harness import cronometrar
+from cobranza.lectores import leer_archivo
+
+
+def generar(filas, semilla=42):
+    """PAGOS de exactamente ``filas`` filas (~1,2 pagos por fila de cartera)."""
+    return generar_pagos(generar_cartera(filas, semilla=semilla), cobertura=0.9, semilla=semilla + 1).head(filas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, default=1_000_000)
+    parser.add_argument("--formatos", nargs="+", default=["xlsx", "csv", "parquet"])
+    args = parser.parse_args()
+
+    df = generar(args.filas)
+    print(f"{'FORMATO':>8} {'TAMAÑO (MB)':>12} {'CARGA (s)':>10} {'FILAS/s':>12}")
+    for formato in args.formatos:
+        datos = serializar(df, formato)
+        segundos, (cargado, _) = cronometrar(leer_archivo, datos, "PAGOS", nombre=f"pagos.{formato}")
+
+        assert len(cargado) == len(df)
+        print(f"{formato:>8} {len(datos) / 1e6:>12.1f} {segundos:>10.2f} {len(df) / segundos:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
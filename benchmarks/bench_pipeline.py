@@ -0,0 +1,104 @@
+"""Pipeline completo por tamaño de cartera: carga, cruce, agregación, campaña SMS y exportación CSV.
+
+    python -m benchmarks.bench_pipeline --filas 10000 100000 1000000 5000000 --memoria --json bench.jsonl
+
+Los datos salen de ``benchmarks.datos`` con semilla fija: dos corridas con los
+mismos argumentos miden exactamente lo mismo. La carga se mide sin la caché de
+ingesta, que en la app evitaría releer el archivo. Con ``--memoria`` cada
+etapa se repite bajo tracemalloc para el pico (tarda bastante más).
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.datos import archivo_en_memoria, generar_escenario
+from benchmarks.harness import Suite
+from cobranza import activar_copy_on_write
+from cobranza.agregados import CuboCruce
+from cobranza.calculos import ESTADO_PENDIENTE
+from cobranza.cruce import MotorCruce
+from cobranza.exportar import exportar_campana_zip
+from cobranza.filtros import IndiceFiltros
+from cobranza.ingesta import CacheIngesta, cargar_resumen_pagos, cargar_tabla
+from cobranza.paralelo import WORKERS, cerrar_pool
+from cobranza.sms import analizar_suscriptores, depurar_pagos_totales, filtrar_tipos, seleccionar_campana
+
+
+SIN_CACHE = CacheIngesta(0)
+
+
+def cruzar(df_cartera, huella_cartera, resumen, workers):
+    return MotorCruce(df_cartera, huella_cartera, workers=workers).cruzar_resumen(resumen["TOTAL_PAGADO"])
+
+
+def agregar(resultado):
+    cubo = CuboCruce.construir(resultado)
+    cubo.totales()
+    cubo.resumen_periodo()
+    cubo.por_tipo()
+    return cubo
+
+
+def filtrar(resultado):
+    indice = IndiceFiltros(resultado)
+    return indice.filtrar(periodo=indice.valores("PERIODO")[-1], estado=ESTADO_PENDIENTE)
+
+
+def campana(df_suscriptor, df_cartera, df_pagos, tipos, agresiva):
+    analisis = analizar_suscriptores(df_suscriptor, filtrar_tipos(df_cartera, tipos), df_pagos)
+    return seleccionar_campana(depurar_pagos_totales(analisis), agresiva)[0]
+
+
+def medir_escenario(suite, filas, args, directorio):
+    escenario = generar_escenario(filas, args.periodos)
+    nombre = f"{filas:,}"
+    archivos = {clave: archivo_en_memoria(df, args.formato, clave) for clave, df in escenario.items()}
+
+    cartera = suite.medir(nombre, "carga CARTERA", filas, cargar_tabla, archivos["cartera"], "CARTERA", SIN_CACHE)
+    resumen = suite.medir(
+        nombre, "carga PAGOS (resumen)", len(escenario["pagos"]),
+        cargar_resumen_pagos, archivos["pagos"], cartera.df, cartera.huella, SIN_CACHE
+    )
+    suscriptor = suite.medir(
+        nombre, "carga SUSCRIPTOR", len(escenario["suscriptor"]), cargar_tabla, archivos["suscriptor"], "SUSCRIPTOR", SIN_CACHE
+    )
+    pagos_sms = suite.medir(
+        nombre, "carga PAGOS SMS", len(escenario["pagos_sms"]), cargar_tabla, archivos["pagos_sms"], "PAGOS_SMS", SIN_CACHE
+    )
+
+    resultado = suite.medir(nombre, "cruce", filas, cruzar, cartera.df, cartera.huella, resumen.df, args.workers)
+    suite.medir(nombre, "agregación", filas, agregar, resultado)
+    suite.medir(nombre, "filtros", filas, filtrar, resultado)
+
+    df_campana = suite.medir(
+        nombre, "campaña SMS", len(suscriptor.df),
+        campana, suscriptor.df, cartera.df, pagos_sms.df, args.tipos, args.campana == "agresiva"
+    )
+    destino = os.path.join(directorio, "campana.zip")
+    suite.medir(nombre, "exportación CSV", len(df_campana), exportar_campana_zip, df_campana, args.archivos, "SMS", destino)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 5_000_000])
+    parser.add_argument("--periodos", type=int, default=12)
+    parser.add_argument("--formato", choices=["csv", "parquet", "xlsx"], default="csv", help="Formato de los archivos de entrada")
+    parser.add_argument("--tipos", nargs="+", default=["FIJA", "MOVIL"])
+    parser.add_argument("--campana", choices=["agresiva", "general"], default="general")
+    parser.add_argument("--archivos", type=int, default=5, help="Partes del zip de la campaña")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--memoria", action="store_true", help="Medir también el pico de memoria (más lento)")
+    parser.add_argument("--json", help="Agregar cada medición como una línea JSON a este archivo")
+    args = parser.parse_args()
+    activar_copy_on_write()
+
+    suite = Suite(memoria=args.memoria, salida_json=args.json)
+    suite.encabezado()
+    with tempfile.TemporaryDirectory() as directorio:
+        for filas in args.filas:
+            medir_escenario(suite, filas, args, directorio)
+    cerrar_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Cruce SUSCRIPTOR × cartera × pagos del generador SMS: 4 groupby + 4 merge vs agregación única.
+
+    python -m benchmarks.bench_sms --suscriptores 200000 2000000
+"""
+import argparse
+
+import pandas as pd
+
+from benchmarks.datos import generar_cartera, generar_pagos, generar_suscriptores
+from benchmarks.harness import cronometrar
+from cobranza.calculos import saldo_pendiente
+from cobranza.sms import analizar_suscriptores
+
+
+def analisis_original(df_suscriptor, df_cartera_filtrada, df_pagos):
+    # Implementación original del PASO 4 de modulo_sms(), como referencia
+    df_cartera_filtrada = df_cartera_filtrada.copy()
+    df_cartera_filtrada["CODIGO"] = df_cartera_filtrada["ID_COBRANZA"].astype(str)
+    df_cartera_filtrada["PERIODO"] = df_cartera_filtrada["PERIODO"].astype(str)
+
+    periodos_totales = df_cartera_filtrada.groupby("CODIGO")["PERIODO"].count().reset_index()
+    periodos_totales.columns = ["CODIGO", "PERIODOS_TOTALES"]
+    deuda_total = df_cartera_filtrada.groupby("CODIGO")["DEUDA"].sum().reset_index()
+    deuda_total.columns = ["CODIGO", "DEUDA_TOTAL"]
+    periodos_pagados = df_pagos.groupby("CODIGO")["PERIODO"].count().reset_index()
+    periodos_pagados.columns = ["CODIGO", "PERIODOS_PAGADOS"]
+    total_pagado = df_pagos.groupby("CODIGO")["IMPORTE"].sum().reset_index()
+    total_pagado.columns = ["CODIGO", "TOTAL_PAGADO"]
+
+    df_analisis = df_suscriptor.copy()
+    df_analisis = df_analisis.merge(periodos_totales, on="CODIGO", how="left")
+    df_analisis = df_analisis.merge(deuda_total, on="CODIGO", how="left")
+    df_analisis = df_analisis.merge(periodos_pagados, on="CODIGO", how="left")
+    df_analisis = df_analisis.merge(total_pagado, on="CODIGO", how="left")
+
+    df_analisis["PERIODOS_TOTALES"] = df_analisis["PERIODOS_TOTALES"].fillna(0).astype(int)
+    df_analisis["PERIODOS_PAGADOS"] = df_analisis["PERIODOS_PAGADOS"].fillna(0).astype(int)
+    df_analisis["DEUDA_TOTAL"] = df_analisis["DEUDA_TOTAL"].fillna(0)
+    df_analisis["TOTAL_PAGADO"] = df_analisis["TOTAL_PAGADO"].fillna(0)
+    df_analisis["PERIODOS_PENDIENTES"] = df_analisis["PERIODOS_TOTALES"] - df_analisis["PERIODOS_PAGADOS"]
+    df_analisis["SALDO_PENDIENTE"] = saldo_pendiente(df_analisis["DEUDA_TOTAL"], df_analisis["TOTAL_PAGADO"])
+    return df_analisis
+
+
+def generar(suscriptores, semilla=42):
+    """Suscriptores (~``suscriptores``), cartera (~3 periodos por código) y pagos."""
+    # Cobertura 0,8 más 10 % sin deuda: ~0,88 suscriptores por código de cartera
+    df_cartera = generar_cartera(int(suscriptores / 0.88 * 3), semilla=semilla)
+    df_suscriptor = generar_suscriptores(df_cartera, semilla=semilla + 1)
+    df_pagos = generar_pagos(df_cartera, semilla=semilla + 2, columna_id="CODIGO")
+    return df_suscriptor, df_cartera, df_pagos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suscriptores", type=int, nargs="+", default=[2_000_000])
+    args = parser.parse_args()
+
+    print(f"{'SUSCRIPTORES':>12} {'ORIGINAL (s)':>13} {'AGREGADO (s)':>13} {'ACELERACIÓN':>12}")
+    for suscriptores in args.suscriptores:
+        tablas = generar(suscriptores)
+        suscriptores = len(tablas[0])
+        t_original, esperado = cronometrar(analisis_original, *tablas)
+        t_nuevo, obtenido = cronometrar(analizar_suscriptores, *tablas)
+        pd.testing.assert_frame_equal(esperado, obtenido, check_dtype=False)
+        print(f"{suscriptores:>12,} {t_original:>13.3f} {t_nuevo:>13.3f} {t_original / t_nuevo:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
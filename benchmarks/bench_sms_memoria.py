@@ -0,0 +1,80 @@
+"""Memoria pico del flujo del Generador de SMS: copias completas vs Copy-on-Write con proyección de columnas.
+
+    python -m benchmarks.bench_sms_memoria --filas 2000000 --tipos FIJA MOVIL
+
+Cada variante corre en un proceso nuevo, con los datos cargados como en la app
+(``cargar_tabla``). Se informa el RSS pico, que incluye lo que asigna Arrow,
+y el pico de tracemalloc, que solo ve Python y numpy.
+"""
+import argparse
+import multiprocessing
+import os
+
+from benchmarks.datos import archivo_en_memoria, generar_escenario
+from benchmarks.harness import cronometrar, pico_memoria, pico_rss
+from cobranza import activar_copy_on_write
+from cobranza.ingesta import CacheIngesta, cargar_tabla
+from cobranza.sms import analizar_suscriptores, depurar_pagos_totales, filtrar_tipos, seleccionar_campana
+
+
+def flujo_con_copias(df_cartera, tipos, df_suscriptor, df_pagos, agresiva):
+    # Flujo de modulo_sms() antes de trabajar sin copias, como referencia: las
+    # variables locales viven hasta el final, como en un rerun de Streamlit
+    df_cartera = df_cartera.copy()
+    df_cartera_filtrada = df_cartera[df_cartera["TIPO"].isin(tipos)].copy()
+    df_analisis = analizar_suscriptores(df_suscriptor, df_cartera_filtrada, df_pagos)
+    df_analisis_depurado = depurar_pagos_totales(df_analisis).copy()
+    df_campana, _ = seleccionar_campana(df_analisis_depurado, agresiva)
+    return df_campana.copy()
+
+
+def flujo_sin_copias(df_cartera, tipos, df_suscriptor, df_pagos, agresiva):
+    df_analisis = analizar_suscriptores(df_suscriptor, filtrar_tipos(df_cartera, tipos), df_pagos)
+    return seleccionar_campana(depurar_pagos_totales(df_analisis), agresiva)[0]
+
+
+VARIANTES = {"con copias": flujo_con_copias, "sin copias": flujo_sin_copias}
+
+
+def medir_variante(variante, filas, tipos, agresiva):
+    # Cada variante corre en un proceso nuevo: se activa como en la app
+    activar_copy_on_write()
+    escenario = generar_escenario(filas)
+    sin_cache = CacheIngesta(0)
+    tablas = {
+        clave: cargar_tabla(archivo_en_memoria(escenario[clave], "parquet", clave), esquema, sin_cache).df
+        for clave, esquema in [("cartera", "CARTERA"), ("suscriptor", "SUSCRIPTOR"), ("pagos_sms", "PAGOS_SMS")]
+    }
+    del escenario
+    argumentos = (tablas["cartera"], tipos, tablas["suscriptor"], tablas["pagos_sms"], agresiva)
+
+    # El RSS primero, en el proceso todavía sin reutilizar memoria del flujo
+    flujo = VARIANTES[variante]
+    rss = pico_rss(flujo, *argumentos)
+    segundos, campana = cronometrar(flujo, *argumentos)
+    return segundos, rss, pico_memoria(flujo, *argumentos), len(campana)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, nargs="+", default=[2_000_000])
+    parser.add_argument("--tipos", nargs="+", default=["FIJA", "MOVIL"])
+    parser.add_argument("--campana", choices=["agresiva", "general"], default="general")
+    args = parser.parse_args()
+
+    # Umbral fijo de mmap: los arreglos grandes vuelven al sistema al
+    # liberarse y el RSS pico refleja cada asignación
+    os.environ.setdefault("MALLOC_MMAP_THRESHOLD_", "131072")
+    contexto = multiprocessing.get_context("spawn")
+
+    print(f"{'FILAS':>12} {'VARIANTE':>12} {'TIEMPO (s)':>11} {'RSS PICO (MB)':>14} {'TRACEMALLOC (MB)':>17} {'CAMPAÑA':>10}")
+    for filas in args.filas:
+        for variante in VARIANTES:
+            with contexto.Pool(1) as pool:
+                segundos, rss, pico, campana = pool.apply(medir_variante, (variante, filas, args.tipos, args.campana == "agresiva"))
+            rss = "-" if rss is None else f"{rss / 1024 ** 2:.1f}"
+            print(f"{filas:>12,} {variante:>12} {segundos:>11.3f} {rss:>14} {pico / 1024 ** 2:>17.1f} {campana:>10,}")
+
+
+if __name__ == "__main__":
+    main()
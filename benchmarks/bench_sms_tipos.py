@@ -0,0 +1,80 @@
+"""Cambio de TIPOS en el Generador de SMS: filtrar la cartera en cada selección vs partición por TIPO.
+
+    python -m benchmarks.bench_sms_tipos --filas 2000000 --tipos 40
+
+Simula a un analista que marca los tipos uno por uno. La referencia filtra la
+cartera y repite el análisis completo en cada paso; la partición se
+construye una vez y cada paso solo suma los agregados de los tipos marcados.
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.datos import generar_cartera, generar_pagos, generar_suscriptores
+from benchmarks.harness import cronometrar
+from cobranza import activar_copy_on_write
+from cobranza.sms import ParticionTipos, SuscriptoresSMS, analizar_suscriptores, filtrar_tipos
+
+
+def con_tipos(df_cartera, cantidad, semilla=45):
+    """La cartera con ``cantidad`` valores de TIPO, uno por cliente."""
+    rng = np.random.default_rng(semilla)
+    nombres = [f"TIPO_{i:02d}" for i in range(cantidad)]
+    codigos = df_cartera["ID_COBRANZA"].cat.codes.to_numpy()
+    por_cliente = rng.integers(0, cantidad, len(df_cartera["ID_COBRANZA"].cat.categories))
+    tipo = pd.Categorical.from_codes(por_cliente[codigos], categories=nombres)
+    return df_cartera.assign(TIPO=tipo)
+
+
+def seleccion_filtrando(df_suscriptor, df_cartera, df_pagos, tipos):
+    # Lo que hacía modulo_sms() con cada casilla: conteos, resumen y análisis completo
+    df_cartera.groupby("TIPO", observed=True).size()
+    mascara = df_cartera["TIPO"].isin(tipos)
+    df_cartera.loc[mascara, "ID_COBRANZA"].nunique()
+    return analizar_suscriptores(df_suscriptor, filtrar_tipos(df_cartera, tipos), df_pagos)
+
+
+def seleccion_particion(suscriptores_sms, tipos):
+    suscriptores_sms.particion.resumen(tipos)
+    return suscriptores_sms.analizar(tipos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filas", type=int, nargs="+", default=[2_000_000])
+    parser.add_argument("--tipos", type=int, default=40, help="Cantidad de valores de TIPO en la cartera")
+    parser.add_argument("--pasos", type=int, default=10, help="Tipos que se marcan uno por uno")
+    args = parser.parse_args()
+    activar_copy_on_write()
+
+    print(f"{'FILAS':>12} {'PREPARACIÓN (s)':>16} {'FILTRANDO (s/paso)':>19} {'PARTICIÓN (s/paso)':>19} {'ACELERACIÓN':>12}")
+    for filas in args.filas:
+        df_cartera = con_tipos(generar_cartera(filas), args.tipos)
+        df_suscriptor = generar_suscriptores(df_cartera)
+        df_pagos = generar_pagos(df_cartera, columna_id="CODIGO")
+
+        # Se paga una vez por cartera y archivos, no en cada selección
+        t_particion, particion = cronometrar(ParticionTipos.construir, df_cartera)
+        t_base, suscriptores_sms = cronometrar(SuscriptoresSMS.construir, df_suscriptor, df_pagos, particion)
+
+        t_filtrando = t_nuevo = 0.0
+        for paso in range(1, args.pasos + 1):
+            tipos = particion.tipos[:paso]
+            t, esperado = cronometrar(seleccion_filtrando, df_suscriptor, df_cartera, df_pagos, tipos)
+            t_filtrando += t
+            t, obtenido = cronometrar(seleccion_particion, suscriptores_sms, tipos)
+            t_nuevo += t
+            # Misma deuda salvo el orden de las sumas
+            pd.testing.assert_frame_equal(esperado, obtenido, rtol=1e-9)
+
+        t_filtrando /= args.pasos
+        t_nuevo /= args.pasos
+        print(
+            f"{filas:>12,} {t_particion + t_base:>16.3f} {t_filtrando:>19.3f} "
+            f"{t_nuevo:>19.3f} {t_filtrando / t_nuevo:>11.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
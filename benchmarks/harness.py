@@ -0,0 +1,100 @@
+"""Medición común a todos los benchmarks: tiempo, filas/s y memoria pico.
+
+El tiempo se toma con ``time.perf_counter`` y sin tracemalloc, que vuelve el
+código varias veces más lento; la memoria pico se mide en una segunda
+ejecución con tracemalloc, solo si se pide. Las etapas medidas tienen que
+poder repetirse sin efectos entre una ejecución y otra.
+"""
+import json
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+
+
+@dataclass(frozen=True)
+class Medicion:
+    escenario: str
+    etapa: str
+    filas: int
+    segundos: float
+    # Pico de memoria Python sobre lo ya asignado al empezar; None si no se midió
+    pico_bytes: int = None
+
+    @property
+    def filas_por_segundo(self):
+        return self.filas / self.segundos if self.segundos > 0 else float("inf")
+
+
+def cronometrar(funcion, *args, **kwargs):
+    """``(segundos, resultado)`` de una llamada."""
+    inicio = time.perf_counter()
+    resultado = funcion(*args, **kwargs)
+    return time.perf_counter() - inicio, resultado
+
+
+def pico_memoria(funcion, *args, **kwargs):
+    """Bytes pico asignados durante la llamada, según tracemalloc."""
+    activo = tracemalloc.is_tracing()
+    if not activo:
+        tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    try:
+        funcion(*args, **kwargs)
+        return max(tracemalloc.get_traced_memory()[1] - base, 0)
+    finally:
+        if not activo:
+            tracemalloc.stop()
+
+
+def _memoria_proceso():
+    with open("/proc/self/status", encoding="ascii") as f:
+        valores = dict(linea.split(":", 1) for linea in f if linea.startswith(("VmRSS", "VmHWM")))
+    return {clave: int(valor.split()[0]) * 1024 for clave, valor in valores.items()}
+
+
+def pico_rss(funcion, *args, **kwargs):
+    """Bytes de RSS pico del proceso durante la llamada; None si no hay ``/proc`` (solo Linux).
+
+    A diferencia de tracemalloc incluye lo que asignan Arrow y las extensiones
+    en C. Conviene medir en un proceso nuevo: memoria liberada antes puede
+    reutilizarse sin que el RSS crezca.
+    """
+    try:
+        # Escribir 5 en clear_refs reinicia el pico (VmHWM) del proceso
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        base = _memoria_proceso()["VmRSS"]
+    except OSError:
+        return None
+    funcion(*args, **kwargs)
+    return max(_memoria_proceso()["VmHWM"] - base, 0)
+
+
+class Suite:
+    """Acumula las mediciones de una corrida y las imprime en una tabla."""
+
+    def __init__(self, memoria=False, salida_json=None):
+        self.memoria = memoria
+        self.salida_json = salida_json
+        self.mediciones = []
+
+    def medir(self, escenario, etapa, filas, funcion, *args, **kwargs):
+        segundos, resultado = cronometrar(funcion, *args, **kwargs)
+        pico = pico_memoria(funcion, *args, **kwargs) if self.memoria else None
+        medicion = Medicion(escenario, etapa, filas, segundos, pico)
+        self.mediciones.append(medicion)
+        self.imprimir(medicion)
+        if self.salida_json:
+            with open(self.salida_json, "a", encoding="utf-8") as f:
+                f.write(json.dumps(asdict(medicion), ensure_ascii=False) + "\n")
+        return resultado
+
+    @staticmethod
+    def encabezado():
+        print(f"{'ESCENARIO':>12} {'ETAPA':<22} {'FILAS':>12} {'TIEMPO (s)':>11} {'FILAS/s':>13} {'PICO (MB)':>10}")
+
+    @staticmethod
+    def imprimir(m):
+        pico = "-" if m.pico_bytes is None else f"{m.pico_bytes / 1024 ** 2:.1f}"
+        print(f"{m.escenario:>12} {m.etapa:<22} {m.filas:>12,} {m.segundos:>11.3f} {m.filas_por_segundo:>13,.0f} {pico:>10}")
@@ -0,0 +1,14 @@
+"""Núcleo de cálculo del SISTEMA DE COBRANZA (sin dependencias de Streamlit)."""
+import pandas as pd
+
+
+def activar_copy_on_write():
+    """Activa Copy-on-Write en pandas 2; es global al proceso.
+
+    Filtros, proyecciones y ``assign`` comparten los datos hasta que alguien
+    escribe, así que los DataFrames de la sesión (y los compartidos entre
+    sesiones) no se copian al derivar otros. Desde pandas 3.0 es lo único que
+    hay. Lo llaman los puntos de entrada (app, CLI, benchmarks), no la librería.
+    """
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
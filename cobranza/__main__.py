@@ -0,0 +1,6 @@
+import sys
+
+from cobranza.cli import main
+
+
+sys.exit(main())
@@ -0,0 +1,87 @@
+"""Cubo de agregados del cruce a grano PERIODO × TIPO × ESTADO.
+
+Se construye una vez por resultado y alimenta las métricas, los gráficos y el
+resumen por periodo sin volver a recorrer ``resultado_cruce``.
+"""
+from cobranza.calculos import ESTADO_PAGADO, ESTADO_PENDIENTE
+
+
+DIMENSIONES = ["PERIODO", "TIPO", "ESTADO"]
+MEDIDAS = ["DEUDA", "TOTAL_PAGADO", "SALDO_PENDIENTE"]
+N_TOP = 20
+
+
+def _efectividad(pagado, deuda):
+    return (pagado / deuda.where(deuda > 0) * 100).fillna(0)
+
+
+class CuboCruce:
+    def __init__(self, cubo, top_pendientes):
+        self.cubo = cubo
+        self.top_pendientes = top_pendientes
+
+    @classmethod
+    def construir(cls, resultado, n_top=N_TOP):
+        cubo = resultado.groupby(DIMENSIONES, observed=True).agg(
+            CASOS=("DEUDA", "size"),
+            DEUDA=("DEUDA", "sum"),
+            TOTAL_PAGADO=("TOTAL_PAGADO", "sum"),
+            SALDO_PENDIENTE=("SALDO_PENDIENTE", "sum"),
+        ).reset_index()
+
+        pendientes = resultado[resultado["ESTADO"] == ESTADO_PENDIENTE]
+        top_pendientes = pendientes.nlargest(n_top, "SALDO_PENDIENTE")
+        return cls(cubo, top_pendientes)
+
+    def filtrar(self, periodo=None, tipo=None, estado=None):
+        """Cubo de los casos que cumplen los filtros.
+
+        El TOP es el del resultado completo restringido a los mismos filtros:
+        puede tener menos de ``N_TOP`` filas. El TOP propio de una vista
+        filtrada sale de ``IndiceFiltros``.
+        """
+        cubo = self.cubo
+        top = self.top_pendientes
+        for columna, valor in zip(DIMENSIONES, [periodo, tipo, estado]):
+            if valor is not None:
+                cubo = cubo[cubo[columna] == valor]
+                top = top[top[columna] == valor]
+        return CuboCruce(cubo, top)
+
+    # ==========================================
+    # Vistas
+    # ==========================================
+    def totales(self):
+        cubo = self.cubo
+        total_cartera = cubo["DEUDA"].sum()
+        total_recuperado = cubo["TOTAL_PAGADO"].sum()
+        return {
+            "total_cartera": total_cartera,
+            "total_recuperado": total_recuperado,
+            "saldo_pendiente": cubo["SALDO_PENDIENTE"].sum(),
+            "porcentaje_recuperacion": (total_recuperado / total_cartera * 100) if total_cartera > 0 else 0,
+            "total_casos": int(cubo["CASOS"].sum()),
+            "casos_pagados": int(cubo.loc[cubo["ESTADO"] == ESTADO_PAGADO, "CASOS"].sum()),
+            "casos_pendientes": int(cubo.loc[cubo["ESTADO"] == ESTADO_PENDIENTE, "CASOS"].sum()),
+        }
+
+    def por_periodo(self):
+        resumen = self.cubo.groupby("PERIODO", observed=True)[["CASOS", *MEDIDAS]].sum().reset_index()
+        resumen["PERIODO"] = resumen["PERIODO"].astype(str)
+        return resumen
+
+    def por_tipo(self):
+        resumen = self.cubo.groupby("TIPO", observed=True)[["CASOS", *MEDIDAS]].sum().reset_index()
+        resumen["TIPO"] = resumen["TIPO"].astype(str)
+        return resumen
+
+    def resumen_periodo(self):
+        # Mismo formato que la pestaña "Por Periodo" del dashboard
+        resumen = self.por_periodo().rename(columns={"TOTAL_PAGADO": "PAGADO", "SALDO_PENDIENTE": "PENDIENTE"})
+        resumen["EFECTIVIDAD_%"] = _efectividad(resumen["PAGADO"], resumen["DEUDA"]).round(1)
+        return resumen
+
+    def efectividad_por_periodo(self):
+        resumen = self.por_periodo()
+        resumen["EFECTIVIDAD"] = _efectividad(resumen["TOTAL_PAGADO"], resumen["DEUDA"])
+        return resumen[["PERIODO", "EFECTIVIDAD"]]
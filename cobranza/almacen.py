@@ -0,0 +1,172 @@
+"""Almacén columnar local (Parquet) para carteras y resultados de cruce.
+
+Cada snapshot se escribe particionado por PERIODO y TIPO bajo
+``<directorio>/<coleccion>/<snapshot>/``. Un manifiesto JSON por colección
+registra los snapshots, de modo que el último se encuentra sin recorrer
+directorios, y las lecturas aplican filtros por partición y proyección de
+columnas. Cada colección conserva a lo sumo ``COBRANZA_MAX_SNAPSHOTS``
+snapshots (0 = sin límite): al guardar uno nuevo se borran los más viejos.
+"""
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from cobranza.esquema import compactar
+
+
+DIRECTORIO_DATOS = os.environ.get("COBRANZA_DATA_DIR", "datos")
+MAX_SNAPSHOTS = int(os.environ.get("COBRANZA_MAX_SNAPSHOTS", "20"))
+COLUMNAS_PARTICION = ["PERIODO", "TIPO"]
+
+_lock = threading.Lock()
+
+
+class AlmacenColumnar:
+    def __init__(self, directorio=None, max_snapshots=MAX_SNAPSHOTS):
+        self.directorio = Path(directorio or DIRECTORIO_DATOS)
+        self.max_snapshots = max_snapshots
+
+    # ==========================================
+    # Manifiesto
+    # ==========================================
+    def _ruta_manifiesto(self, coleccion):
+        return self.directorio / coleccion / "manifiesto.json"
+
+    def snapshots(self, coleccion):
+        ruta = self._ruta_manifiesto(coleccion)
+        if not ruta.exists():
+            return []
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _guardar_manifiesto(self, coleccion, entradas):
+        ruta = self._ruta_manifiesto(coleccion)
+        temporal = ruta.with_suffix(".tmp")
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(entradas, f, ensure_ascii=False, indent=2)
+        os.replace(temporal, ruta)
+
+    def ultimo(self, coleccion):
+        entradas = self.snapshots(coleccion)
+        return entradas[-1] if entradas else None
+
+    def buscar(self, coleccion, huella):
+        for entrada in self.snapshots(coleccion):
+            if entrada["huella"] == huella:
+                return entrada
+        return None
+
+    # ==========================================
+    # Escritura
+    # ==========================================
+    def guardar(self, coleccion, df, huella, metadatos=None):
+        """Persiste ``df`` como snapshot; si la huella ya existe no reescribe nada."""
+        with _lock:
+            existente = self.buscar(coleccion, huella)
+            if existente is not None:
+                return existente
+
+            creado = datetime.now()
+            snapshot_id = f"{creado:%Y%m%dT%H%M%S}_{huella[:12]}"
+            ruta = self.directorio / coleccion / snapshot_id
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+
+            # Las categóricas se escriben como texto plano: Parquet ya codifica
+            # por diccionario cada archivo, y repetir el diccionario completo de
+            # pandas en cada partición hace lentas la escritura y la lectura
+            tabla = pa.Table.from_pandas(df, preserve_index=False)
+            tabla = tabla.cast(pa.schema(
+                [pa.field(f.name, f.type.value_type if pa.types.is_dictionary(f.type) else f.type) for f in tabla.schema]
+            ))
+            ds.write_dataset(
+                tabla,
+                ruta,
+                format="parquet",
+                partitioning=ds.partitioning(
+                    pa.schema([(c, pa.string()) for c in COLUMNAS_PARTICION]),
+                    flavor="hive"
+                ),
+                existing_data_behavior="overwrite_or_ignore",
+            )
+
+            entrada = {
+                "id": snapshot_id,
+                "huella": huella,
+                "creado": creado.isoformat(timespec="seconds"),
+                "filas": len(df),
+                "columnas": list(df.columns),
+                "periodos": sorted(map(str, df["PERIODO"].unique())),
+                "tipos": sorted(map(str, df["TIPO"].unique())),
+                **(metadatos or {}),
+            }
+            entradas = self.snapshots(coleccion)
+            entradas.append(entrada)
+            vencidas = entradas[:-self.max_snapshots] if self.max_snapshots > 0 else []
+            self._guardar_manifiesto(coleccion, entradas[len(vencidas):])
+            # El manifiesto ya no las lista: se borran después de reescribirlo
+            for vencida in vencidas:
+                shutil.rmtree(self.directorio / coleccion / vencida["id"], ignore_errors=True)
+            return entrada
+
+    def eliminar(self, coleccion, snapshot_id):
+        with _lock:
+            entradas = [e for e in self.snapshots(coleccion) if e["id"] != snapshot_id]
+            self._guardar_manifiesto(coleccion, entradas)
+            shutil.rmtree(self.directorio / coleccion / snapshot_id, ignore_errors=True)
+
+    # ==========================================
+    # Lectura
+    # ==========================================
+    def ruta(self, coleccion, snapshot_id):
+        return self.directorio / coleccion / snapshot_id
+
+    def _dataset(self, coleccion, snapshot_id):
+        return ds.dataset(
+            self.ruta(coleccion, snapshot_id),
+            format="parquet",
+            partitioning=ds.partitioning(
+                pa.schema([(c, pa.string()) for c in COLUMNAS_PARTICION]),
+                flavor="hive"
+            ),
+        )
+
+    def leer(self, coleccion, snapshot_id=None, columnas=None, filtros=None):
+        """Lee un snapshot (por defecto el último).
+
+        ``filtros`` es un dict columna -> lista de valores; los filtros sobre
+        PERIODO y TIPO solo abren las particiones necesarias.
+        """
+        if snapshot_id is None:
+            entrada = self.ultimo(coleccion)
+            if entrada is None:
+                return None
+            snapshot_id = entrada["id"]
+
+        expresion = None
+        for columna, valores in (filtros or {}).items():
+            condicion = ds.field(columna).isin([str(v) for v in valores])
+            expresion = condicion if expresion is None else expresion & condicion
+
+        dataset = self._dataset(coleccion, snapshot_id)
+        tabla = dataset.to_table(columns=columnas, filter=expresion)
+        # El texto queda respaldado por Arrow (sin copiar a objetos de Python);
+        # solo PERIODO y TIPO, de baja cardinalidad, vuelven a ser categóricas.
+        # Recodificar ID_COBRANZA costaría más que toda la lectura.
+        df = tabla.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+
+        # Las columnas de partición vuelven al final: se restaura el orden original
+        orden = columnas or [c for c in self._columnas(coleccion, snapshot_id) if c in df.columns]
+        return compactar(df[orden], COLUMNAS_PARTICION)
+
+    def _columnas(self, coleccion, snapshot_id):
+        for entrada in self.snapshots(coleccion):
+            if entrada["id"] == snapshot_id:
+                return entrada["columnas"]
+        return []
@@ -0,0 +1,380 @@
+"""Base SQL embebida (un archivo local, sin servidor) para carteras más grandes que la memoria.
+
+Cartera, pagos y suscriptores se cargan una vez, bloque a bloque, desde los
+mismos lectores que usa la app; el cruce, el cubo por PERIODO × TIPO × ESTADO
+y la selección de campañas SMS se resuelven con consultas sobre las tablas, y
+solo vuelven a pandas los resultados chicos (cubo, TOP, campaña) o, por
+bloques, el detalle del cruce.
+
+Usa DuckDB si está instalado: sus joins y agregaciones se derraman a disco
+cuando superan ``COBRANZA_SQL_MEMORIA_MB``. Si no, usa ``sqlite3`` de la
+biblioteca estándar, con índices sobre (ID_COBRANZA, PERIODO) y CODIGO; en
+DuckDB no hacen falta porque los joins son por hash.
+"""
+import os
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+
+from cobranza.agregados import DIMENSIONES, N_TOP, CuboCruce
+from cobranza.almacen import DIRECTORIO_DATOS
+from cobranza.calculos import ESTADO_PAGADO, ESTADO_PENDIENTE, ESTADOS
+from cobranza.cruce import CLAVE
+from cobranza.esquema import ESQUEMAS, compactar
+from cobranza.ingesta import ErrorClaveDuplicados, leer_bytes, nombre_archivo
+from cobranza.lectores import iterar_archivo
+from cobranza.sms import CAMPANA_AGRESIVA, CAMPANA_GENERAL
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+HAY_DUCKDB = duckdb is not None
+MOTOR_SQL = os.environ.get("COBRANZA_MOTOR_SQL", "duckdb" if HAY_DUCKDB else "sqlite")
+MEMORIA_SQL_MB = int(os.environ.get("COBRANZA_SQL_MEMORIA_MB", "1024"))
+TAMANO_BLOQUE_SQL = 100_000
+
+INDICES = {"cartera": CLAVE, "pagos": CLAVE, "suscriptor": ["CODIGO"], "pagos_sms": ["CODIGO"]}
+# Orden de carga: el resultado y la campaña salen en el orden de los archivos
+FILA = "_FILA"
+# Número de archivo dentro de la tabla: los pagos repetidos se buscan entre archivos
+ARCHIVO = "_ARCHIVO"
+INTERNAS = [FILA, ARCHIVO]
+COLUMNAS_ANALISIS = ["PERIODOS_TOTALES", "DEUDA_TOTAL", "PERIODOS_PAGADOS", "TOTAL_PAGADO", "PERIODOS_PENDIENTES", "SALDO_PENDIENTE"]
+
+
+def ruta_por_defecto(motor=MOTOR_SQL):
+    return str(Path(DIRECTORIO_DATOS) / ("cobranza.duckdb" if motor == "duckdb" else "cobranza.sqlite"))
+
+
+def _lista(valores):
+    return ", ".join("?" for _ in valores)
+
+
+def _columnas(columnas):
+    return ", ".join(f'"{c}"' for c in columnas)
+
+
+class SumaCompensada:
+    """Agregado FSUM para SQLite: suma de Kahan de los valores no nulos (NULL si no hay).
+
+    Los mismos pasos que la suma de groupby en pandas y que FSUM en DuckDB,
+    así el cruce da el mismo ESTADO en los tres; ``math.fsum`` (exacta) no
+    coincide con ellos en el último bit.
+    """
+
+    def __init__(self):
+        self.suma = None
+        self.compensacion = 0.0
+
+    def step(self, valor):
+        if valor is None:
+            return
+        if self.suma is None:
+            self.suma = 0.0
+        y = valor - self.compensacion
+        t = self.suma + y
+        self.compensacion = t - self.suma - y
+        self.suma = t
+
+    def finalize(self):
+        return self.suma
+
+
+class BaseSQL:
+    def __init__(self, ruta=None, motor=MOTOR_SQL, memoria_mb=MEMORIA_SQL_MB):
+        if motor == "duckdb" and not HAY_DUCKDB:
+            raise RuntimeError("DuckDB no está instalado: pip install duckdb, o usar COBRANZA_MOTOR_SQL=sqlite")
+        self.motor = motor
+        # Suma compensada, como la de groupby en pandas: sin ella una deuda
+        # pagada en cuotas puede quedar PENDIENTE por centésimos de centavo.
+        # SQLite compensa SUM desde la versión 3.43; antes se registra FSUM
+        self.suma = "FSUM" if motor == "duckdb" or sqlite3.sqlite_version_info < (3, 43) else "SUM"
+        self.ruta = ruta or ruta_por_defecto(motor)
+        Path(self.ruta).parent.mkdir(parents=True, exist_ok=True)
+
+        if motor == "duckdb":
+            self.con = duckdb.connect(self.ruta)
+            self.con.execute(f"SET memory_limit = '{int(memoria_mb)}MB'")
+            self.con.execute("SET preserve_insertion_order = false")
+        else:
+            self.con = sqlite3.connect(self.ruta)
+            # Caché de páginas acotada (KiB negativos) y temporales en disco
+            self.con.execute(f"PRAGMA cache_size = -{int(memoria_mb) * 1024}")
+            self.con.execute("PRAGMA temp_store = FILE")
+            self.con.execute("PRAGMA journal_mode = OFF")
+            self.con.execute("PRAGMA synchronous = OFF")
+            if self.suma == "FSUM":
+                self.con.create_aggregate("FSUM", 1, SumaCompensada)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self):
+        self.con.close()
+
+    # ==========================================
+    # Primitivas por motor
+    # ==========================================
+    def _ejecutar(self, sql, parametros=()):
+        return self.con.execute(sql, list(parametros))
+
+    def _valor(self, sql, parametros=()):
+        return self._ejecutar(sql, parametros).fetchone()[0]
+
+    def _insertar(self, tabla, df):
+        if self.motor == "duckdb":
+            self.con.register("_bloque", df)
+            try:
+                self.con.execute(f'INSERT INTO "{tabla}" SELECT * FROM _bloque')
+            finally:
+                self.con.unregister("_bloque")
+        else:
+            filas = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+            self.con.executemany(f'INSERT INTO "{tabla}" VALUES ({_lista(df.columns)})', filas)
+
+    def _bloques(self, sql, parametros=(), tamano_bloque=TAMANO_BLOQUE_SQL):
+        if self.motor == "duckdb":
+            for lote in self._ejecutar(sql, parametros).to_arrow_reader(tamano_bloque):
+                yield lote.to_pandas()
+        else:
+            yield from pd.read_sql_query(sql, self.con, params=list(parametros), chunksize=tamano_bloque)
+
+    def consultar(self, sql, parametros=()):
+        """Resultado completo de una consulta; solo para resultados que entran en memoria."""
+        bloques = list(self._bloques(sql, parametros))
+        if not bloques:
+            return pd.DataFrame()
+        return pd.concat(bloques, ignore_index=True) if len(bloques) > 1 else bloques[0]
+
+    def existe(self, tabla):
+        if self.motor == "duckdb":
+            sql = "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?"
+        else:
+            sql = "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?"
+        return self._valor(sql, [tabla]) > 0
+
+    def filas(self, tabla):
+        return int(self._valor(f'SELECT COUNT(*) FROM "{tabla}"'))
+
+    # ==========================================
+    # Carga
+    # ==========================================
+    def _crear_tabla(self, tabla, df, esquema):
+        montos = set(ESQUEMAS[esquema]["montos"])
+        columnas = [f'"{c}" {"DOUBLE" if c in montos else "TEXT"}' for c in df.columns]
+        self._ejecutar(f'DROP TABLE IF EXISTS "{tabla}"')
+        self._ejecutar(f'CREATE TABLE "{tabla}" ({", ".join(columnas)}, "{FILA}" BIGINT, "{ARCHIVO}" BIGINT)')
+
+    def _preparar(self, df, esquema, desde, archivo):
+        # Todo lo que no es monto se guarda como texto, igual que lo muestra la app
+        montos = set(ESQUEMAS[esquema]["montos"])
+        df = df.assign(**{c: df[c].astype("str") for c in df.columns if c not in montos})
+        return df.assign(**{FILA: range(desde, desde + len(df)), ARCHIVO: archivo})
+
+    def _siguientes(self, tabla, agregar):
+        """Primera ``FILA`` y número de ``ARCHIVO`` de lo que se agrega a ``tabla``."""
+        if not agregar:
+            return 0, 0
+        return self._ejecutar(
+            f'SELECT COALESCE(MAX("{FILA}") + 1, 0), COALESCE(MAX("{ARCHIVO}") + 1, 0) FROM "{tabla}"'
+        ).fetchone()
+
+    def cargar(self, archivo, esquema, agregar=False, progreso=None):
+        """Carga un archivo subido (o abierto) en la tabla del esquema; devuelve ``(filas, avisos)``.
+
+        Con ``agregar`` las filas se suman a las ya cargadas (varios archivos de
+        pagos); si no, la tabla se reemplaza.
+        """
+        tabla = esquema.lower()
+        agregar = agregar and self.existe(tabla)
+        desde, numero = self._siguientes(tabla, agregar)
+        avisos = []
+        for df, avisos_bloque in iterar_archivo(leer_bytes(archivo), esquema, nombre_archivo(archivo), progreso=progreso):
+            if not agregar:
+                self._crear_tabla(tabla, df, esquema)
+                agregar = True
+            self._insertar(tabla, self._preparar(df, esquema, desde, numero))
+            desde += len(df)
+            avisos.extend(a for a in avisos_bloque if a not in avisos)
+        self._indexar(tabla)
+        return self.filas(tabla), avisos
+
+    def cargar_df(self, df, esquema, agregar=False):
+        """Como ``cargar``, desde un DataFrame ya normalizado."""
+        tabla = esquema.lower()
+        agregar = agregar and self.existe(tabla)
+        desde, numero = self._siguientes(tabla, agregar)
+        if not agregar:
+            self._crear_tabla(tabla, df, esquema)
+        for inicio in range(0, len(df), TAMANO_BLOQUE_SQL):
+            bloque = df.iloc[inicio:inicio + TAMANO_BLOQUE_SQL]
+            self._insertar(tabla, self._preparar(bloque, esquema, desde + inicio, numero))
+        self._indexar(tabla)
+        return self.filas(tabla)
+
+    def _indexar(self, tabla):
+        if self.motor == "sqlite" and tabla in INDICES:
+            self._ejecutar(f'CREATE INDEX IF NOT EXISTS "idx_{tabla}" ON "{tabla}" ({_columnas(INDICES[tabla])})')
+            self.con.commit()
+
+    def _sin_duplicados(self, tabla, clave_duplicados):
+        """Subconsulta sin los pagos ya informados por un archivo anterior, como ``RepetidosEntreArchivos``.
+
+        La n-ésima fila de una clave dentro de un archivo se descarta solo si un
+        archivo anterior trae esa clave al menos n veces.
+        """
+        if not clave_duplicados:
+            return f'"{tabla}"'
+        faltantes = [c for c in clave_duplicados if c not in self._columnas_tabla(tabla)]
+        if faltantes:
+            raise ErrorClaveDuplicados(
+                f"No se pueden descartar pagos repetidos: los pagos no tienen {', '.join(faltantes)}. "
+                "Quita esas columnas de la clave o no descartes repetidos."
+            )
+        clave = _columnas(clave_duplicados)
+        return (
+            f'(SELECT * FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY {clave}, _OCURRENCIA '
+            f'ORDER BY "{ARCHIVO}", "{FILA}") AS _N FROM (SELECT *, ROW_NUMBER() OVER (PARTITION BY {clave}, '
+            f'"{ARCHIVO}" ORDER BY "{FILA}") AS _OCURRENCIA FROM "{tabla}") AS o) AS t WHERE _N = 1)'
+        )
+
+    # ==========================================
+    # Cruce Deuda vs Pagos
+    # ==========================================
+    def cruzar(self, clave_duplicados=()):
+        """Crea la tabla ``resultado``: la cartera con TOTAL_PAGADO y las columnas derivadas.
+
+        Mismas reglas que ``calcular_derivadas``. Devuelve la cantidad de filas.
+        """
+        columnas = [c for c in self._columnas_tabla("cartera") if c not in INTERNAS]
+        clave = " AND ".join(f'c."{c}" = p."{c}"' for c in CLAVE)
+        pagado = "COALESCE(p.TOTAL_PAGADO, 0)"
+        self._ejecutar('DROP TABLE IF EXISTS "resultado"')
+        self._ejecutar(f"""
+            CREATE TABLE "resultado" AS
+            SELECT {", ".join(f'c."{c}"' for c in columnas)},
+                   {pagado} AS TOTAL_PAGADO,
+                   CASE WHEN c.DEUDA > {pagado} THEN c.DEUDA - {pagado} ELSE 0 END AS SALDO_PENDIENTE,
+                   CASE WHEN {pagado} >= c.DEUDA THEN ? ELSE ? END AS ESTADO,
+                   CASE WHEN c.DEUDA <= 0 THEN 100.0
+                        WHEN ROUND({pagado} / c.DEUDA * 100, 2) > 100 THEN 100.0
+                        ELSE ROUND({pagado} / c.DEUDA * 100, 2) END AS PORCENTAJE_PAGADO,
+                   c."{FILA}"
+            FROM "cartera" AS c
+            LEFT JOIN (
+                SELECT {_columnas(CLAVE)}, {self.suma}(IMPORTE) AS TOTAL_PAGADO
+                FROM {self._sin_duplicados("pagos", clave_duplicados)} AS pagos
+                GROUP BY {_columnas(CLAVE)}
+            ) AS p ON {clave}
+        """, [ESTADO_PAGADO, ESTADO_PENDIENTE])
+        self.con.commit()
+        return self.filas("resultado")
+
+    def _columnas_tabla(self, tabla):
+        return [d[0] for d in self._ejecutar(f'SELECT * FROM "{tabla}" LIMIT 0').description]
+
+    def _a_resultado(self, df):
+        # Los mismos tipos que el resultado en memoria
+        df = df.drop(columns=INTERNAS, errors="ignore")
+        if "ESTADO" in df.columns:
+            df["ESTADO"] = pd.Categorical(df["ESTADO"], categories=ESTADOS)
+        return compactar(df)
+
+    def cubo(self, n_top=N_TOP):
+        """``CuboCruce`` del resultado, agregado en la base: solo el cubo y el TOP vuelven a pandas."""
+        cubo = self.consultar(f"""
+            SELECT {_columnas(DIMENSIONES)}, COUNT(*) AS CASOS, SUM(DEUDA) AS DEUDA,
+                   SUM(TOTAL_PAGADO) AS TOTAL_PAGADO, SUM(SALDO_PENDIENTE) AS SALDO_PENDIENTE
+            FROM "resultado"
+            GROUP BY {_columnas(DIMENSIONES)}
+            ORDER BY {_columnas(DIMENSIONES)}
+        """)
+        cubo["CASOS"] = cubo["CASOS"].astype("int64")
+        top = self.consultar(
+            f'SELECT * FROM "resultado" WHERE ESTADO = ? ORDER BY SALDO_PENDIENTE DESC, "{FILA}" LIMIT {int(n_top)}',
+            [ESTADO_PENDIENTE]
+        )
+        return CuboCruce(self._a_resultado(cubo), self._a_resultado(top))
+
+    def bloques_resultado(self, tamano_bloque=TAMANO_BLOQUE_SQL):
+        """Detalle del cruce en el orden de la cartera, de a ``tamano_bloque`` filas."""
+        for df in self._bloques(f'SELECT * FROM "resultado" ORDER BY "{FILA}"', tamano_bloque=tamano_bloque):
+            yield self._a_resultado(df)
+
+    def resultado(self):
+        """Detalle completo del cruce como DataFrame (tiene que entrar en memoria)."""
+        return pd.concat(self.bloques_resultado(), ignore_index=True)
+
+    # ==========================================
+    # Campañas SMS
+    # ==========================================
+    def tipos(self):
+        return [t for (t,) in self._ejecutar('SELECT DISTINCT TIPO FROM "cartera" ORDER BY TIPO').fetchall()]
+
+    def campana(self, tipos, agresiva, clave_duplicados=()):
+        """Selección de la campaña sobre la base, con las reglas de ``cobranza.sms``.
+
+        Devuelve ``(df_campana, tipo_campana, suscriptores, depurados)``.
+        """
+        tipo_campana = CAMPANA_AGRESIVA if agresiva else CAMPANA_GENERAL
+        filtro = " AND PERIODOS_PAGADOS = 0" if agresiva else ""
+        columnas = [c for c in self._columnas_tabla("suscriptor") if c not in INTERNAS]
+        if not tipos:
+            # Sin tipos no hay deuda: todos los suscriptores quedan depurados
+            suscriptores = self.filas("suscriptor")
+            return pd.DataFrame(columns=columnas + COLUMNAS_ANALISIS), tipo_campana, suscriptores, suscriptores
+        self._ejecutar('DROP TABLE IF EXISTS "analisis"')
+        self._ejecutar(f"""
+            CREATE TABLE "analisis" AS
+            SELECT {", ".join(f's."{c}"' for c in columnas)},
+                   COALESCE(c.PERIODOS, 0) AS PERIODOS_TOTALES,
+                   COALESCE(c.DEUDA, 0) AS DEUDA_TOTAL,
+                   COALESCE(p.PERIODOS, 0) AS PERIODOS_PAGADOS,
+                   COALESCE(p.IMPORTE, 0) AS TOTAL_PAGADO,
+                   COALESCE(c.PERIODOS, 0) - COALESCE(p.PERIODOS, 0) AS PERIODOS_PENDIENTES,
+                   CASE WHEN COALESCE(c.DEUDA, 0) > COALESCE(p.IMPORTE, 0)
+                        THEN COALESCE(c.DEUDA, 0) - COALESCE(p.IMPORTE, 0) ELSE 0 END AS SALDO_PENDIENTE,
+                   s."{FILA}"
+            FROM "suscriptor" AS s
+            LEFT JOIN (
+                SELECT ID_COBRANZA AS CODIGO, COUNT(PERIODO) AS PERIODOS, SUM(DEUDA) AS DEUDA
+                FROM "cartera" WHERE TIPO IN ({_lista(tipos)}) GROUP BY ID_COBRANZA
+            ) AS c ON c.CODIGO = s.CODIGO
+            LEFT JOIN (
+                SELECT CODIGO, COUNT(PERIODO) AS PERIODOS, SUM(IMPORTE) AS IMPORTE
+                FROM {self._sin_duplicados("pagos_sms", clave_duplicados)} AS pagos GROUP BY CODIGO
+            ) AS p ON p.CODIGO = s.CODIGO
+        """, list(tipos))
+        self.con.commit()
+
+        suscriptores = self.filas("analisis")
+        depurados = suscriptores - int(self._valor('SELECT COUNT(*) FROM "analisis" WHERE PERIODOS_PENDIENTES > 0'))
+        df_campana = self.consultar(
+            f'SELECT * FROM "analisis" WHERE PERIODOS_PENDIENTES > 0{filtro} ORDER BY "{FILA}"'
+        ).drop(columns=INTERNAS, errors="ignore")
+        return df_campana, tipo_campana, suscriptores, depurados
+
+    # ==========================================
+    # Histórico
+    # ==========================================
+    def resumir_snapshot(self, directorio, periodos, tipos):
+        """DEUDA, TOTAL_PAGADO y SALDO_PENDIENTE por PERIODO de un snapshot Parquet del almacén.
+
+        Solo con DuckDB, que lee las particiones sin pasar por pandas.
+        """
+        if not periodos or not tipos:
+            return pd.DataFrame(columns=["PERIODO", "DEUDA", "TOTAL_PAGADO", "SALDO_PENDIENTE"])
+        patron = str(Path(directorio) / "**" / "*.parquet")
+        return self.consultar(f"""
+            SELECT PERIODO, SUM(DEUDA) AS DEUDA, SUM(TOTAL_PAGADO) AS TOTAL_PAGADO, SUM(SALDO_PENDIENTE) AS SALDO_PENDIENTE
+            FROM read_parquet(?, hive_partitioning = true, hive_types_autocast = false)
+            WHERE PERIODO IN ({_lista(periodos)}) AND TIPO IN ({_lista(tipos)})
+            GROUP BY PERIODO ORDER BY PERIODO
+        """, [patron, *map(str, periodos), *map(str, tipos)])
@@ -0,0 +1,40 @@
+"""Columnas derivadas del cruce, calculadas de forma vectorizada.
+
+Lo comparten el Dashboard de Cruce y el Generador de SMS.
+"""
+import numpy as np
+import pandas as pd
+
+
+ESTADO_PAGADO = "✅ PAGADO"
+ESTADO_PENDIENTE = "⏳ PENDIENTE"
+ESTADOS = [ESTADO_PAGADO, ESTADO_PENDIENTE]
+
+
+def saldo_pendiente(deuda, pagado):
+    return (deuda - pagado).clip(lower=0)
+
+
+def estado_pago(deuda, pagado):
+    codigos = np.where(np.asarray(pagado) >= np.asarray(deuda), 0, 1).astype(np.int8)
+    return pd.Categorical.from_codes(codigos, categories=ESTADOS)
+
+
+def porcentaje_pagado(deuda, pagado):
+    deuda = np.asarray(deuda, dtype="float64")
+    pagado = np.asarray(pagado, dtype="float64")
+    # Sin deuda no hay nada que cobrar: el caso figura como PAGADO, así que
+    # se reporta al 100% en lugar de inf/NaN
+    with np.errstate(divide="ignore", invalid="ignore"):
+        porcentaje = np.where(deuda > 0, pagado / deuda * 100, 100.0)
+    return np.minimum(np.round(porcentaje, 2), 100.0)
+
+
+def calcular_derivadas(resultado):
+    """Agrega SALDO_PENDIENTE, ESTADO y PORCENTAJE_PAGADO a partir de DEUDA y TOTAL_PAGADO."""
+    deuda = resultado["DEUDA"]
+    pagado = resultado["TOTAL_PAGADO"]
+    resultado["SALDO_PENDIENTE"] = saldo_pendiente(deuda, pagado)
+    resultado["ESTADO"] = estado_pago(deuda, pagado)
+    resultado["PORCENTAJE_PAGADO"] = porcentaje_pagado(deuda, pagado)
+    return resultado
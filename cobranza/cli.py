@@ -0,0 +1,324 @@
+"""Ejecución por lotes, sin navegador, del cruce y de las campañas SMS.
+
+    python -m cobranza cruce --cartera CARTERA.xlsx --pagos PAGOS.xlsx [PAGOS_2.csv ...] --salida resultado.parquet \\
+        --reporte REPORTE.xlsx
+    python -m cobranza cruce --cartera CARTERA.csv --pagos PAGOS.csv --base-sql datos/cruce.duckdb --salida resultado.parquet
+    python -m cobranza sms --cartera CARTERA.xlsx --suscriptor SUSCRIPTOR.xlsx --pagos PAGOS.csv \\
+        --tipos FIJA MOVIL --campana agresiva --archivos 5 --prefijo SMS_VIVA --salida campanas/
+
+No importa Streamlit: arranca rápido y puede perfilarse con
+``python -m cProfile -m cobranza ...``. Sale con código 2 si un archivo no
+cumple su esquema.
+"""
+import argparse
+import sys
+from contextlib import ExitStack
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cobranza import activar_copy_on_write
+from cobranza.agregados import CuboCruce
+from cobranza.almacen import AlmacenColumnar
+from cobranza.base_sql import BaseSQL, MOTOR_SQL
+from cobranza.cruce import MotorCruce
+from cobranza.diagnostico import Diagnostico
+from cobranza.esquema import ErrorEsquema
+from cobranza.exportar import exportar_campana_zip
+from cobranza.ingesta import CLAVE_DUPLICADOS, ErrorClaveDuplicados, cargar_resumen_pagos, cargar_resumen_pagos_multiples, cargar_tabla, cargar_tablas
+from cobranza.paralelo import WORKERS
+from cobranza.reporte import exportar_reporte_excel
+from cobranza.sms import analizar_suscriptores, depurar_pagos_totales, filtrar_tipos, seleccionar_campana
+
+
+diagnostico = Diagnostico()
+
+
+def informar(mensaje):
+    print(mensaje, file=sys.stderr)
+
+
+def medir(nombre, funcion, *args, **kwargs):
+    """Ejecuta una etapa e informa su duración por stderr (y al log de ``COBRANZA_DIAG_LOG``)."""
+    with diagnostico.etapa(nombre):
+        resultado = funcion(*args, **kwargs)
+    informar(f"  {nombre}: {diagnostico.mediciones[-1].segundos:.2f} s")
+    return resultado
+
+
+def cargar(ruta, esquema):
+    with open(ruta, "rb") as archivo:
+        return cargar_tabla(archivo, esquema)
+
+
+def cargar_resumen(ruta, df_deuda, huella_cartera):
+    with open(ruta, "rb") as archivo:
+        return cargar_resumen_pagos(archivo, df_deuda, huella_cartera)
+
+
+def cargar_varios(rutas, esquema, clave_duplicados, workers):
+    with ExitStack() as pila:
+        archivos = [pila.enter_context(open(ruta, "rb")) for ruta in rutas]
+        return cargar_tablas(archivos, esquema, clave_duplicados, workers)
+
+
+def cargar_resumen_varios(rutas, df_deuda, huella_cartera, clave_duplicados, workers):
+    with ExitStack() as pila:
+        archivos = [pila.enter_context(open(ruta, "rb")) for ruta in rutas]
+        return cargar_resumen_pagos_multiples(archivos, df_deuda, huella_cartera, clave_duplicados, workers)
+
+
+def clave_duplicados(args, esquema):
+    # --duplicados sin columnas usa la clave por defecto del esquema
+    if args.duplicados is None:
+        return []
+    return args.duplicados or CLAVE_DUPLICADOS[esquema]
+
+
+def escribir_resultado(resultado, ruta):
+    ruta = Path(ruta)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    if ruta.suffix.lower() == ".parquet":
+        resultado.to_parquet(ruta, index=False)
+    else:
+        resultado.to_csv(ruta, index=False, sep=";", encoding="utf-8-sig")
+
+
+# ==========================================
+# CRUCE
+# ==========================================
+def imprimir_totales(cubo):
+    totales = cubo.totales()
+    print(cubo.por_tipo().to_string(index=False))
+    print(
+        f"\nCartera: Bs. {totales['total_cartera']:,.2f} | Recuperado: Bs. {totales['total_recuperado']:,.2f} | "
+        f"Pendiente: Bs. {totales['saldo_pendiente']:,.2f} | Efectividad: {totales['porcentaje_recuperacion']:.1f}%"
+    )
+
+
+def ejecutar_cruce(args):
+    if args.base_sql is not None:
+        return ejecutar_cruce_sql(args)
+    tabla_cartera = medir("cartera", cargar, args.cartera, "CARTERA")
+    motor = MotorCruce(tabla_cartera.df, tabla_cartera.huella, workers=args.workers)
+
+    if args.duplicados is not None:
+        # Los archivos se combinan en un solo resumen, sin pagos repetidos
+        tabla_pagos = medir(
+            f"pagos ({len(args.pagos)} archivos)", cargar_resumen_varios, args.pagos, motor.df_deuda, motor.huella_cartera,
+            clave_duplicados(args, "PAGOS"), motor.workers
+        )
+        informar(f"  pagos repetidos descartados: {tabla_pagos.duplicados:,}")
+        medir("cruce", motor.cruzar_resumen, tabla_pagos.df["TOTAL_PAGADO"], tabla_pagos.huella)
+    else:
+        for i, ruta in enumerate(args.pagos):
+            tabla_pagos = medir(f"pagos {Path(ruta).name}", cargar_resumen, ruta, motor.df_deuda, motor.huella_cartera)
+            if i == 0:
+                medir("cruce", motor.cruzar_resumen, tabla_pagos.df["TOTAL_PAGADO"], tabla_pagos.huella)
+            elif not motor.aplicado(tabla_pagos.huella):
+                medir("cruce incremental", motor.agregar_resumen, tabla_pagos.df["TOTAL_PAGADO"], tabla_pagos.huella)
+
+    resultado = motor.resultado
+    cubo = CuboCruce.construir(resultado)
+    imprimir_totales(cubo)
+
+    if args.salida:
+        medir("escritura", escribir_resultado, resultado, args.salida)
+        informar(f"Resultado escrito en {args.salida}")
+
+    if args.reporte:
+        Path(args.reporte).parent.mkdir(parents=True, exist_ok=True)
+        medir("reporte excel", exportar_reporte_excel, resultado, cubo, args.reporte)
+        informar(f"Reporte escrito en {args.reporte}")
+
+    if args.guardar:
+        almacen = AlmacenColumnar(args.directorio_datos)
+        medir("almacén cartera", almacen.guardar, "cartera", tabla_cartera.df, tabla_cartera.huella)
+        medir(
+            "almacén resultado", almacen.guardar, "resultado", resultado, motor.huella,
+            {"cartera": motor.huella_cartera, "pagos": motor.huellas_pagos}
+        )
+    return 0
+
+
+def cargar_sql(base, rutas, esquema):
+    for i, ruta in enumerate(rutas):
+        with open(ruta, "rb") as archivo:
+            base.cargar(archivo, esquema, agregar=i > 0)
+
+
+def escribir_resultado_sql(base, ruta):
+    """Como ``escribir_resultado``, por bloques desde la base."""
+    ruta = Path(ruta)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    if ruta.suffix.lower() == ".parquet":
+        escritor = None
+        for bloque in base.bloques_resultado():
+            tabla = pa.Table.from_pandas(bloque, preserve_index=False)
+            escritor = escritor or pq.ParquetWriter(ruta, tabla.schema)
+            escritor.write_table(tabla.cast(escritor.schema))
+        if escritor is not None:
+            escritor.close()
+        return
+    with open(ruta, "w", encoding="utf-8-sig", newline="") as f:
+        for i, bloque in enumerate(base.bloques_resultado()):
+            bloque.to_csv(f, index=False, sep=";", header=i == 0)
+
+
+def ejecutar_cruce_sql(args):
+    if args.reporte or args.guardar:
+        informar("--reporte y --guardar necesitan el resultado en memoria: no se usan con --base-sql")
+        return 2
+    with BaseSQL(args.base_sql or None) as base:
+        informar(f"Base SQL ({base.motor}): {base.ruta}")
+        medir("cartera", cargar_sql, base, [args.cartera], "CARTERA")
+        medir(f"pagos ({len(args.pagos)} archivos)", cargar_sql, base, args.pagos, "PAGOS")
+        medir("cruce", base.cruzar, clave_duplicados(args, "PAGOS"))
+        imprimir_totales(medir("agregados", base.cubo))
+
+        if args.salida:
+            medir("escritura", escribir_resultado_sql, base, args.salida)
+            informar(f"Resultado escrito en {args.salida}")
+    return 0
+
+
+# ==========================================
+# CAMPAÑA SMS
+# ==========================================
+def validar_tipos(tipos_disponibles, tipos):
+    """Los TIPOS pedidos (por defecto todos); None si alguno no está en la cartera."""
+    tipos = tipos_disponibles if tipos is None else tipos
+    desconocidos = sorted(set(tipos) - set(tipos_disponibles))
+    if desconocidos:
+        informar(f"TIPO inexistente en la cartera: {', '.join(desconocidos)} (disponibles: {', '.join(tipos_disponibles)})")
+        return None
+    return tipos
+
+
+def exportar_campana(args, df_campana, tipo_campana):
+    if len(df_campana) == 0:
+        informar("No hay clientes para esta campaña")
+        return 1
+
+    prefijo = args.prefijo or f"SMS_VIVA_{tipo_campana}"
+    directorio = Path(args.salida)
+    directorio.mkdir(parents=True, exist_ok=True)
+    ruta, partes = medir(
+        "exportación", exportar_campana_zip, df_campana, args.archivos, prefijo, str(directorio / f"{prefijo}.zip")
+    )
+
+    for parte in partes:
+        print(f"{parte.nombre};{parte.registros};{parte.monto:.2f}")
+    informar(f"Campaña escrita en {ruta}")
+    return 0
+
+
+def ejecutar_sms(args):
+    if args.base_sql is not None:
+        return ejecutar_sms_sql(args)
+    df_cartera = medir("cartera", cargar, args.cartera, "CARTERA").df
+    df_suscriptor = medir("suscriptores", cargar, args.suscriptor, "SUSCRIPTOR").df
+    tabla_pagos = medir(
+        "pagos", cargar_varios, args.pagos, "PAGOS_SMS", clave_duplicados(args, "PAGOS_SMS"),
+        WORKERS if args.workers is None else args.workers
+    )
+    df_pagos = tabla_pagos.df
+    if len(args.pagos) > 1:
+        informar(f"  pagos repetidos descartados: {tabla_pagos.duplicados:,}")
+
+    tipos = validar_tipos(sorted(map(str, df_cartera["TIPO"].unique())), args.tipos)
+    if tipos is None:
+        return 2
+
+    df_cartera = filtrar_tipos(df_cartera, tipos)
+    analisis = medir("cruce", analizar_suscriptores, df_suscriptor, df_cartera, df_pagos)
+    depurado = depurar_pagos_totales(analisis)
+    df_campana, tipo_campana = seleccionar_campana(depurado, args.campana == "agresiva")
+
+    informar(
+        f"Suscriptores: {len(analisis):,} | Pagos totales depurados: {len(analisis) - len(depurado):,} | "
+        f"Campaña {tipo_campana}: {len(df_campana):,}"
+    )
+    return exportar_campana(args, df_campana, tipo_campana)
+
+
+def ejecutar_sms_sql(args):
+    with BaseSQL(args.base_sql or None) as base:
+        informar(f"Base SQL ({base.motor}): {base.ruta}")
+        medir("cartera", cargar_sql, base, [args.cartera], "CARTERA")
+        medir("suscriptores", cargar_sql, base, [args.suscriptor], "SUSCRIPTOR")
+        medir("pagos", cargar_sql, base, args.pagos, "PAGOS_SMS")
+
+        tipos = validar_tipos(base.tipos(), args.tipos)
+        if tipos is None:
+            return 2
+        df_campana, tipo_campana, suscriptores, depurados = medir(
+            "cruce", base.campana, tipos, args.campana == "agresiva", clave_duplicados(args, "PAGOS_SMS")
+        )
+
+    informar(
+        f"Suscriptores: {suscriptores:,} | Pagos totales depurados: {depurados:,} | "
+        f"Campaña {tipo_campana}: {len(df_campana):,}"
+    )
+    return exportar_campana(args, df_campana, tipo_campana)
+
+
+def agregar_base_sql(subparser):
+    subparser.add_argument("--base-sql", nargs="?", const="", default=None, metavar="RUTA",
+                           help=f"Cruzar en una base SQL embebida ({MOTOR_SQL}) en disco, para archivos más grandes "
+                                "que la memoria (sin RUTA: COBRANZA_DATA_DIR/cobranza.<motor>)")
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(prog="python -m cobranza", description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    cruce = subparsers.add_parser("cruce", help="Cruce Deuda vs Pagos")
+    cruce.add_argument("--cartera", required=True, help="Archivo CARTERA (xlsx, csv o parquet)")
+    cruce.add_argument("--pagos", required=True, nargs="+", help="Uno o más archivos PAGOS; desde el segundo se aplican de forma incremental")
+    cruce.add_argument("--workers", type=int, default=None,
+                       help="Procesos para el cruce por PERIODO; 1 = serial (por defecto COBRANZA_WORKERS)")
+    cruce.add_argument("--duplicados", nargs="*", metavar="COLUMNA",
+                       help="Combinar los archivos PAGOS en un solo cruce descartando pagos repetidos entre archivos por estas columnas "
+                            f"(sin columnas: {' '.join(CLAVE_DUPLICADOS['PAGOS'])})")
+    cruce.add_argument("--salida", help="Resultado del cruce (.parquet o .csv)")
+    cruce.add_argument("--reporte", help="Reporte ejecutivo en Excel (.xlsx)")
+    cruce.add_argument("--guardar", action="store_true", help="Guardar cartera y resultado en el almacén histórico")
+    cruce.add_argument("--directorio-datos", default=None, help="Directorio del almacén (por defecto COBRANZA_DATA_DIR)")
+    agregar_base_sql(cruce)
+    cruce.set_defaults(ejecutar=ejecutar_cruce)
+
+    sms = subparsers.add_parser("sms", help="Campaña SMS")
+    sms.add_argument("--cartera", required=True, help="Archivo CARTERA VIVA")
+    sms.add_argument("--suscriptor", required=True, help="Archivo SUSCRIPTOR (NUMERO, NOMBRE, FECHA, CODIGO)")
+    sms.add_argument("--pagos", required=True, nargs="+", help="Uno o más archivos PAGOS (CODIGO, PERIODO, IMPORTE)")
+    sms.add_argument("--duplicados", nargs="*", metavar="COLUMNA",
+                     help=f"Descartar pagos repetidos entre archivos por estas columnas (sin columnas: {' '.join(CLAVE_DUPLICADOS['PAGOS_SMS'])})")
+    sms.add_argument("--workers", type=int, default=None, help="Procesos para leer varios archivos PAGOS")
+    sms.add_argument("--tipos", nargs="+", help="TIPOS de cartera a incluir (por defecto todos)")
+    sms.add_argument("--campana", choices=["agresiva", "general"], default="general",
+                     help="agresiva = solo morosos totales | general = todos con al menos 1 pendiente")
+    sms.add_argument("--archivos", type=int, default=1, choices=range(1, 51), metavar="[1-50]",
+                     help="Dividir en cuántos archivos CSV")
+    sms.add_argument("--prefijo", help="Prefijo de archivos (por defecto SMS_VIVA_<campaña>)")
+    sms.add_argument("--salida", default=".", help="Directorio donde escribir el zip")
+    agregar_base_sql(sms)
+    sms.set_defaults(ejecutar=ejecutar_sms)
+    return parser
+
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    activar_copy_on_write()
+    diagnostico.iniciar(args.comando)
+    try:
+        return args.ejecutar(args)
+    except ErrorEsquema as e:
+        informar(f"El archivo {e.esquema} no tiene las columnas obligatorias")
+        informar(f"Requeridas: {', '.join(e.requeridas)}")
+        informar(f"Encontradas: {', '.join(e.encontradas)}")
+        return 2
+    except ErrorClaveDuplicados as e:
+        informar(str(e))
+        return 2
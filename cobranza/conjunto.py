@@ -0,0 +1,147 @@
+"""Identidad de los DataFrames que viven en la sesión.
+
+``ConjuntoDatos`` envuelve un DataFrame con su huella de contenido (calculada
+una sola vez, al cargarlo o al cruzarlo), una versión que solo crece y su
+linaje: de qué cartera y qué pagos salió. Los cálculos derivados (agregados,
+índices, figuras, estadísticas SMS) usan la huella como clave de caché sin
+volver a recorrer los datos.
+
+``RegistroConjuntos`` comparte los DataFrames entre sesiones del mismo
+proceso: dos analistas con la misma cartera (misma huella) reciben cada uno su
+``ConjuntoDatos``, pero ambos apuntan al mismo DataFrame. Cada conjunto
+entregado cuenta como una referencia hasta que el recolector lo libera (la
+sesión lo reemplaza o termina). Los DataFrames compartidos no se modifican en
+el lugar; quien necesite cambiarlos trabaja sobre una copia.
+"""
+import itertools
+import os
+import threading
+import weakref
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field, replace
+
+import pandas as pd
+
+from cobranza.esquema import memoria_bytes
+
+
+_versiones = itertools.count(1)
+_lock = threading.Lock()
+
+
+def siguiente_version():
+    with _lock:
+        return next(_versiones)
+
+
+@dataclass(frozen=True, eq=False)
+class ConjuntoDatos:
+    df: pd.DataFrame
+    huella: str
+    origen: str
+    # ((origen, huella), ...) de los conjuntos de los que se derivó
+    linaje: tuple = ()
+    version: int = field(default_factory=siguiente_version)
+
+    @classmethod
+    def desde_tabla(cls, tabla, origen):
+        """Conjunto a partir de una ``TablaCargada`` de la ingesta."""
+        return cls(tabla.df, tabla.huella, origen)
+
+    @classmethod
+    def desde_motor(cls, motor):
+        """Resultado actual de un ``MotorCruce`` con la cartera y los pagos que lo produjeron."""
+        linaje = (("cartera", motor.huella_cartera),) + tuple(("pagos", h) for h in motor.huellas_pagos)
+        return cls(motor.resultado, motor.huella, "resultado", linaje)
+
+    def __len__(self):
+        return len(self.df)
+
+
+# ==========================================
+# REGISTRO COMPARTIDO ENTRE SESIONES
+# ==========================================
+@dataclass
+class EntradaRegistro:
+    df: pd.DataFrame
+    bytes: int
+    referencias: int = 0
+
+
+class RegistroConjuntos:
+    """DataFrames por huella con conteo de referencias y presupuesto de memoria.
+
+    Los que ninguna sesión usa se conservan (por si otra sesión los vuelve a
+    pedir) hasta que el total supera ``max_bytes``; entonces se expulsan del
+    menos usado recientemente. Los que están en uso nunca se expulsan.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # El recolector libera referencias en cualquier hilo y en cualquier
+        # momento, incluso con el lock tomado: se encolan y se aplican después
+        self._liberadas = deque()
+
+    def compartir(self, conjunto):
+        """``ConjuntoDatos`` para una sesión, con el DataFrame compartido de su huella."""
+        if conjunto is None:
+            return None
+        with self._lock:
+            self._aplicar_liberadas()
+            entrada = self._entradas.get(conjunto.huella)
+            if entrada is None:
+                entrada = EntradaRegistro(conjunto.df, memoria_bytes(conjunto.df))
+                self._entradas[conjunto.huella] = entrada
+                self._bytes += entrada.bytes
+            else:
+                self._entradas.move_to_end(conjunto.huella)
+            entrada.referencias += 1
+            self._expulsar()
+
+        compartido = conjunto if conjunto.df is entrada.df else replace(conjunto, df=entrada.df)
+        weakref.finalize(compartido, self._liberadas.append, conjunto.huella)
+        return compartido
+
+    def buscar(self, huella):
+        """El DataFrame registrado con esa huella, o None; no cuenta como referencia."""
+        with self._lock:
+            self._aplicar_liberadas()
+            entrada = self._entradas.get(huella)
+            if entrada is None:
+                return None
+            self._entradas.move_to_end(huella)
+            return entrada.df
+
+    def _aplicar_liberadas(self):
+        while self._liberadas:
+            entrada = self._entradas.get(self._liberadas.popleft())
+            if entrada is not None:
+                entrada.referencias -= 1
+        self._expulsar()
+
+    def _expulsar(self):
+        if self._bytes <= self.max_bytes:
+            return
+        for huella in [h for h, e in self._entradas.items() if e.referencias <= 0]:
+            self._bytes -= self._entradas.pop(huella).bytes
+            if self._bytes <= self.max_bytes:
+                return
+
+    def estado(self):
+        """``(conjuntos, bytes, referencias)`` del registro."""
+        with self._lock:
+            self._aplicar_liberadas()
+            return len(self._entradas), self._bytes, sum(e.referencias for e in self._entradas.values())
+
+    def limpiar(self):
+        """Olvida los conjuntos sin referencias."""
+        with self._lock:
+            self._aplicar_liberadas()
+            for huella in [h for h, e in self._entradas.items() if e.referencias <= 0]:
+                self._bytes -= self._entradas.pop(huella).bytes
+
+
+REGISTRO = RegistroConjuntos(int(os.environ.get("COBRANZA_REGISTRO_MB", "2048")) * 1024 * 1024)
@@ -0,0 +1,131 @@
+"""Motor de cruce Deuda vs Pagos.
+
+El motor calcula ``resultado`` una sola vez por par (cartera, pagos) y lo
+conserva como estado. Un archivo de PAGOS adicional se aplica de forma
+incremental: solo se actualizan las filas de las claves (ID_COBRANZA, PERIODO)
+presentes en el delta, sin volver a hacer el merge de toda la cartera.
+
+El cruce completo se hace por PERIODO sobre códigos enteros, en serie o, con
+``workers`` > 1, en un pool de procesos (ver ``cobranza.paralelo``).
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from cobranza.calculos import calcular_derivadas
+from cobranza.esquema import alinear_categorias
+from cobranza.paralelo import WORKERS, cruzar_particionado
+
+
+CLAVE = ["ID_COBRANZA", "PERIODO"]
+COLUMNAS_DERIVADAS = ["SALDO_PENDIENTE", "ESTADO", "PORCENTAJE_PAGADO"]
+
+
+def resumir_pagos(df_pagos, referencia=None):
+    if referencia is not None:
+        df_pagos = alinear_categorias(df_pagos, referencia, CLAVE)
+    pagos_resumen = df_pagos.groupby(CLAVE, observed=True)["IMPORTE"].sum()
+    pagos_resumen.name = "TOTAL_PAGADO"
+    return pagos_resumen
+
+
+def resumir_pagos_por_bloques(bloques, referencia=None):
+    """Resumen por (ID_COBRANZA, PERIODO) acumulado bloque a bloque."""
+    parciales = [resumir_pagos(bloque, referencia) for bloque in bloques]
+    resumen = pd.concat(parciales)
+    if len(parciales) > 1:
+        resumen = resumen.groupby(level=CLAVE, observed=True).sum()
+    return resumen
+
+
+class MotorCruce:
+    def __init__(self, df_deuda, huella_cartera=None, workers=None):
+        self.df_deuda = df_deuda
+        self.huella_cartera = huella_cartera
+        self.workers = WORKERS if workers is None else workers
+        self.huellas_pagos = []
+        self.resultado = None
+        self.version = 0
+        self._claves_unicas = None
+        self._orden_filas = None
+        self._inicios = None
+
+    def cruzar_resumen(self, pagos_resumen, huella=None, progreso=None):
+        # El estado del motor cambia solo si el cruce termina
+        resultado = cruzar_particionado(self.df_deuda, pagos_resumen, self.workers, progreso)
+
+        self.resultado = resultado
+        self.huellas_pagos = [huella]
+        self._indexar_claves()
+        self.version += 1
+        return resultado
+
+    def agregar_resumen(self, delta, huella=None):
+        if self.resultado is None:
+            return self.cruzar_resumen(delta, huella)
+        if huella is not None and huella in self.huellas_pagos:
+            return self.resultado
+
+        filas, importes = self._filas_de_claves(delta)
+
+        if len(filas) > 0:
+            # El resultado anterior puede estar compartido con otras sesiones:
+            # se arma uno nuevo que reemplaza solo las columnas que cambian
+            resultado = self.resultado.copy(deep=False)
+            pagado = resultado["TOTAL_PAGADO"].to_numpy(copy=True)
+            np.add.at(pagado, filas, importes)
+            resultado["TOTAL_PAGADO"] = pagado
+
+            filas_unicas = np.unique(filas)
+            parcial = calcular_derivadas(resultado.iloc[filas_unicas][["DEUDA", "TOTAL_PAGADO"]].copy())
+            for columna in COLUMNAS_DERIVADAS:
+                valores = resultado[columna].copy()
+                valores.iloc[filas_unicas] = parcial[columna].to_numpy()
+                resultado[columna] = valores
+            self.resultado = resultado
+
+        self.huellas_pagos.append(huella)
+        self.version += 1
+        return self.resultado
+
+    def aplicado(self, huella):
+        return huella in self.huellas_pagos
+
+    @property
+    def huella(self):
+        # Identifica el resultado por su linaje: cartera + pagos aplicados en orden
+        h = hashlib.blake2b(digest_size=16)
+        for parte in [self.huella_cartera, *self.huellas_pagos]:
+            h.update(f"{parte}|".encode("utf-8"))
+        return h.hexdigest()
+
+    # ==========================================
+    # Índice clave -> filas del resultado
+    # ==========================================
+    def _indexar_claves(self):
+        # Una clave puede repetirse en la cartera (p.ej. varios TIPO para el
+        # mismo ID_COBRANZA y PERIODO), así que se guarda para cada clave única
+        # el tramo de filas que le corresponde dentro de un orden estable.
+        claves = pd.MultiIndex.from_frame(self.resultado[CLAVE])
+        codigos, claves_unicas = claves.factorize()
+        self._claves_unicas = claves_unicas
+        self._orden_filas = np.argsort(codigos, kind="stable")
+        self._inicios = np.searchsorted(codigos[self._orden_filas], np.arange(len(claves_unicas) + 1))
+
+    def _filas_de_claves(self, delta):
+        posiciones = self._claves_unicas.get_indexer(delta.index)
+        encontradas = posiciones >= 0
+        posiciones = posiciones[encontradas]
+        importes = delta.to_numpy()[encontradas]
+
+        inicios = self._inicios[posiciones]
+        largos = self._inicios[posiciones + 1] - inicios
+        total = int(largos.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+
+        # Expande cada tramo [inicio, inicio + largo) sin bucles de Python
+        desplazamientos = np.arange(total) - np.repeat(np.cumsum(largos) - largos, largos)
+        filas = self._orden_filas[np.repeat(inicios, largos) + desplazamientos]
+        return filas, np.repeat(importes, largos)
@@ -0,0 +1,125 @@
+"""Tiempos y memoria pico por etapa de cada ejecución.
+
+Cada etapa se mide con ``time.perf_counter`` y, si se activa, con
+``tracemalloc`` (que vuelve todo el proceso varias veces más lento: por eso
+es opcional). Las etapas pueden anidarse; el pico de una etapa incluye el de
+sus etapas internas. Con ``COBRANZA_DIAG_LOG`` cada medición se agrega como
+una línea JSON a ese archivo, para comparar ejecuciones y detectar regresiones.
+"""
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+import pandas as pd
+
+
+LOG_DIAGNOSTICO = os.environ.get("COBRANZA_DIAG_LOG")
+MEDIR_MEMORIA = os.environ.get("COBRANZA_DIAG_MEMORIA", "0") == "1"
+
+_lock_log = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Medicion:
+    # Identifica la ejecución en el log, donde se mezclan procesos y sesiones
+    ejecucion: str
+    modulo: str
+    etapa: str
+    # Posición de inicio dentro de la ejecución; se registran al terminar
+    orden: int
+    nivel: int
+    segundos: float
+    # Pico de memoria Python durante la etapa; None sin tracemalloc
+    pico_bytes: int = None
+    filas: int = None
+
+
+def configurar_memoria(activar):
+    """Inicia o detiene tracemalloc; es global al proceso, no se cambia por sesión."""
+    if activar and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not activar and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+class Diagnostico:
+    def __init__(self, log=LOG_DIAGNOSTICO):
+        self.log = log
+        self.modulo = ""
+        self.ejecucion = ""
+        self.mediciones = []
+        self._pila = []
+        self._iniciadas = 0
+
+    def iniciar(self, modulo):
+        """Empieza una ejecución nueva: descarta las mediciones de la anterior."""
+        self.modulo = modulo
+        self.ejecucion = uuid.uuid4().hex[:12]
+        self.mediciones = []
+        self._pila = []
+        self._iniciadas = 0
+
+    @contextmanager
+    def etapa(self, nombre, filas=None):
+        memoria = tracemalloc.is_tracing()
+        marco = {"pico_hijos": 0}
+        orden = self._iniciadas
+        self._iniciadas += 1
+        if memoria:
+            # El pico de tracemalloc es uno solo: se reinicia por etapa y el
+            # de las internas se acumula en el marco de la externa
+            marco["pico_previo"] = tracemalloc.get_traced_memory()[1]
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self._pila.append(marco)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            segundos = time.perf_counter() - inicio
+            self._pila.pop()
+            pico = None
+            if memoria and tracemalloc.is_tracing():
+                pico_absoluto = max(tracemalloc.get_traced_memory()[1], marco["pico_hijos"])
+                pico = max(pico_absoluto - base, 0)
+                if self._pila:
+                    padre = self._pila[-1]
+                    padre["pico_hijos"] = max(padre["pico_hijos"], pico_absoluto, marco["pico_previo"])
+            self._registrar(Medicion(self.ejecucion, self.modulo, nombre, orden, len(self._pila), segundos, pico, filas))
+
+    def externa(self, nombre, segundos, filas=None):
+        """Registra una etapa medida fuera de la ejecución, como una tarea en segundo plano."""
+        orden = self._iniciadas
+        self._iniciadas += 1
+        self._registrar(Medicion(self.ejecucion, self.modulo, nombre, orden, len(self._pila), segundos, None, filas))
+
+    def _registrar(self, medicion):
+        self.mediciones.append(medicion)
+        if not self.log:
+            return
+        linea = json.dumps({"momento": datetime.now().isoformat(timespec="milliseconds"), **asdict(medicion)}, ensure_ascii=False)
+        with _lock_log:
+            with open(self.log, "a", encoding="utf-8") as f:
+                f.write(linea + "\n")
+
+    def tabla(self):
+        """Mediciones en orden de inicio, con la etapa sangrada según su nivel."""
+        if not self.mediciones:
+            return pd.DataFrame(columns=["ETAPA", "SEGUNDOS", "PICO_MB", "FILAS"])
+        filas = sorted(self.mediciones, key=lambda m: m.orden)
+        return pd.DataFrame({
+            "ETAPA": [("  " * (m.nivel - 1) + "↳ " if m.nivel else "") + m.etapa for m in filas],
+            "SEGUNDOS": [round(m.segundos, 3) for m in filas],
+            "PICO_MB": [None if m.pico_bytes is None else round(m.pico_bytes / 1024 ** 2, 1) for m in filas],
+            "FILAS": pd.array([m.filas for m in filas], dtype="Int64"),
+        })
+
+    @property
+    def total(self):
+        return sum(m.segundos for m in self.mediciones if m.nivel == 0)
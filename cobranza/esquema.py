@@ -0,0 +1,146 @@
+"""Esquemas de entrada y representación compacta de cartera y pagos.
+
+Cada archivo se normaliza según su esquema: nombres de columna, columnas
+obligatorias, columnas de texto y de montos. ID_COBRANZA, PERIODO y TIPO se
+guardan como categóricas. Los pagos se recodifican con el diccionario de
+categorías de la cartera, de modo que los groupby y merge entre ambas tablas
+trabajan sobre códigos enteros en lugar de hashear cadenas de Python.
+"""
+import pandas as pd
+
+
+# ==========================================
+# ESQUEMAS DE ENTRADA
+# ==========================================
+ESQUEMAS = {
+    "CARTERA": {
+        "requeridas": ["ID_COBRANZA", "PERIODO", "DEUDA", "TIPO"],
+        "renombrar": {},
+        "texto": ["ID_COBRANZA", "PERIODO"],
+        "montos": ["DEUDA"],
+        "corregir_negativos": True,
+        "categorias": ["ID_COBRANZA", "PERIODO", "TIPO"],
+    },
+    "PAGOS": {
+        "requeridas": ["ID_COBRANZA", "PERIODO", "IMPORTE"],
+        "renombrar": {},
+        "texto": ["ID_COBRANZA", "PERIODO"],
+        "montos": ["IMPORTE"],
+        "corregir_negativos": True,
+    },
+    "SUSCRIPTOR": {
+        "requeridas": ["CODIGO", "NUMERO", "NOMBRE", "FECHA"],
+        "renombrar": {},
+        "texto": ["CODIGO"],
+        "montos": [],
+        "corregir_negativos": False,
+    },
+    "PAGOS_SMS": {
+        "requeridas": ["CODIGO", "PERIODO", "IMPORTE"],
+        "renombrar": {"ID_COBRANZA": "CODIGO"},
+        "texto": ["CODIGO", "PERIODO"],
+        "montos": ["IMPORTE"],
+        "corregir_negativos": False,
+    },
+}
+
+AVISO_NEGATIVOS = "⚠️ Montos negativos detectados y corregidos"
+
+COLUMNAS_CATEGORICAS = ["ID_COBRANZA", "PERIODO", "TIPO"]
+
+
+class ErrorEsquema(ValueError):
+    def __init__(self, esquema, requeridas, encontradas):
+        self.esquema = esquema
+        self.requeridas = list(requeridas)
+        self.encontradas = list(encontradas)
+        super().__init__(f"El archivo {esquema} no tiene las columnas obligatorias")
+
+
+def normalizar_nombre(nombre):
+    return str(nombre).strip().upper().replace(" ", "_")
+
+
+def limpiar_columnas(df):
+    df.columns = df.columns.str.strip().str.upper().str.replace(" ", "_")
+    return df
+
+
+def columnas_esquema(columnas, esquema):
+    """Nombres normalizados y renombrados; valida las obligatorias."""
+    spec = ESQUEMAS[esquema]
+    columnas = [spec["renombrar"].get(c, c) for c in columnas]
+    if not set(spec["requeridas"]).issubset(columnas):
+        raise ErrorEsquema(esquema, spec["requeridas"], columnas)
+    return columnas
+
+
+def normalizar(df, esquema):
+    spec = ESQUEMAS[esquema]
+    avisos = []
+
+    df = limpiar_columnas(df)
+
+    renombrar = {origen: destino for origen, destino in spec["renombrar"].items() if origen in df.columns}
+    if renombrar:
+        df = df.rename(columns=renombrar)
+
+    if not set(spec["requeridas"]).issubset(df.columns):
+        raise ErrorEsquema(esquema, spec["requeridas"], df.columns)
+
+    for columna in spec["texto"]:
+        df[columna] = df[columna].astype(str)
+
+    for columna in spec["montos"]:
+        df[columna] = pd.to_numeric(df[columna], errors="coerce").fillna(0)
+        if spec["corregir_negativos"] and (df[columna] < 0).any():
+            avisos.append(AVISO_NEGATIVOS)
+            df[columna] = df[columna].abs()
+
+    return df, avisos
+
+
+def compactar_esquema(df, esquema):
+    """Aplica las categóricas del esquema; devuelve también (bytes antes, bytes después)."""
+    categorias = ESQUEMAS[esquema].get("categorias")
+    if not categorias:
+        return df, ()
+    antes = memoria_bytes(df)
+    df = compactar(df, categorias)
+    return df, (antes, memoria_bytes(df))
+
+
+# ==========================================
+# TIPOS COMPACTOS
+# ==========================================
+def memoria_bytes(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def compactar(df, columnas=COLUMNAS_CATEGORICAS):
+    cambios = {
+        columna: df[columna].astype("category")
+        for columna in columnas
+        if columna in df.columns and not isinstance(df[columna].dtype, pd.CategoricalDtype)
+    }
+    return df.assign(**cambios) if cambios else df
+
+
+def alinear_categorias(df, referencia, columnas):
+    """Recodifica ``columnas`` de ``df`` con las categorías de ``referencia``.
+
+    Los valores que no existen en la referencia quedan como NaN: en un cruce
+    contra la cartera nunca podrían coincidir.
+    """
+    cambios = {}
+    for columna in columnas:
+        dtype = referencia[columna].dtype
+        if not isinstance(dtype, pd.CategoricalDtype) or df[columna].dtype == dtype:
+            continue
+        codigos = dtype.categories.get_indexer(df[columna].astype(str))
+        cambios[columna] = pd.Categorical.from_codes(codigos, dtype=dtype)
+    return df.assign(**cambios) if cambios else df
+
+
+def formato_memoria(n_bytes):
+    return f"{n_bytes / (1024 * 1024):,.1f} MB"
@@ -0,0 +1,65 @@
+"""Exportación de campañas SMS a un único zip escrito en disco.
+
+La campaña se reparte en ``num_archivos`` CSV (``;``, utf-8 con BOM) y cada
+parte se escribe dentro del zip por bloques de filas, de modo que nunca hay más
+de un bloque serializado en memoria. Los registros y el MONTO de cada parte se
+acumulan en la misma pasada.
+"""
+import zipfile
+from dataclasses import dataclass
+
+from cobranza.temporales import ruta_temporal
+
+
+COLUMNAS_SMS = ["NUMERO", "NOMBRE", "FECHA", "CODIGO", "SALDO_PENDIENTE"]
+TAMANO_BLOQUE_CSV = 50_000
+
+
+@dataclass(frozen=True)
+class ParteExportada:
+    nombre: str
+    registros: int
+    monto: float
+
+
+def nombre_parte(prefijo, indice, num_archivos):
+    return f"{prefijo}_{indice + 1}.csv" if num_archivos > 1 else f"{prefijo}.csv"
+
+
+def rangos_partes(total, num_archivos):
+    """(inicio, fin) de cada parte no vacía, con el mismo reparto de siempre."""
+    tamano = total // num_archivos + 1
+    for i in range(num_archivos):
+        inicio = i * tamano
+        fin = min(inicio + tamano, total)
+        if inicio < fin:
+            yield i, inicio, fin
+
+
+def exportar_campana_zip(df_campana, num_archivos, prefijo, destino=None, tamano_bloque=TAMANO_BLOQUE_CSV):
+    """Escribe la campaña en un zip; devuelve ``(ruta, partes)``.
+
+    Sin ``destino`` se crea un archivo en el directorio de temporales de la
+    app (``cobranza.temporales``) que el llamador debe borrar.
+    """
+    if destino is None:
+        destino = ruta_temporal(f"{prefijo}_", ".zip")
+
+    columnas = df_campana[COLUMNAS_SMS]
+    partes = []
+    with zipfile.ZipFile(destino, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for i, inicio, fin in rangos_partes(len(columnas), num_archivos):
+            nombre = nombre_parte(prefijo, i, num_archivos)
+            monto = 0.0
+            with zf.open(nombre, "w", force_zip64=True) as salida:
+                for desde in range(inicio, fin, tamano_bloque):
+                    bloque = columnas.iloc[desde:min(desde + tamano_bloque, fin)]
+                    bloque = bloque.rename(columns={"SALDO_PENDIENTE": "MONTO"})
+                    primero = desde == inicio
+                    # Un solo write por bloque: escribir fila a fila en el zip es
+                    # muy lento. El BOM (utf-8-sig) va solo al comienzo del CSV
+                    texto = bloque.to_csv(index=False, sep=";", header=primero)
+                    salida.write(texto.encode("utf-8-sig" if primero else "utf-8"))
+                    monto += float(bloque["MONTO"].sum())
+            partes.append(ParteExportada(nombre=nombre, registros=fin - inicio, monto=monto))
+    return destino, partes
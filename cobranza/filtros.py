@@ -0,0 +1,158 @@
+"""Índice de filtros del dashboard de cruce.
+
+Por cada valor de PERIODO, TIPO y ESTADO se guarda el arreglo ordenado de
+posiciones de fila donde aparece, junto con los códigos enteros de cada
+columna. Se construye una vez por resultado; filtrar es intersectar posiciones
+sin copiar ni recorrer el resultado completo.
+
+El detalle se pagina del lado del servidor: el orden global por cada columna se
+calcula una sola vez y la selección ordenada de los filtros vigentes se
+conserva mientras se cambia de página, de modo que al navegador solo viaja la
+página visible.
+"""
+import numpy as np
+import pandas as pd
+
+from cobranza.calculos import ESTADO_PENDIENTE
+
+
+COLUMNAS_FILTRO = ["PERIODO", "TIPO", "ESTADO"]
+
+
+def _indexar(serie):
+    categorica = pd.Categorical(serie)
+    codigos = categorica.codes
+    # argsort estable: dentro de cada valor las posiciones quedan ordenadas
+    orden = np.argsort(codigos, kind="stable")
+    conteos = np.bincount(codigos[codigos >= 0], minlength=len(categorica.categories))
+    inicio = np.count_nonzero(codigos < 0)
+    posiciones = {}
+    for codigo, (valor, conteo) in enumerate(zip(categorica.categories, conteos)):
+        if conteo:
+            posiciones[str(valor)] = (codigo, orden[inicio:inicio + conteo])
+        inicio += conteo
+    return codigos, posiciones
+
+
+class IndiceFiltros:
+    def __init__(self, resultado):
+        self.resultado = resultado
+        self.codigos = {}
+        self.posiciones = {}
+        self._ordenes = {}
+        self._ids = None
+        self._ultima_seleccion = (None, None)
+        for columna in COLUMNAS_FILTRO:
+            self.codigos[columna], self.posiciones[columna] = _indexar(resultado[columna])
+
+    def valores(self, columna):
+        return sorted(self.posiciones[columna])
+
+    def filtrar(self, periodo=None, tipo=None, estado=None):
+        """Posiciones ordenadas de las filas que cumplen los filtros (None = Todos)."""
+        condiciones = []
+        for columna, valor in zip(COLUMNAS_FILTRO, [periodo, tipo, estado]):
+            if valor is None:
+                continue
+            if str(valor) not in self.posiciones[columna]:
+                return np.empty(0, dtype=np.intp)
+            codigo, posiciones = self.posiciones[columna][str(valor)]
+            condiciones.append((len(posiciones), columna, codigo, posiciones))
+        if not condiciones:
+            return np.arange(len(self.resultado))
+
+        # Se parte del valor más selectivo y el resto se comprueba sobre sus
+        # códigos: el costo es proporcional a la selección, no al resultado
+        condiciones.sort(key=lambda c: c[0])
+        seleccion = condiciones[0][3]
+        for _, columna, codigo, _ in condiciones[1:]:
+            seleccion = seleccion[self.codigos[columna][seleccion] == codigo]
+        return seleccion
+
+    def vista(self, periodo=None, tipo=None, estado=None):
+        return VistaFiltrada(self, self.filtrar(periodo, tipo, estado), (periodo, tipo, estado))
+
+    # ==========================================
+    # Orden y búsqueda
+    # ==========================================
+    def orden(self, columna):
+        """Permutación que ordena todo el resultado por ``columna``; se calcula una vez."""
+        if columna not in self._ordenes:
+            self._ordenes[columna] = np.asarray(self.resultado[columna].argsort(kind="stable"))
+        return self._ordenes[columna]
+
+    def ordenar(self, posiciones, columna, descendente=False):
+        orden = self.orden(columna)
+        if len(posiciones) == len(self.resultado):
+            seleccion = orden
+        else:
+            # Recorre el orden global quedándose con la selección: O(n), sin ordenar
+            mascara = np.zeros(len(self.resultado), dtype=bool)
+            mascara[posiciones] = True
+            seleccion = orden[mascara[orden]]
+        return seleccion[::-1] if descendente else seleccion
+
+    def buscar(self, posiciones, texto):
+        """Filas de ``posiciones`` cuyo ID_COBRANZA contiene ``texto``."""
+        if self._ids is None:
+            ids = pd.Categorical(self.resultado["ID_COBRANZA"])
+            self._ids = (ids.codes, ids.categories.astype(str))
+        codigos, categorias = self._ids
+        # La búsqueda recorre los IDs distintos, no las filas
+        coincidencias = np.flatnonzero(categorias.str.contains(texto, regex=False))
+        return posiciones[np.isin(codigos[posiciones], coincidencias)]
+
+    def seleccion(self, clave_filtros, posiciones, columna=None, descendente=False, busqueda=""):
+        """Selección buscada y ordenada; se reutiliza mientras solo cambia la página."""
+        clave = (clave_filtros, columna, descendente, busqueda)
+        ultima_clave, ultima = self._ultima_seleccion
+        if ultima_clave == clave:
+            return ultima
+
+        if busqueda:
+            posiciones = self.buscar(posiciones, busqueda)
+        if columna is not None:
+            posiciones = self.ordenar(posiciones, columna, descendente)
+        self._ultima_seleccion = (clave, posiciones)
+        return posiciones
+
+
+class VistaFiltrada:
+    """Vista posicional sobre el resultado: solo materializa las filas pedidas."""
+
+    def __init__(self, indice, posiciones, clave=None):
+        self.indice = indice
+        self.posiciones = posiciones
+        self.clave = clave
+
+    def __len__(self):
+        return len(self.posiciones)
+
+    def filas(self, columnas=None, posiciones=None):
+        resultado = self.indice.resultado
+        if columnas is not None:
+            resultado = resultado[columnas]
+        return resultado.take(self.posiciones if posiciones is None else posiciones)
+
+    def top_pendientes(self, n, columnas=None):
+        """Los ``n`` mayores saldos pendientes sin ordenar toda la selección."""
+        posiciones = self.posiciones
+        if ESTADO_PENDIENTE not in self.indice.posiciones["ESTADO"]:
+            posiciones = posiciones[:0]
+        else:
+            codigo, _ = self.indice.posiciones["ESTADO"][ESTADO_PENDIENTE]
+            posiciones = posiciones[self.indice.codigos["ESTADO"][posiciones] == codigo]
+        saldos = self.indice.resultado["SALDO_PENDIENTE"].to_numpy()[posiciones]
+        if len(posiciones) > n:
+            mayores = np.argpartition(saldos, len(saldos) - n)[-n:]
+            posiciones, saldos = posiciones[mayores], saldos[mayores]
+        orden = np.argsort(-saldos, kind="stable")
+        return self.filas(columnas, posiciones[orden])
+
+    def seleccion(self, columna=None, descendente=False, busqueda=""):
+        return self.indice.seleccion(self.clave, self.posiciones, columna, descendente, busqueda.strip())
+
+    def pagina(self, numero, tamano, columna=None, descendente=False, busqueda="", columnas=None):
+        """Filas de la página ``numero`` (desde 1) de la selección buscada y ordenada."""
+        inicio = (numero - 1) * tamano
+        return self.filas(columnas, self.seleccion(columna, descendente, busqueda)[inicio:inicio + tamano])
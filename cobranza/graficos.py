@@ -0,0 +1,129 @@
+"""Figuras Plotly del módulo de Gráficos Interactivos.
+
+Cada figura se construye solo a partir del cubo de agregados (``CuboCruce``),
+nunca del resultado fila a fila, de modo que puede guardarse en caché por la
+huella del resultado y reutilizarse entre reruns.
+"""
+import plotly.graph_objects as go
+
+
+def figura_comparativa(cubo):
+    totales = cubo.totales()
+    total_recuperado = totales["total_recuperado"]
+    saldo_pendiente = totales["saldo_pendiente"]
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        name='Recuperado',
+        x=['Monto Total'],
+        y=[total_recuperado],
+        marker_color='#28a745',
+        text=[f'Bs. {total_recuperado:,.2f}'],
+        textposition='auto',
+        hovertemplate='<b>Recuperado</b><br>Bs. %{y:,.2f}<extra></extra>'
+    ))
+    fig.add_trace(go.Bar(
+        name='Pendiente',
+        x=['Monto Total'],
+        y=[saldo_pendiente],
+        marker_color='#dc3545',
+        text=[f'Bs. {saldo_pendiente:,.2f}'],
+        textposition='auto',
+        hovertemplate='<b>Pendiente</b><br>Bs. %{y:,.2f}<extra></extra>'
+    ))
+    fig.update_layout(barmode='group', height=400, showlegend=True, hovermode='x unified')
+    return fig
+
+
+def figura_casos(cubo):
+    totales = cubo.totales()
+    fig = go.Figure(data=[go.Pie(
+        labels=['Pagado', 'Pendiente'],
+        values=[totales["casos_pagados"], totales["casos_pendientes"]],
+        marker=dict(colors=['#28a745', '#ffc107']),
+        hole=0.4,
+        textinfo='label+percent+value',
+        hovertemplate='<b>%{label}</b><br>Casos: %{value}<br>%{percent}<extra></extra>'
+    )])
+    fig.update_layout(height=400, annotations=[dict(text=f'{totales["total_casos"]}<br>Total', x=0.5, y=0.5, font_size=20, showarrow=False)])
+    return fig
+
+
+def figura_montos(cubo):
+    totales = cubo.totales()
+    fig = go.Figure(data=[go.Pie(
+        labels=['Recuperado', 'Pendiente'],
+        values=[totales["total_recuperado"], totales["saldo_pendiente"]],
+        marker=dict(colors=['#28a745', '#dc3545']),
+        hole=0.4,
+        textinfo='label+percent',
+        hovertemplate='<b>%{label}</b><br>Bs. %{value:,.2f}<br>%{percent}<extra></extra>'
+    )])
+    fig.update_layout(height=400, annotations=[dict(text=f'Bs. {totales["total_cartera"]:,.0f}<br>Total', x=0.5, y=0.5, font_size=16, showarrow=False)])
+    return fig
+
+
+def figura_periodo(cubo):
+    periodo_analisis = cubo.por_periodo()
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(name='Deuda Total', x=periodo_analisis['PERIODO'], y=periodo_analisis['DEUDA'], marker_color='#667eea'))
+    fig.add_trace(go.Bar(name='Pagado', x=periodo_analisis['PERIODO'], y=periodo_analisis['TOTAL_PAGADO'], marker_color='#28a745'))
+    fig.add_trace(go.Bar(name='Pendiente', x=periodo_analisis['PERIODO'], y=periodo_analisis['SALDO_PENDIENTE'], marker_color='#ffc107'))
+    fig.update_layout(barmode='group', height=450, xaxis_title="Periodo", yaxis_title="Monto (Bs.)", hovermode='x unified')
+    return fig
+
+
+def figura_tipo(cubo):
+    tipo_analisis = cubo.por_tipo()
+    tipo_analisis["Pendiente"] = tipo_analisis["DEUDA"] - tipo_analisis["TOTAL_PAGADO"]
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(name='Recuperado', x=tipo_analisis['TIPO'], y=tipo_analisis['TOTAL_PAGADO'], marker_color='#28a745'))
+    fig.add_trace(go.Bar(name='Pendiente', x=tipo_analisis['TIPO'], y=tipo_analisis['Pendiente'], marker_color='#ffc107'))
+    fig.update_layout(barmode='stack', height=450, xaxis_title="Tipo de Deuda", yaxis_title="Monto (Bs.)", hovermode='x unified')
+    return fig
+
+
+def figura_efectividad(cubo):
+    efectividad_periodo = cubo.efectividad_por_periodo()
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=efectividad_periodo['PERIODO'],
+        y=efectividad_periodo['EFECTIVIDAD'],
+        mode='lines+markers+text',
+        line=dict(color='#667eea', width=3),
+        marker=dict(size=12, color='#764ba2'),
+        text=[f'{val:.1f}%' for val in efectividad_periodo['EFECTIVIDAD']],
+        textposition='top center'
+    ))
+    fig.add_hline(y=70, line_dash="dash", line_color="green", annotation_text="Meta: 70%")
+    fig.add_hline(y=50, line_dash="dot", line_color="orange", annotation_text="Umbral: 50%")
+    fig.update_layout(height=400, xaxis_title="Periodo", yaxis_title="Efectividad (%)", yaxis_range=[0, 100])
+    return fig
+
+
+def figura_top(cubo, n=10):
+    top = cubo.top_pendientes.head(n)
+    fig = go.Figure(go.Bar(
+        x=top['SALDO_PENDIENTE'],
+        y=top['ID_COBRANZA'],
+        orientation='h',
+        marker=dict(color=top['SALDO_PENDIENTE'], colorscale='Reds', showscale=True),
+        text=[f'Bs. {val:,.2f}' for val in top['SALDO_PENDIENTE']],
+        textposition='auto'
+    ))
+    fig.update_layout(height=500, xaxis_title="Saldo (Bs.)", yaxis_title="ID Cobranza", yaxis=dict(autorange="reversed"))
+    return fig
+
+
+FIGURAS = {
+    "comparativa": figura_comparativa,
+    "casos": figura_casos,
+    "montos": figura_montos,
+    "periodo": figura_periodo,
+    "tipo": figura_tipo,
+    "efectividad": figura_efectividad,
+    "top": figura_top,
+}
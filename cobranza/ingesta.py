@@ -0,0 +1,307 @@
+"""Ingesta de archivos con caché por contenido.
+
+Cada archivo subido se identifica por el hash de sus bytes más el esquema con
+el que se normaliza. El DataFrame ya limpio y tipado se guarda en una caché LRU
+acotada por memoria, de modo que un rerun de Streamlit solo vuelve a leer el
+archivo cuando su contenido cambió.
+
+Varios archivos de PAGOS (uno por banco o canal) se leen en paralelo en el pool
+de ``cobranza.paralelo`` y se combinan sin concatenar los DataFrames completos:
+cada archivo devuelve solo las columnas del esquema y un hash por fila de la
+clave de duplicados. Los archivos se procesan en orden: las filas ya
+informadas por uno anterior se descartan por ese hash y, para el resumen de
+pagos, el archivo se agrega y se libera antes de pasar al siguiente. Dentro de
+un mismo archivo nunca se descarta nada: dos cuotas iguales del mismo cliente
+son dos pagos.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from cobranza.cruce import resumir_pagos_por_bloques
+from cobranza.esquema import ESQUEMAS, compactar_esquema, memoria_bytes
+from cobranza.lectores import iterar_archivo, leer_archivo
+from cobranza.paralelo import WORKERS, a_buffer, de_buffer, obtener_pool
+
+
+# Columnas candidatas, por esquema, para reconocer un mismo pago informado por
+# dos canales; todos los archivos tienen que traer todas las de la clave
+CLAVE_DUPLICADOS = {
+    "PAGOS": ["ID_COBRANZA", "PERIODO", "IMPORTE", "FECHA"],
+    "PAGOS_SMS": ["CODIGO", "PERIODO", "IMPORTE", "FECHA"],
+}
+
+
+class ErrorClaveDuplicados(ValueError):
+    """Un archivo no trae todas las columnas de la clave de pagos repetidos."""
+
+
+@dataclass(frozen=True)
+class TablaCargada:
+    df: pd.DataFrame
+    huella: str
+    avisos: tuple = ()
+    # (bytes antes, bytes después) de compactar tipos, si el esquema lo hace
+    memoria: tuple = ()
+    # Filas descartadas por repetidas al combinar varios archivos
+    duplicados: int = 0
+
+
+def huella_contenido(datos, esquema):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(datos)
+    # El esquema forma parte de la clave: los mismos bytes normalizados con
+    # otras reglas producen otro DataFrame
+    h.update(repr(sorted(ESQUEMAS[esquema].items())).encode("utf-8"))
+    return h.hexdigest()
+
+
+# ==========================================
+# CACHÉ LRU ACOTADA POR MEMORIA
+# ==========================================
+class CacheIngesta:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            self._entradas.move_to_end(clave)
+            return entrada[0]
+
+    def guardar(self, clave, valor, tamano):
+        with self._lock:
+            if clave in self._entradas:
+                self._bytes -= self._entradas.pop(clave)[1]
+            # Un valor más grande que toda la caché no se guarda
+            if tamano > self.max_bytes:
+                return
+            while self._entradas and self._bytes + tamano > self.max_bytes:
+                _, (_, tamano_expulsado) = self._entradas.popitem(last=False)
+                self._bytes -= tamano_expulsado
+            self._entradas[clave] = (valor, tamano)
+            self._bytes += tamano
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    @property
+    def bytes_usados(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+CACHE_INGESTA = CacheIngesta(int(os.environ.get("COBRANZA_CACHE_MB", "1024")) * 1024 * 1024)
+
+
+def leer_bytes(archivo):
+    if hasattr(archivo, "getvalue"):
+        return archivo.getvalue()
+    return archivo.read()
+
+
+def nombre_archivo(archivo):
+    return getattr(archivo, "name", "")
+
+
+def cargar_tabla(archivo, esquema, cache=CACHE_INGESTA, progreso=None):
+    """Lee, normaliza y valida un archivo subido, reutilizando la caché."""
+    datos = leer_bytes(archivo)
+    huella = huella_contenido(datos, esquema)
+
+    tabla = cache.obtener(huella)
+    if tabla is not None:
+        return tabla
+
+    df, avisos = leer_archivo(datos, esquema, nombre_archivo(archivo), progreso=progreso)
+    df, memoria = compactar_esquema(df, esquema)
+
+    tabla = TablaCargada(df=df, huella=huella, avisos=tuple(avisos), memoria=memoria)
+    cache.guardar(huella, tabla, memoria_bytes(df))
+    return tabla
+
+
+def cargar_resumen_pagos(archivo, df_deuda, huella_cartera=None, cache=CACHE_INGESTA, progreso=None):
+    """Resumen TOTAL_PAGADO por (ID_COBRANZA, PERIODO) sin materializar el archivo de PAGOS.
+
+    Cada bloque se recodifica con las categorías de ``df_deuda`` y se agrega
+    antes de leer el siguiente. ``huella`` de la tabla devuelta es la del
+    archivo, la misma que usaría ``cargar_tabla``.
+    """
+    datos = leer_bytes(archivo)
+    huella = huella_contenido(datos, "PAGOS")
+    clave = f"{huella}:resumen:{huella_cartera}"
+
+    tabla = cache.obtener(clave)
+    if tabla is not None:
+        return tabla
+
+    avisos = []
+
+    def bloques():
+        for df, avisos_bloque in iterar_archivo(datos, "PAGOS", nombre_archivo(archivo), progreso=progreso):
+            avisos.extend(a for a in avisos_bloque if a not in avisos)
+            yield df
+
+    resumen = resumir_pagos_por_bloques(bloques(), df_deuda).to_frame()
+
+    tabla = TablaCargada(df=resumen, huella=huella, avisos=tuple(avisos))
+    cache.guardar(clave, tabla, memoria_bytes(resumen))
+    return tabla
+
+
+# ==========================================
+# VARIOS ARCHIVOS DE PAGOS
+# ==========================================
+def huella_archivos(huellas, clave_duplicados):
+    h = hashlib.blake2b(digest_size=16)
+    for huella in huellas:
+        h.update(huella.encode("ascii"))
+    h.update(repr(list(clave_duplicados)).encode("utf-8"))
+    return h.hexdigest()
+
+
+def hash_filas(df, clave_duplicados, nombre=""):
+    # Con una clave incompleta dos pagos distintos podrían parecer el mismo
+    faltantes = [c for c in clave_duplicados if c not in df.columns]
+    if faltantes:
+        raise ErrorClaveDuplicados(
+            f"No se pueden descartar pagos repetidos: {nombre or 'un archivo'} no tiene "
+            f"{', '.join(faltantes)}. Quita esas columnas de la clave o no descartes repetidos."
+        )
+    return pd.util.hash_pandas_object(df[list(clave_duplicados)], index=False).to_numpy()
+
+
+class RepetidosEntreArchivos:
+    """Filas ya informadas por un archivo anterior, archivo por archivo y en orden.
+
+    La n-ésima aparición de un hash en un archivo es repetida solo si algún
+    archivo anterior lo trae al menos n veces: las cuotas iguales dentro de un
+    archivo se conservan. De los archivos ya vistos solo se recuerda, por
+    hash, la mayor cantidad de apariciones.
+    """
+
+    def __init__(self):
+        self.vistas = pd.Series(dtype="int64")
+        self.duplicados = 0
+
+    def repetidas(self, hashes):
+        """Máscara de las filas repetidas del archivo siguiente."""
+        serie = pd.Series(hashes)
+        ocurrencias = serie.groupby(hashes).cumcount().to_numpy()
+        repetidas = ocurrencias < self.vistas.reindex(hashes, fill_value=0).to_numpy()
+        self.vistas = pd.concat([self.vistas, serie.value_counts()]).groupby(level=0).max()
+        self.duplicados += int(repetidas.sum())
+        return repetidas
+
+
+def leer_filas_pagos(datos, esquema, nombre="", clave_duplicados=()):
+    """Columnas del esquema y hash por fila de un archivo; corre en el proceso hijo.
+
+    Devuelve ``(buffer, avisos)`` con un buffer Arrow: viaja entre procesos
+    mucho más rápido que un DataFrame serializado con pickle.
+    """
+    requeridas = ESQUEMAS[esquema]["requeridas"]
+    bloques = []
+    avisos = []
+    for df, avisos_bloque in iterar_archivo(datos, esquema, nombre):
+        avisos.extend(a for a in avisos_bloque if a not in avisos)
+        bloque = {c: df[c].to_numpy() for c in requeridas}
+        if clave_duplicados:
+            bloque["HASH"] = hash_filas(df, clave_duplicados, nombre)
+        bloques.append(bloque)
+    columnas = requeridas + (["HASH"] if clave_duplicados else [])
+    if not bloques:
+        bloques = [{c: np.empty(0, dtype=np.uint64 if c == "HASH" else object) for c in columnas}]
+    return a_buffer({c: np.concatenate([b[c] for b in bloques]) for c in columnas}), avisos
+
+
+def iterar_archivos_pagos(contenidos, esquema, clave_duplicados, workers, repetidos):
+    """Genera ``(df, avisos)`` por cada ``(datos, nombre)``, sin las filas repetidas entre archivos.
+
+    Ante un pago repetido se conserva el del primer archivo, en el orden de
+    ``contenidos``; ``repetidos`` (un ``RepetidosEntreArchivos``) cuenta los
+    descartados. Con ``workers`` > 1 los archivos se leen en paralelo, pero se
+    entregan en orden: uno ya leído espera a los anteriores.
+    """
+    tareas = [(datos, esquema, nombre, tuple(clave_duplicados)) for datos, nombre in contenidos]
+    if workers > 1 and len(tareas) > 1:
+        respuestas = obtener_pool(workers).map(leer_filas_pagos, *zip(*tareas))
+    else:
+        respuestas = (leer_filas_pagos(*tarea) for tarea in tareas)
+
+    for buffer, avisos in respuestas:
+        df = pd.DataFrame(de_buffer(buffer))
+        if clave_duplicados:
+            df = df.loc[~repetidos.repetidas(df["HASH"].to_numpy())].drop(columns="HASH")
+        yield df, avisos
+
+
+def cargar_tablas(archivos, esquema, clave_duplicados=(), workers=WORKERS, cache=CACHE_INGESTA, progreso=None):
+    """Como ``cargar_tabla`` pero para varios archivos del mismo esquema, combinados en una tabla."""
+    if len(archivos) == 1 and not clave_duplicados:
+        return cargar_tabla(archivos[0], esquema, cache=cache, progreso=progreso)
+
+    contenidos = [(leer_bytes(archivo), nombre_archivo(archivo)) for archivo in archivos]
+    huella = huella_archivos([huella_contenido(datos, esquema) for datos, _ in contenidos], clave_duplicados)
+    tabla = cache.obtener(huella)
+    if tabla is not None:
+        return tabla
+
+    repetidos = RepetidosEntreArchivos()
+    partes = []
+    avisos = []
+    for parte, avisos_archivo in iterar_archivos_pagos(contenidos, esquema, clave_duplicados, workers, repetidos):
+        avisos.extend(a for a in avisos_archivo if a not in avisos)
+        partes.append(parte)
+    df, memoria = compactar_esquema(pd.concat(partes, ignore_index=True), esquema)
+
+    tabla = TablaCargada(df=df, huella=huella, avisos=tuple(avisos), memoria=memoria, duplicados=repetidos.duplicados)
+    cache.guardar(huella, tabla, memoria_bytes(df))
+    return tabla
+
+
+def cargar_resumen_pagos_multiples(archivos, df_deuda, huella_cartera=None, clave_duplicados=(), workers=WORKERS,
+                                   cache=CACHE_INGESTA, progreso=None):
+    """Resumen TOTAL_PAGADO de varios archivos de PAGOS, sin filas repetidas entre ellos.
+
+    Cada archivo se resume apenas se descartan sus filas repetidas, y sus
+    filas se liberan antes de procesar el siguiente; los resúmenes se suman.
+    """
+    if len(archivos) == 1 and not clave_duplicados:
+        return cargar_resumen_pagos(archivos[0], df_deuda, huella_cartera, cache=cache, progreso=progreso)
+
+    contenidos = [(leer_bytes(archivo), nombre_archivo(archivo)) for archivo in archivos]
+    huella = huella_archivos([huella_contenido(datos, "PAGOS") for datos, _ in contenidos], clave_duplicados)
+    clave = f"{huella}:resumen:{huella_cartera}"
+    tabla = cache.obtener(clave)
+    if tabla is not None:
+        return tabla
+
+    repetidos = RepetidosEntreArchivos()
+    avisos = []
+
+    def partes():
+        for parte, avisos_archivo in iterar_archivos_pagos(contenidos, "PAGOS", clave_duplicados, workers, repetidos):
+            avisos.extend(a for a in avisos_archivo if a not in avisos)
+            yield parte
+
+    resumen = resumir_pagos_por_bloques(partes(), df_deuda).to_frame()
+
+    tabla = TablaCargada(df=resumen, huella=huella, avisos=tuple(avisos), duplicados=repetidos.duplicados)
+    cache.guardar(clave, tabla, memoria_bytes(resumen))
+    return tabla
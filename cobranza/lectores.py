@@ -0,0 +1,231 @@
+"""Lectura por bloques de archivos grandes (xlsx, csv y parquet).
+
+El formato se detecta por el contenido. El xlsx se recorre con openpyxl en
+modo ``read_only``, que no construye el árbol completo de celdas en memoria;
+el csv y el parquet se leen con pyarrow por lotes. En los tres casos el
+encabezado se valida contra el esquema antes de leer cualquier fila de datos,
+y cada bloque se entrega ya tipado por ``normalizar``.
+"""
+import csv
+import io
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+
+from cobranza.esquema import ESQUEMAS, columnas_esquema, normalizar, normalizar_nombre
+
+
+TAMANO_BLOQUE = 100_000
+FORMATOS = ["xlsx", "csv", "parquet"]
+
+BOM_UTF8 = b"\xef\xbb\xbf"
+
+
+def _nombres_encabezado(encabezado):
+    return [
+        f"Unnamed: {i}" if valor is None else normalizar_nombre(valor)
+        for i, valor in enumerate(encabezado)
+    ]
+
+
+def _bloque_a_df(filas, columnas, texto):
+    df = pd.DataFrame(filas, columns=columnas, dtype=object)
+    # Los códigos se dejan como objeto: inferir el bloque convertiría un
+    # entero con huecos en float ("123.0") de forma distinta en cada bloque
+    otras = [c for c in columnas if c not in texto]
+    if otras:
+        df[otras] = df[otras].infer_objects()
+    return df
+
+
+def iterar_xlsx(datos, esquema, tamano_bloque=TAMANO_BLOQUE, progreso=None):
+    """Genera ``(df, avisos)`` por bloque de la primera hoja del xlsx.
+
+    ``progreso(leidas, total)`` se llama tras cada bloque; ``total`` es None si
+    el archivo no declara sus dimensiones.
+    """
+    libro = load_workbook(io.BytesIO(datos), read_only=True, data_only=True)
+    try:
+        hoja = libro.worksheets[0]
+        filas = hoja.iter_rows(values_only=True)
+
+        encabezado = next(filas, None)
+        if encabezado is None:
+            columnas_esquema([], esquema)
+        columnas = _nombres_encabezado(encabezado)
+        # Falla aquí, antes de leer datos, si faltan columnas obligatorias
+        columnas = columnas_esquema(columnas, esquema)
+        texto = set(ESQUEMAS[esquema]["texto"])
+
+        ancho = len(columnas)
+        total = hoja.max_row - 1 if hoja.max_row else None
+        leidas = 0
+        bloque = []
+        for fila in filas:
+            if all(valor is None for valor in fila):
+                continue
+            bloque.append(fila[:ancho])
+            if len(bloque) >= tamano_bloque:
+                leidas += len(bloque)
+                yield normalizar(_bloque_a_df(bloque, columnas, texto), esquema)
+                bloque = []
+                if progreso:
+                    progreso(leidas, total)
+
+        if bloque or leidas == 0:
+            leidas += len(bloque)
+            yield normalizar(_bloque_a_df(bloque, columnas, texto), esquema)
+            if progreso:
+                progreso(leidas, total)
+    finally:
+        libro.close()
+
+
+# ==========================================
+# DETECCIÓN DE FORMATO
+# ==========================================
+def detectar_formato(datos, nombre=""):
+    if datos[:4] == b"PAR1":
+        return "parquet"
+    if datos[:4] == b"PK\x03\x04":
+        return "xlsx"
+    extension = str(nombre).rsplit(".", 1)[-1].lower()
+    if extension in FORMATOS:
+        return extension
+    return "csv"
+
+
+def detectar_separador(primera_linea):
+    # Las exportaciones SMS usan ";", los sistemas de facturación suelen usar ","
+    candidatos = [";", ",", "\t", "|"]
+    return max(candidatos, key=primera_linea.count)
+
+
+# ==========================================
+# CSV
+# ==========================================
+def _encabezado_csv(datos):
+    primera_linea = datos[:64 * 1024].split(b"\n", 1)[0].decode("utf-8", errors="replace").rstrip("\r")
+    separador = detectar_separador(primera_linea)
+    nombres = next(csv.reader([primera_linea], delimiter=separador))
+    return nombres, separador
+
+
+def _a_numero(serie, separador):
+    # Con ";" como separador el decimal suele ser la coma: "1.234,56". Se
+    # decide valor por valor: el punto es de miles solo donde hay coma, así un
+    # "89.37" de la misma columna (o de otro bloque) se lee igual
+    if separador == ";":
+        con_coma = serie.str.contains(",", regex=False, na=False)
+        if con_coma.any():
+            convertidos = serie.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+            serie = serie.where(~con_coma, convertidos)
+    return pd.to_numeric(serie, errors="coerce")
+
+
+def iterar_csv(datos, esquema, tamano_bloque=TAMANO_BLOQUE, progreso=None):
+    if datos.startswith(BOM_UTF8):
+        datos = datos[len(BOM_UTF8):]
+
+    crudas, separador = _encabezado_csv(datos)
+    columnas = columnas_esquema([normalizar_nombre(c) for c in crudas], esquema)
+
+    spec = ESQUEMAS[esquema]
+    # Tipos explícitos: los códigos siempre como texto (conserva ceros a la
+    # izquierda) y los montos como texto para tolerar la coma decimal
+    tipos = {
+        cruda: pa.string()
+        for cruda, columna in zip(crudas, columnas)
+        if columna in spec["texto"] or columna in spec["montos"]
+    }
+    lector = pa_csv.open_csv(
+        io.BytesIO(datos),
+        read_options=pa_csv.ReadOptions(block_size=8 * 1024 * 1024),
+        parse_options=pa_csv.ParseOptions(delimiter=separador),
+        convert_options=pa_csv.ConvertOptions(column_types=tipos, strings_can_be_null=True),
+    )
+
+    # El csv no declara cuántas filas tiene: el progreso se informa sin total
+    total = None
+    leidas = 0
+    pendientes = []
+    filas_pendientes = 0
+    for lote in lector:
+        pendientes.append(lote)
+        filas_pendientes += len(lote)
+        if filas_pendientes < tamano_bloque:
+            continue
+        leidas += filas_pendientes
+        yield _lotes_csv_a_df(pendientes, columnas, esquema, separador)
+        pendientes = []
+        filas_pendientes = 0
+        if progreso:
+            progreso(leidas, total)
+
+    if pendientes or leidas == 0:
+        leidas += filas_pendientes
+        if pendientes:
+            yield _lotes_csv_a_df(pendientes, columnas, esquema, separador)
+        else:
+            yield normalizar(pd.DataFrame(columns=columnas), esquema)
+        if progreso:
+            progreso(leidas, total)
+
+
+def _lotes_csv_a_df(lotes, columnas, esquema, separador):
+    df = pa.Table.from_batches(lotes).to_pandas()
+    df.columns = columnas
+    for columna in ESQUEMAS[esquema]["montos"]:
+        df[columna] = _a_numero(df[columna], separador)
+    return normalizar(df, esquema)
+
+
+# ==========================================
+# PARQUET
+# ==========================================
+def iterar_parquet(datos, esquema, tamano_bloque=TAMANO_BLOQUE, progreso=None):
+    archivo = pq.ParquetFile(io.BytesIO(datos))
+    crudas = archivo.schema_arrow.names
+    columnas = columnas_esquema([normalizar_nombre(c) for c in crudas], esquema)
+
+    total = archivo.metadata.num_rows
+    leidas = 0
+    for lote in archivo.iter_batches(batch_size=tamano_bloque):
+        df = lote.to_pandas()
+        df.columns = columnas
+        leidas += len(df)
+        yield normalizar(df, esquema)
+        if progreso:
+            progreso(leidas, total)
+
+    if leidas == 0:
+        yield normalizar(archivo.schema_arrow.empty_table().to_pandas().set_axis(columnas, axis=1), esquema)
+
+
+# ==========================================
+# DESPACHO POR FORMATO
+# ==========================================
+LECTORES = {
+    "xlsx": iterar_xlsx,
+    "csv": iterar_csv,
+    "parquet": iterar_parquet,
+}
+
+
+def iterar_archivo(datos, esquema, nombre="", tamano_bloque=TAMANO_BLOQUE, progreso=None):
+    """Genera ``(df, avisos)`` por bloque, cualquiera sea el formato."""
+    lector = LECTORES[detectar_formato(datos, nombre)]
+    return lector(datos, esquema, tamano_bloque=tamano_bloque, progreso=progreso)
+
+
+def leer_archivo(datos, esquema, nombre="", tamano_bloque=TAMANO_BLOQUE, progreso=None):
+    """Lee el archivo completo por bloques; devuelve ``(df, avisos)``."""
+    bloques = []
+    avisos = []
+    for df, avisos_bloque in iterar_archivo(datos, esquema, nombre, tamano_bloque, progreso):
+        bloques.append(df)
+        avisos.extend(a for a in avisos_bloque if a not in avisos)
+    return pd.concat(bloques, ignore_index=True), avisos
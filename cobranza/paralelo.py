@@ -0,0 +1,182 @@
+"""Cruce Deuda vs Pagos particionado por PERIODO, serial o en paralelo.
+
+Los pagos solo coinciden con la cartera dentro del mismo PERIODO, así que cada
+periodo se cruza de forma independiente: en el mismo proceso (serial) o en un
+pool de procesos. A cada partición solo viajan buffers Arrow con códigos
+enteros de ID_COBRANZA y montos (nunca los diccionarios de texto); devuelve
+TOTAL_PAGADO y las columnas derivadas alineadas con sus filas de cartera, y el
+proceso principal las ubica en su posición original. El resultado es el mismo
+que el del merge sobre toda la cartera.
+
+``COBRANZA_WORKERS`` fija la cantidad de procesos por defecto; con 1 (el valor
+por omisión) las particiones se cruzan en serie, sin pool.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from cobranza.calculos import ESTADOS, calcular_derivadas
+
+
+WORKERS = int(os.environ.get("COBRANZA_WORKERS", "1"))
+
+_pool = None
+_pool_workers = 0
+_lock = threading.Lock()
+
+
+def obtener_pool(workers):
+    """Pool de procesos compartido; se recrea solo si cambia la cantidad de workers."""
+    global _pool, _pool_workers
+    with _lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            # spawn: Streamlit corre con hilos y un fork heredaría sus locks
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+@atexit.register
+def cerrar_pool():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+# ==========================================
+# Serialización Arrow
+# ==========================================
+def a_buffer(columnas):
+    lote = pa.RecordBatch.from_pydict({nombre: pa.array(valores) for nombre, valores in columnas.items()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, lote.schema) as writer:
+        writer.write_batch(lote)
+    return sink.getvalue()
+
+
+def de_buffer(buffer):
+    tabla = pa.ipc.open_stream(buffer).read_all()
+    return {nombre: tabla.column(nombre).to_numpy() for nombre in tabla.column_names}
+
+
+# ==========================================
+# Partición
+# ==========================================
+def codigos_comunes(cartera, pagos):
+    """Códigos enteros de ``cartera`` y ``pagos`` sobre el mismo diccionario (-1 = sin par)."""
+    if isinstance(cartera.dtype, pd.CategoricalDtype) and cartera.dtype == pagos.dtype:
+        return cartera.cat.codes.to_numpy(), pagos.cat.codes.to_numpy()
+    codigos, valores = pd.factorize(cartera)
+    return codigos, pd.Index(valores).get_indexer(pagos)
+
+
+def particiones(codigos):
+    """Posiciones de fila de cada código, en orden estable."""
+    orden = np.argsort(codigos, kind="stable")
+    valores, inicios = np.unique(codigos[orden], return_index=True)
+    return dict(zip(valores.tolist(), np.split(orden, inicios[1:])))
+
+
+def pagado_por_clave(claves_cartera, claves_pagos, importes):
+    """TOTAL_PAGADO de cada fila de cartera; las claves de pagos son únicas."""
+    # Sin pagos (un periodo sin cobros, o ninguna clave en común) todo queda en cero
+    if len(importes) == 0:
+        return np.zeros(len(claves_cartera))
+    posiciones = pd.Index(claves_pagos).get_indexer(claves_cartera)
+    return np.where(posiciones >= 0, importes[posiciones], 0.0)
+
+
+def derivadas(deuda, pagado):
+    parcial = calcular_derivadas(pd.DataFrame({"DEUDA": deuda, "TOTAL_PAGADO": pagado}))
+    return {
+        "TOTAL_PAGADO": parcial["TOTAL_PAGADO"].to_numpy(),
+        "SALDO_PENDIENTE": parcial["SALDO_PENDIENTE"].to_numpy(),
+        "ESTADO": parcial["ESTADO"].cat.codes.to_numpy(),
+        "PORCENTAJE_PAGADO": parcial["PORCENTAJE_PAGADO"].to_numpy(),
+    }
+
+
+def cruzar_particion(buffer_cartera, buffer_pagos):
+    """Cruce de un PERIODO: corre en el proceso hijo."""
+    cartera = de_buffer(buffer_cartera)
+    pagos = de_buffer(buffer_pagos)
+    pagado = pagado_por_clave(cartera["ID"], pagos["ID"], pagos["TOTAL_PAGADO"])
+    return a_buffer(derivadas(cartera["DEUDA"], pagado))
+
+
+def cruzar_particionado(df_deuda, pagos_resumen, workers=WORKERS, progreso=None):
+    """Cartera con TOTAL_PAGADO y columnas derivadas, cruzada por PERIODO.
+
+    ``progreso(hechas, total)`` se llama entre pasos (en paralelo, por
+    partición terminada); una excepción lanzada desde ahí interrumpe el cruce.
+    """
+    avisar = progreso or (lambda hechas, total: None)
+    pagos = pagos_resumen.reset_index()
+    periodo_cartera, periodo_pagos = codigos_comunes(df_deuda["PERIODO"], pagos["PERIODO"])
+    id_cartera, id_pagos = codigos_comunes(df_deuda["ID_COBRANZA"], pagos["ID_COBRANZA"])
+    deuda = df_deuda["DEUDA"].to_numpy(dtype="float64")
+    importes = pagos["TOTAL_PAGADO"].to_numpy(dtype="float64")
+
+    validos = (periodo_pagos >= 0) & (id_pagos >= 0)
+
+    if workers <= 1:
+        avisar(1, 3)
+        # En serie no hace falta partir: una sola búsqueda sobre la clave
+        # (PERIODO, ID) empaquetada en un entero
+        base = np.int64(max(id_cartera.max(initial=0), id_pagos.max(initial=0)) + 1)
+        claves_cartera = np.where(
+            (periodo_cartera >= 0) & (id_cartera >= 0), periodo_cartera.astype(np.int64) * base + id_cartera, -1
+        )
+        claves_pagos = periodo_pagos[validos].astype(np.int64) * base + id_pagos[validos]
+        pagado = pagado_por_clave(claves_cartera, claves_pagos, importes[validos])
+        avisar(2, 3)
+        columnas = derivadas(deuda, pagado)
+        avisar(3, 3)
+    else:
+        columnas = _cruzar_en_pool(
+            periodo_cartera, id_cartera, deuda, np.where(validos, periodo_pagos, -1), id_pagos, importes, workers, avisar
+        )
+
+    columnas["ESTADO"] = pd.Categorical.from_codes(columnas["ESTADO"], categories=ESTADOS)
+    return df_deuda.assign(**columnas).reset_index(drop=True)
+
+
+def _cruzar_en_pool(periodo_cartera, id_cartera, deuda, periodo_pagos, id_pagos, importes, workers, avisar):
+    filas_pagos = particiones(periodo_pagos)
+    vacio = np.empty(0, dtype=np.intp)
+
+    tareas = []
+    for periodo, filas in particiones(periodo_cartera).items():
+        # Sin PERIODO (-1) no hay pago que pueda coincidir
+        filas_p = filas_pagos.get(periodo, vacio) if periodo >= 0 else vacio
+        tareas.append((
+            filas,
+            a_buffer({"ID": id_cartera[filas], "DEUDA": deuda[filas]}),
+            a_buffer({"ID": id_pagos[filas_p], "TOTAL_PAGADO": importes[filas_p]}),
+        ))
+
+    respuestas = obtener_pool(workers).map(cruzar_particion, [t[1] for t in tareas], [t[2] for t in tareas])
+
+    n = len(deuda)
+    columnas = {
+        "TOTAL_PAGADO": np.zeros(n),
+        "SALDO_PENDIENTE": np.zeros(n),
+        "ESTADO": np.zeros(n, dtype=np.int8),
+        "PORCENTAJE_PAGADO": np.zeros(n),
+    }
+    avisar(0, len(tareas))
+    for hechas, ((filas, _, _), respuesta) in enumerate(zip(tareas, respuestas), start=1):
+        for nombre, valores in de_buffer(respuesta).items():
+            columnas[nombre][filas] = valores
+        avisar(hechas, len(tareas))
+    return columnas
@@ -0,0 +1,117 @@
+"""Reporte ejecutivo del cruce en Excel.
+
+El libro se escribe con el modo ``write_only`` de openpyxl: las filas van
+directo al xml de la hoja, así que el Detalle de más de un millón de filas se
+escribe con memoria acotada a un bloque. Solo los encabezados y las hojas de
+resumen (pocas filas) llevan estilo por celda. Si el Detalle no entra en una
+hoja de Excel (1.048.576 filas) continúa en "Detalle 2", "Detalle 3", etc.
+
+Con lxml instalado openpyxl lo usa para serializar el xml, unas dos veces más
+rápido que con su escritor en Python puro.
+"""
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+from cobranza.temporales import ruta_temporal
+
+
+FILAS_POR_HOJA = 1_048_575
+TAMANO_BLOQUE_EXCEL = 50_000
+COLUMNAS_MONTO = {"DEUDA", "TOTAL_PAGADO", "PAGADO", "SALDO_PENDIENTE", "PENDIENTE"}
+FORMATO_MONTO = "#,##0.00"
+FORMATO_PORCENTAJE = "0.0"
+
+_borde = Side(style="thin", color="D0D0D0")
+ESTILO_ENCABEZADO = {
+    "font": Font(bold=True, color="FFFFFF"),
+    "fill": PatternFill("solid", fgColor="667EEA"),
+    "alignment": Alignment(horizontal="center", vertical="center"),
+    "border": Border(left=_borde, right=_borde, top=_borde, bottom=_borde),
+}
+
+
+def _encabezado(ws, columnas):
+    celdas = []
+    for columna in columnas:
+        celda = WriteOnlyCell(ws, value=columna)
+        for atributo, estilo in ESTILO_ENCABEZADO.items():
+            setattr(celda, atributo, estilo)
+        celdas.append(celda)
+    return celdas
+
+
+def _nueva_hoja(wb, titulo, columnas, filas):
+    # Anchos, paneles y autofiltro tienen que fijarse antes de la primera fila
+    ws = wb.create_sheet(titulo)
+    for i, columna in enumerate(columnas, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = max(12, len(str(columna)) + 4)
+    ws.freeze_panes = "A2"
+    ws.auto_filter.ref = f"A1:{get_column_letter(len(columnas))}{filas + 1}"
+    ws.append(_encabezado(ws, columnas))
+    return ws
+
+
+def _valores(serie):
+    # Excel no tiene NaN: los faltantes van como celdas vacías
+    valores = serie.astype(object)
+    return valores.where(serie.notna(), None).tolist()
+
+
+def escribir_tabla(wb, titulo, df):
+    """Hoja de resumen: pocas filas, con formato numérico por celda."""
+    ws = _nueva_hoja(wb, titulo, list(df.columns), len(df))
+    formatos = [
+        FORMATO_MONTO if columna in COLUMNAS_MONTO else FORMATO_PORCENTAJE if "%" in columna or "EFECTIVIDAD" in columna else None
+        for columna in df.columns
+    ]
+    for fila in zip(*(_valores(df[c]) for c in df.columns)):
+        celdas = []
+        for valor, formato in zip(fila, formatos):
+            celda = WriteOnlyCell(ws, value=valor)
+            if formato is not None:
+                celda.number_format = formato
+            celdas.append(celda)
+        ws.append(celdas)
+
+
+def escribir_detalle(wb, df, tamano_bloque=TAMANO_BLOQUE_EXCEL):
+    """Detalle fila a fila, por bloques y repartido en hojas de a lo sumo ``FILAS_POR_HOJA``."""
+    columnas = list(df.columns)
+    for hoja, inicio in enumerate(range(0, max(len(df), 1), FILAS_POR_HOJA), start=1):
+        fin = min(inicio + FILAS_POR_HOJA, len(df))
+        ws = _nueva_hoja(wb, "Detalle" if hoja == 1 else f"Detalle {hoja}", columnas, fin - inicio)
+        for desde in range(inicio, fin, tamano_bloque):
+            bloque = df.iloc[desde:min(desde + tamano_bloque, fin)]
+            for fila in zip(*(_valores(bloque[c]) for c in columnas)):
+                ws.append(fila)
+
+
+def exportar_reporte_excel(resultado, cubo, destino=None, tamano_bloque=TAMANO_BLOQUE_EXCEL):
+    """Escribe el reporte (Resumen, Por Periodo, Por Tipo, TOP Deudores y Detalle); devuelve la ruta.
+
+    Sin ``destino`` se crea un archivo en el directorio de temporales de la
+    app (``cobranza.temporales``) que el llamador debe borrar.
+    """
+    if destino is None:
+        destino = ruta_temporal("REPORTE_COBRANZA_", ".xlsx")
+
+    totales = cubo.totales()
+    resumen = pd.DataFrame({
+        "INDICADOR": ["Cartera total", "Recuperado", "Saldo pendiente", "Efectividad %", "Casos", "Casos pagados", "Casos pendientes"],
+        "VALOR": [
+            totales["total_cartera"], totales["total_recuperado"], totales["saldo_pendiente"],
+            totales["porcentaje_recuperacion"], totales["total_casos"], totales["casos_pagados"], totales["casos_pendientes"],
+        ],
+    })
+
+    wb = Workbook(write_only=True)
+    escribir_tabla(wb, "Resumen", resumen)
+    escribir_tabla(wb, "Por Periodo", cubo.resumen_periodo())
+    escribir_tabla(wb, "Por Tipo", cubo.por_tipo())
+    escribir_tabla(wb, "TOP Deudores", cubo.top_pendientes)
+    escribir_detalle(wb, resultado, tamano_bloque)
+    wb.save(destino)
+    return destino
@@ -0,0 +1,240 @@
+"""Cruce de la base SUSCRIPTOR con la cartera VIVA y los pagos para campañas SMS.
+
+Las métricas por CODIGO se calculan en una sola pasada por tabla, directamente
+sobre las claves de la base de suscriptores: cada fila de cartera y de pagos se
+traduce a la posición de su CODIGO y se acumula con ``np.bincount``. El join
+queda reducido a indexar esos acumulados por posición, sin merges sucesivos.
+No depende de Streamlit: puede usarse desde scripts o procesos por lotes.
+"""
+import numpy as np
+import pandas as pd
+
+from cobranza.calculos import saldo_pendiente
+
+
+CAMPANA_AGRESIVA = "MOROSOS"
+CAMPANA_GENERAL = "GENERAL"
+# Lo único que el análisis lee de la cartera
+COLUMNAS_CARTERA = ["ID_COBRANZA", "PERIODO", "DEUDA"]
+
+
+def _posiciones_en(claves, serie):
+    """Posición en ``claves`` del código de cada fila de ``serie`` (-1 si no está)."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos, valores = serie.cat.codes.to_numpy(), serie.cat.categories
+    else:
+        codigos, valores = pd.factorize(serie)
+    # La búsqueda de texto se hace una vez por código distinto, no por fila
+    mapa = np.append(claves.get_indexer(pd.Index(valores).astype(str)), -1)
+    return mapa[codigos]
+
+
+def agregar_por_codigo(claves, codigos, periodos, montos):
+    """Cantidad de periodos y suma de montos por posición de ``claves``."""
+    posiciones = _posiciones_en(claves, codigos)
+    validas = posiciones >= 0
+    conteo = np.bincount(posiciones[validas & periodos.notna().to_numpy()], minlength=len(claves))
+    suma = np.bincount(
+        posiciones[validas],
+        weights=montos.to_numpy(dtype=float)[validas],
+        minlength=len(claves)
+    )
+    return conteo, suma
+
+
+def _claves_suscriptor(df_suscriptor):
+    """Posición de cada fila de SUSCRIPTOR en sus CODIGO distintos, y esos códigos."""
+    codigos = df_suscriptor["CODIGO"]
+    # CODIGO ya viene como texto de la ingesta: no se vuelve a convertir
+    if not pd.api.types.is_string_dtype(codigos):
+        codigos = codigos.astype(str)
+    posiciones, claves = pd.factorize(codigos)
+    return posiciones, pd.Index(claves)
+
+
+def _armar_analisis(df_suscriptor, posiciones, periodos_totales, deuda_total, periodos_pagados, total_pagado):
+    analisis = df_suscriptor.assign(
+        PERIODOS_TOTALES=periodos_totales[posiciones],
+        DEUDA_TOTAL=deuda_total[posiciones],
+        PERIODOS_PAGADOS=periodos_pagados[posiciones],
+        TOTAL_PAGADO=total_pagado[posiciones],
+    )
+    analisis["PERIODOS_PENDIENTES"] = analisis["PERIODOS_TOTALES"] - analisis["PERIODOS_PAGADOS"]
+    analisis["SALDO_PENDIENTE"] = saldo_pendiente(analisis["DEUDA_TOTAL"], analisis["TOTAL_PAGADO"])
+    return analisis
+
+
+def analizar_suscriptores(df_suscriptor, df_cartera, df_pagos):
+    """Una fila por suscriptor con periodos y montos de cartera y pagos.
+
+    Agrega PERIODOS_PENDIENTES y SALDO_PENDIENTE. Los suscriptores sin cartera
+    o sin pagos quedan en cero.
+    """
+    posiciones, claves = _claves_suscriptor(df_suscriptor)
+    periodos_totales, deuda_total = agregar_por_codigo(
+        claves, df_cartera["ID_COBRANZA"], df_cartera["PERIODO"], df_cartera["DEUDA"]
+    )
+    periodos_pagados, total_pagado = agregar_por_codigo(
+        claves, df_pagos["CODIGO"], df_pagos["PERIODO"], df_pagos["IMPORTE"]
+    )
+    return _armar_analisis(df_suscriptor, posiciones, periodos_totales, deuda_total, periodos_pagados, total_pagado)
+
+
+def depurar_pagos_totales(analisis):
+    """Deja solo los suscriptores con al menos un periodo pendiente."""
+    return analisis[analisis["PERIODOS_PENDIENTES"] > 0]
+
+
+def filtrar_tipos(df_cartera, tipos, columnas=COLUMNAS_CARTERA):
+    """Filas de la cartera de los ``tipos`` pedidos, solo con ``columnas`` (None = todas).
+
+    Filtro y proyección se hacen en un solo paso, así que solo se copian las
+    columnas pedidas. Si entran todas las filas no se copia nada: la
+    proyección comparte los datos de ``df_cartera`` (Copy-on-Write; en pandas 2
+    hay que activarlo con ``cobranza.activar_copy_on_write``).
+    """
+    mascara = df_cartera["TIPO"].isin(tipos).to_numpy()
+    columnas = slice(None) if columnas is None else columnas
+    if mascara.all():
+        return df_cartera.loc[:, columnas]
+    return df_cartera.loc[mascara, columnas]
+
+
+def seleccionar_campana(analisis_depurado, agresiva):
+    """Clientes de la campaña y su nombre.
+
+    La agresiva (MOROSOS) deja solo a quienes no pagaron ningún periodo; la
+    general incluye a todos los que tienen al menos un periodo pendiente.
+    """
+    if agresiva:
+        return analisis_depurado[analisis_depurado["PERIODOS_PAGADOS"] == 0], CAMPANA_AGRESIVA
+    return analisis_depurado, CAMPANA_GENERAL
+
+
+# ==========================================
+# PARTICIÓN POR TIPO
+# ==========================================
+def _codigos_y_valores(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(), serie.cat.categories
+    return pd.factorize(serie)
+
+
+class ParticionTipos:
+    """Cartera partida por TIPO, con PERIODOS_TOTALES y DEUDA_TOTAL por código ya sumados.
+
+    Se construye una vez por cartera. Los agregados de cada TIPO son un tramo
+    contiguo de ``posiciones`` (código en ``codigos``), ``periodos`` y
+    ``deuda``: elegir tipos solo concatena y suma esos tramos, sin volver a
+    recorrer las filas de la cartera.
+    """
+
+    def __init__(self, codigos, limites, posiciones, periodos, deuda, registros, deuda_tipo, total_codigos):
+        self.codigos = codigos
+        self.limites = limites
+        self.posiciones = posiciones
+        self.periodos = periodos
+        self.deuda = deuda
+        self.registros = registros
+        self.deuda_tipo = deuda_tipo
+        self.total_codigos = total_codigos
+
+    @classmethod
+    def construir(cls, df_cartera):
+        codigos_id, valores_id = _codigos_y_valores(df_cartera["ID_COBRANZA"])
+        codigos_tipo, valores_tipo = _codigos_y_valores(df_cartera["TIPO"])
+        deuda = df_cartera["DEUDA"].to_numpy(dtype=float)
+
+        # Filas y deuda por TIPO cuentan también las filas sin código, como el filtro por TIPO
+        con_tipo = codigos_tipo >= 0
+        filas_tipo = np.bincount(codigos_tipo[con_tipo], minlength=len(valores_tipo))
+        deuda_por_tipo = np.bincount(codigos_tipo[con_tipo], weights=deuda[con_tipo], minlength=len(valores_tipo))
+
+        # Una clave entera por (TIPO, código): ordenarla deja cada TIPO contiguo
+        validas = con_tipo & (codigos_id >= 0)
+        n_codigos = len(valores_id)
+        pares, inversa = np.unique(
+            codigos_tipo[validas].astype(np.int64) * n_codigos + codigos_id[validas], return_inverse=True
+        )
+        con_periodo = df_cartera["PERIODO"].notna().to_numpy()[validas]
+        periodos = np.bincount(inversa[con_periodo], minlength=len(pares))
+        deuda_pares = np.bincount(inversa, weights=deuda[validas], minlength=len(pares))
+        cortes = np.searchsorted(pares // n_codigos, np.arange(len(valores_tipo) + 1))
+
+        # Solo los TIPO con filas, como groupby(observed=True)
+        presentes = np.flatnonzero(filas_tipo)
+        nombres = [str(valores_tipo[t]) for t in presentes]
+        posiciones = pares % n_codigos
+        return cls(
+            codigos=pd.Index(valores_id).astype(str),
+            limites={n: (cortes[t], cortes[t + 1]) for n, t in zip(nombres, presentes)},
+            posiciones=posiciones,
+            periodos=periodos,
+            deuda=deuda_pares,
+            registros={n: int(filas_tipo[t]) for n, t in zip(nombres, presentes)},
+            deuda_tipo={n: float(deuda_por_tipo[t]) for n, t in zip(nombres, presentes)},
+            total_codigos=int(np.count_nonzero(np.bincount(posiciones, minlength=n_codigos))),
+        )
+
+    @property
+    def tipos(self):
+        return sorted(self.limites)
+
+    def seleccion(self, tipos):
+        """``(posiciones, periodos, deuda)`` de los tramos de ``tipos``; un código puede repetirse entre tipos."""
+        tramos = [slice(*self.limites[t]) for t in tipos if t in self.limites] or [slice(0, 0)]
+        if len(tramos) == 1:
+            return self.posiciones[tramos[0]], self.periodos[tramos[0]], self.deuda[tramos[0]]
+        return tuple(np.concatenate([arreglo[t] for t in tramos]) for arreglo in (self.posiciones, self.periodos, self.deuda))
+
+    def resumen(self, tipos):
+        """Registros, códigos únicos y deuda de los ``tipos`` pedidos."""
+        posiciones = self.seleccion(tipos)[0]
+        return {
+            "registros": sum(self.registros.get(t, 0) for t in tipos),
+            "codigos": int(np.count_nonzero(np.bincount(posiciones, minlength=len(self.codigos)))),
+            "deuda": sum(self.deuda_tipo.get(t, 0.0) for t in tipos),
+        }
+
+
+class SuscriptoresSMS:
+    """SUSCRIPTOR cruzado con los pagos y ubicado en los códigos de una ``ParticionTipos``.
+
+    Lo que no depende de los tipos elegidos (pagos por CODIGO y la traducción
+    de códigos de cartera a suscriptores) se calcula una sola vez; ``analizar``
+    solo suma los tramos de los tipos pedidos.
+    """
+
+    def __init__(self, df_suscriptor, particion, posiciones, destino, periodos_pagados, total_pagado):
+        self.df_suscriptor = df_suscriptor
+        self.particion = particion
+        self.posiciones = posiciones
+        self.destino = destino
+        self.periodos_pagados = periodos_pagados
+        self.total_pagado = total_pagado
+
+    @classmethod
+    def construir(cls, df_suscriptor, df_pagos, particion, progreso=None):
+        avisar = progreso or (lambda hechas, total: None)
+        posiciones, claves = _claves_suscriptor(df_suscriptor)
+        avisar(1, 3)
+        periodos_pagados, total_pagado = agregar_por_codigo(
+            claves, df_pagos["CODIGO"], df_pagos["PERIODO"], df_pagos["IMPORTE"]
+        )
+        avisar(2, 3)
+        # Posición en ``claves`` de cada código de la cartera (-1 si no es suscriptor)
+        destino = claves.get_indexer(particion.codigos)
+        avisar(3, 3)
+        return cls(df_suscriptor, particion, posiciones, destino, periodos_pagados, total_pagado)
+
+    def analizar(self, tipos):
+        """Lo mismo que ``analizar_suscriptores`` con la cartera filtrada por ``tipos``."""
+        posiciones, periodos, deuda = self.particion.seleccion(tipos)
+        destino = self.destino[posiciones]
+        validas = destino >= 0
+        n_claves = len(self.periodos_pagados)
+        periodos_totales = np.bincount(destino[validas], weights=periodos[validas], minlength=n_claves).astype(np.int64)
+        deuda_total = np.bincount(destino[validas], weights=deuda[validas], minlength=n_claves)
+        return _armar_analisis(
+            self.df_suscriptor, self.posiciones, periodos_totales, deuda_total, self.periodos_pagados, self.total_pagado
+        )
@@ -0,0 +1,129 @@
+"""Tareas largas en segundo plano: el cruce corre en un hilo y la interfaz consulta su avance.
+
+Cada tarea ejecuta ``funcion(*args, progreso=tarea.avanzar)`` en un pool de
+hilos compartido por el proceso. ``progreso(hechas, total)`` tiene la misma
+forma que los callbacks de la ingesta y es también el punto de cancelación:
+cancelar una tarea en curso la detiene en su próximo aviso de avance. Los
+hilos no copian datos: la tarea trabaja sobre los mismos DataFrames de la
+sesión, que nunca se modifican en el lugar.
+
+No depende de Streamlit. ``COBRANZA_SEGUNDO_PLANO=0`` desactiva el modo por
+defecto y ``COBRANZA_TAREAS`` fija cuántas tareas corren a la vez.
+"""
+import atexit
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+
+SEGUNDO_PLANO = os.environ.get("COBRANZA_SEGUNDO_PLANO", "1") == "1"
+TAREAS_SIMULTANEAS = int(os.environ.get("COBRANZA_TAREAS", "2"))
+
+EN_COLA = "EN COLA"
+EN_CURSO = "EN CURSO"
+TERMINADA = "TERMINADA"
+CANCELADA = "CANCELADA"
+FALLIDA = "FALLIDA"
+
+
+class TareaCancelada(Exception):
+    """Se lanza desde ``Tarea.avanzar`` en el hilo de una tarea cancelada."""
+
+
+class Tarea:
+    def __init__(self, nombre, clave, descripcion=""):
+        self.nombre = nombre
+        self.clave = clave
+        self.descripcion = descripcion
+        self.estado = EN_COLA
+        self.progreso = 0.0
+        self.resultado = None
+        self.error = None
+        self.inicio = None
+        self.fin = None
+        self._cancelar = threading.Event()
+        self._futuro = None
+
+    def avanzar(self, hechas, total):
+        if self._cancelar.is_set():
+            raise TareaCancelada(self.nombre)
+        self.progreso = min(hechas / total, 1.0) if total else 0.0
+
+    def cancelar(self):
+        self._cancelar.set()
+        # Si todavía no empezó, no llega a correr
+        if self._futuro is not None and self._futuro.cancel():
+            self._terminar(CANCELADA)
+
+    @property
+    def terminada(self):
+        return self.estado in (TERMINADA, CANCELADA, FALLIDA)
+
+    @property
+    def segundos(self):
+        if self.inicio is None:
+            return 0.0
+        return (self.fin if self.fin is not None else time.perf_counter()) - self.inicio
+
+    def _terminar(self, estado):
+        self.fin = time.perf_counter()
+        self.estado = estado
+
+    def _ejecutar(self, funcion, args, kwargs):
+        if self._cancelar.is_set():
+            self._terminar(CANCELADA)
+            return
+        self.inicio = time.perf_counter()
+        self.estado = EN_CURSO
+        try:
+            resultado = funcion(*args, progreso=self.avanzar, **kwargs)
+        except TareaCancelada:
+            self._terminar(CANCELADA)
+        except Exception as e:
+            self.error = e
+            self._terminar(FALLIDA)
+        else:
+            # Una cancelación que llega al final también descarta el resultado
+            if self._cancelar.is_set():
+                self._terminar(CANCELADA)
+                return
+            self.progreso = 1.0
+            self.resultado = resultado
+            self._terminar(TERMINADA)
+
+
+class EjecutorTareas:
+    """Pool de hilos para las tareas de todas las sesiones."""
+
+    def __init__(self, simultaneas=TAREAS_SIMULTANEAS):
+        self.simultaneas = simultaneas
+        self._pool = None
+        self._activas = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def enviar(self, nombre, clave, funcion, *args, descripcion="", **kwargs):
+        tarea = Tarea(nombre, clave, descripcion)
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=max(1, self.simultaneas), thread_name_prefix="cobranza-tarea")
+            self._activas.add(tarea)
+            tarea._futuro = self._pool.submit(tarea._ejecutar, funcion, args, kwargs)
+        return tarea
+
+    def cerrar(self):
+        with self._lock:
+            for tarea in list(self._activas):
+                tarea.cancelar()
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+EJECUTOR = EjecutorTareas()
+
+
+@atexit.register
+def cerrar_ejecutor():
+    EJECUTOR.cerrar()
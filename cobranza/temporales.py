@@ -0,0 +1,64 @@
+"""Archivos temporales de las descargas (reporte Excel, zip de campañas) con limpieza garantizada.
+
+Todos se escriben en un directorio propio de la app. Cada ``ArchivoTemporal``
+borra su archivo cuando deja de usarse: al reemplazarlo por otro, cuando se
+descarta el estado de la sesión que lo guarda o al terminar el proceso. Como
+respaldo ante un proceso que terminó mal, al crear uno nuevo se borran los que
+tienen más de ``COBRANZA_TEMP_HORAS`` horas.
+"""
+import os
+import tempfile
+import time
+import weakref
+
+
+DIRECTORIO_TEMPORALES = os.environ.get("COBRANZA_TEMP_DIR", os.path.join(tempfile.gettempdir(), "cobranza"))
+HORAS_TEMPORALES = float(os.environ.get("COBRANZA_TEMP_HORAS", "12"))
+
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+
+def podar(directorio=DIRECTORIO_TEMPORALES, horas=HORAS_TEMPORALES):
+    """Borra los archivos de ``directorio`` modificados hace más de ``horas``; devuelve cuántos."""
+    limite = time.time() - horas * 3600
+    borrados = 0
+    try:
+        entradas = list(os.scandir(directorio))
+    except OSError:
+        return 0
+    for entrada in entradas:
+        try:
+            if entrada.is_file() and entrada.stat().st_mtime < limite:
+                os.remove(entrada.path)
+                borrados += 1
+        except OSError:
+            pass
+    return borrados
+
+
+def ruta_temporal(prefijo, sufijo, directorio=DIRECTORIO_TEMPORALES):
+    """Ruta de un archivo nuevo y vacío en ``directorio``; el llamador debe borrarlo."""
+    os.makedirs(directorio, exist_ok=True)
+    podar(directorio)
+    descriptor, ruta = tempfile.mkstemp(prefix=prefijo, suffix=sufijo, dir=directorio)
+    os.close(descriptor)
+    return ruta
+
+
+class ArchivoTemporal:
+    """Un archivo que se borra al llamar ``descartar`` o cuando este objeto se libera."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._finalizador = weakref.finalize(self, _borrar, ruta)
+
+    def descartar(self):
+        self._finalizador()
+
+    def existe(self):
+        return os.path.exists(self.ruta)
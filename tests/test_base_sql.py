@@ -0,0 +1,25 @@
+import pytest
+
+from benchmarks.datos import generar_escenario
+from cobranza.base_sql import HAY_DUCKDB, BaseSQL
+from cobranza.cruce import MotorCruce, resumir_pagos
+
+MOTORES = ["sqlite", pytest.param("duckdb", marks=pytest.mark.skipif(not HAY_DUCKDB, reason="sin duckdb"))]
+
+
+@pytest.fixture(scope="module")
+def escenario():
+    return generar_escenario(20_000)
+
+
+@pytest.mark.parametrize("motor", MOTORES)
+def test_estado_igual_al_cruce_en_memoria(escenario, motor):
+    # Las deudas pagadas en cuotas quedan PAGADO en ambos: la suma SQL está compensada
+    cartera, pagos = escenario["cartera"], escenario["pagos"]
+    esperado = MotorCruce(cartera, workers=1).cruzar_resumen(resumir_pagos(pagos, cartera))
+    with BaseSQL(":memory:", motor) as base:
+        base.cargar_df(cartera, "CARTERA")
+        base.cargar_df(pagos, "PAGOS")
+        base.cruzar()
+        resultado = base.resultado()
+    assert (resultado["ESTADO"].astype(str).to_numpy() == esperado["ESTADO"].astype(str).to_numpy()).all()
@@ -0,0 +1,20 @@
+import pandas as pd
+
+from cobranza.lectores import _a_numero, leer_archivo
+
+
+def test_coma_decimal_por_valor():
+    # Un "89.37" no se multiplica por 100 porque otra fila use coma decimal
+    valores = _a_numero(pd.Series(["89.37", "1,5", "1.234,56"]), ";")
+    assert valores.tolist() == [89.37, 1.5, 1234.56]
+
+
+def test_csv_punto_y_coma_con_montos_mixtos():
+    datos = "ID_COBRANZA;PERIODO;IMPORTE\n1;202301;89.37\n2;202301;1.234,56\n3;202302;15\n".encode("utf-8")
+    df, _ = leer_archivo(datos, "PAGOS", nombre="pagos.csv")
+    assert df["IMPORTE"].tolist() == [89.37, 1234.56, 15.0]
+
+
+def test_coma_como_separador_no_convierte():
+    valores = _a_numero(pd.Series(["89.37", "1234.56"]), ",")
+    assert valores.tolist() == [89.37, 1234.56]